@@ -26,13 +26,11 @@
 
 from __future__ import division
 
-import h5py as h5
-
 import numpy as np
 
 from molmod import boltzmann, pascal, angstrom, second, lightspeed, centimeter
 from yaff.log import log
-from yaff.analysis.utils import get_slice
+from yaff.analysis.utils import get_slice, get_dataset
 
 
 __all__ = [
@@ -45,10 +43,10 @@ __all__ = [
 def get_time(f, start, end, step):
     if 'trajectory/time' in f:
         label = 'Time [%s]' % log.time.notation
-        time = f['trajectory/time'][start:end:step]/log.time.conversion
+        time = get_dataset(f, 'trajectory/time')[start:end:step]/log.time.conversion
     else:
         label = 'Step'
-        time = np.arange(len(f['trajectory/epot'][:]), dtype=float)[start:end:step]
+        time = np.arange(len(get_dataset(f, 'trajectory/epot')[:]), dtype=float)[start:end:step]
     return time, label
 
 def plot_energies(f, fn_png='energies.png', **kwargs):
@@ -73,16 +71,16 @@ type of plot is essential for checking the sanity of a simulation.
     import matplotlib.pyplot as pt
     start, end, step = get_slice(f, **kwargs)
 
-    epot = f['trajectory/epot'][start:end:step]/log.energy.conversion
+    epot = get_dataset(f, 'trajectory/epot')[start:end:step]/log.energy.conversion
     time, tlabel = get_time(f, start, end, step)
 
     pt.clf()
     pt.plot(time, epot, 'k-', label='E_pot')
     if 'trajectory/etot' in f:
-        etot = f['trajectory/etot'][start:end:step]/log.energy.conversion
+        etot = get_dataset(f, 'trajectory/etot')[start:end:step]/log.energy.conversion
         pt.plot(time, etot, 'r-', label='E_tot')
     if 'trajectory/econs' in f:
-        econs = f['trajectory/econs'][start:end:step]/log.energy.conversion
+        econs = get_dataset(f, 'trajectory/econs')[start:end:step]/log.energy.conversion
         pt.plot(time, econs, 'g-', label='E_cons')
     pt.xlim(time[0], time[-1])
     pt.xlabel(tlabel)
@@ -113,7 +111,7 @@ def plot_energies2(f, fn_png='energies.png', **kwargs):
     import matplotlib.pyplot as pt
     start, end, step = get_slice(f, **kwargs)
 
-    epot = f['trajectory/epot'][start:end:step]/log.energy.conversion
+    epot = get_dataset(f, 'trajectory/epot')[start:end:step]/log.energy.conversion
     time, tlabel = get_time(f, start, end, step)
 
     pt.clf()
@@ -122,10 +120,10 @@ def plot_energies2(f, fn_png='energies.png', **kwargs):
     pt.rcParams['font.family'] = 'Paladino'
     pt.plot(time, epot, 'g-', label=r'$E_{pot}$')
     if 'trajectory/etot' in f:
-        etot = f['trajectory/ekin'][start:end:step]/log.energy.conversion
+        etot = get_dataset(f, 'trajectory/ekin')[start:end:step]/log.energy.conversion
         pt.plot(time, etot, 'r-', label=r'$E_{kin}$')
     if 'trajectory/econs' in f:
-        econs = f['trajectory/etot'][start:end:step]/log.energy.conversion
+        econs = get_dataset(f, 'trajectory/etot')[start:end:step]/log.energy.conversion
         pt.plot(time, econs, 'k-', label=r'$E_{tot}$')
     pt.xlim(time[0], time[-1])
     pt.xlabel(r'%s' % tlabel )
@@ -156,7 +154,7 @@ def plot_temperature(f, fn_png='temperature.png', **kwargs):
     import matplotlib.pyplot as pt
     start, end, step = get_slice(f, **kwargs)
 
-    temp = f['trajectory/temp'][start:end:step]
+    temp = get_dataset(f, 'trajectory/temp')[start:end:step]
     time, tlabel = get_time(f, start, end, step)
 
     pt.clf()
@@ -191,7 +189,7 @@ def plot_pressure(f, fn_png='pressure.png', window = 1, **kwargs):
     import matplotlib.pyplot as pt
     start, end, step = get_slice(f, **kwargs)
 
-    press = f['trajectory/press'][start:end:step]
+    press = get_dataset(f, 'trajectory/press')[start:end:step]
     time, tlabel = get_time(f, start, end, step)
 
     press_av = np.zeros(len(press)+1-window)
@@ -259,12 +257,12 @@ def plot_temp_dist(f, fn_png='temp_dist.png', temp=None, ndof=None, select=None,
 
     if select is None:
         # just load the temperatures from the output file
-        temps = f['trajectory/temp'][start:end:step]
+        temps = get_dataset(f, 'trajectory/temp')[start:end:step]
     else:
         # compute the temperatures of the subsystem
         temps = []
         for i in range(start, end, step):
-             temp = ((f['trajectory/vel'][i,select]**2).mean(axis=1)*weights).mean()
+             temp = ((get_dataset(f, 'trajectory/vel')[i,select]**2).mean(axis=1)*weights).mean()
              temps.append(temp)
         temps = np.array(temps)
 
@@ -312,9 +310,9 @@ def plot_temp_dist(f, fn_png='temp_dist.png', temp=None, ndof=None, select=None,
         total = 0.0
         for i in range(start, end, step):
             if select is None:
-                atom_temps = (f['trajectory/vel'][i]**2).mean(axis=1)*weights
+                atom_temps = (get_dataset(f, 'trajectory/vel')[i]**2).mean(axis=1)*weights
             else:
-                atom_temps = (f['trajectory/vel'][i,select]**2).mean(axis=1)*weights
+                atom_temps = (get_dataset(f, 'trajectory/vel')[i,select]**2).mean(axis=1)*weights
             counts += np.histogram(atom_temps.ravel(), bins=temp_grid)[0]
             total += atom_temps.size
 
@@ -428,19 +426,19 @@ def plot_press_dist(f, temp, fn_png='press_dist.png', press=None, ndof=None, sel
 
     if select is None:
         # just load the temperatures from the output file
-        temps = f['trajectory/temp'][start:end:step]
+        temps = get_dataset(f, 'trajectory/temp')[start:end:step]
     else:
         # compute the temperatures of the subsystem
         temps = []
         for i in range(start, end, step):
-             temp = ((f['trajectory/vel'][i,select]**2).mean(axis=1)*weights).mean()
+             temp = ((get_dataset(f, 'trajectory/vel')[i,select]**2).mean(axis=1)*weights).mean()
              temps.append(temp)
         temps = np.array(temps)
 
     if temp is None:
         temp = temps.mean()
 
-    presss = f['trajectory/press'][start:end:step]
+    presss = get_dataset(f, 'trajectory/press')[start:end:step]
     if press is None:
         press = presss.mean()
 
@@ -541,16 +539,16 @@ def plot_volume_dist(f, fn_png='volume_dist.png', temp=None, press=None, **kwarg
 
     if temp is None:
         # Make an array of the temperature
-        temps = f['trajectory/temp'][start:end:step]
+        temps = get_dataset(f, 'trajectory/temp')[start:end:step]
         temp = temps.mean()
 
     if press is None:
         # Make an array of the pressure
-        presss = f['trajectory/press'][start:end:step]
+        presss = get_dataset(f, 'trajectory/press')[start:end:step]
         press = presss.mean()
 
     # Make an array of the cell volume
-    vols = f['trajectory/volume'][start:end:step]
+    vols = get_dataset(f, 'trajectory/volume')[start:end:step]
     vol0 = vols.mean()
 
     sigma = np.std(vols)
@@ -622,7 +620,7 @@ def plot_density(f, fn_png='density.png', **kwargs):
     start, end, step = get_slice(f, **kwargs)
 
     mass = f['system/masses'][:].sum()
-    vol = f['trajectory/volume'][start:end:step]
+    vol = get_dataset(f, 'trajectory/volume')[start:end:step]
     rho = mass/vol/log.density.conversion
     time, tlabel = get_time(f, start, end, step)
 
@@ -655,7 +653,7 @@ def plot_cell_pars(f, fn_png='cell_pars.png', **kwargs):
     import matplotlib.pyplot as pt
     start, end, step = get_slice(f, **kwargs)
 
-    cell = f['trajectory/cell'][start:end:step]/log.length.conversion
+    cell = get_dataset(f, 'trajectory/cell')[start:end:step]/log.length.conversion
     lengths = np.sqrt((cell**2).sum(axis=2))
     time, tlabel = get_time(f, start, end, step)
     nvec = lengths.shape[1]
@@ -733,11 +731,11 @@ def plot_epot_contribs(f, fn_png='epot_contribs.png', size=1.0, **kwargs):
     import matplotlib.pyplot as pt
     start, end, step = get_slice(f, **kwargs)
 
-    epot = f['trajectory/epot'][start:end:step].copy()/log.energy.conversion
+    epot = get_dataset(f, 'trajectory/epot')[start:end:step].copy()/log.energy.conversion
     epot -= epot[0]
     epot_contribs = []
     for i, name in enumerate(f['trajectory'].attrs['epot_contrib_names']):
-        contrib = f['trajectory']['epot_contribs'][start:end:step,i].copy()/log.energy.conversion
+        contrib = get_dataset(f, 'trajectory/epot_contribs')[start:end:step,i].copy()/log.energy.conversion
         contrib -= contrib[0]
         epot_contribs.append((name, contrib))
     time, tlabel = get_time(f, start, end, step)
@@ -801,7 +799,7 @@ def plot_angle(f, index, fn_png='angle.png', n_int = 1, xlim = None, ymax = None
     if n_atoms != 3: raise AssertionError(n_atoms + ' atoms selected instead of 3')
 
     # construct the working arrays
-    time = f['trajectory/time'][start:end:step]
+    time = get_dataset(f, 'trajectory/time')[start:end:step]
     atom_vec = np.zeros((len(time), n_angles, n_dim, 2))
     angle = np.zeros((len(time), n_angles))
 
@@ -810,7 +808,7 @@ def plot_angle(f, index, fn_png='angle.png', n_int = 1, xlim = None, ymax = None
     # calculate the relative positions
     for i in range(n_angles):
         for j in range(2):
-            atom_vec[:,i,:,j] = (-1)**j*(f['trajectory/pos'][start:end:step, index[i,j+1], :]-f['trajectory/pos'][start:end:step, index[i,j], :])
+            atom_vec[:,i,:,j] = (-1)**j*(get_dataset(f, 'trajectory/pos')[start:end:step, index[i,j+1], :]-get_dataset(f, 'trajectory/pos')[start:end:step, index[i,j], :])
         angle[:,i] = np.arccos((atom_vec[:,i,:,0]*atom_vec[:,i,:,1]).sum(axis=1)/np.sqrt((atom_vec[:,i,:,0]**2).sum(axis=1)*(atom_vec[:,i,:,1]**2).sum(axis=1)))/log.angle.conversion
         if oriented:
             # determine the orientation of the cross product of both vectors wrt the normal axis
@@ -941,7 +939,7 @@ def plot_dihedral(f, index, fn_png='dihedral.png', n_int = 1, xlim = None, ymax
     if n_atoms != 4: raise AssertionError(n_atoms + ' atoms selected instead of 4')
 
     # construct the working arrays
-    time = f['trajectory/time'][start:end:step]
+    time = get_dataset(f, 'trajectory/time')[start:end:step]
     atom_vec = np.zeros((len(time), n_angles, n_dim, 3))
     plane_vec = np.zeros((len(time), n_angles, n_dim, 2))
     angle = np.zeros((len(time), n_angles))
@@ -951,7 +949,7 @@ def plot_dihedral(f, index, fn_png='dihedral.png', n_int = 1, xlim = None, ymax
     # calculate the relative positions
     for i in range(n_angles):
         for j in range(3):
-            atom_vec[:,i,:,j] = f['trajectory/pos'][start:end:step, index[i,j+1], :]-f['trajectory/pos'][start:end:step, index[i,j], :]
+            atom_vec[:,i,:,j] = get_dataset(f, 'trajectory/pos')[start:end:step, index[i,j+1], :]-get_dataset(f, 'trajectory/pos')[start:end:step, index[i,j], :]
         # calculate the plane normals
         for j in range(2):
             plane_vec[:,i,:,j] = np.cross(atom_vec[:,i,:,j], atom_vec[:,i,:,j+1])
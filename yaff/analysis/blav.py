@@ -27,7 +27,6 @@
 from __future__ import division
 
 import numpy as np
-import matplotlib.pyplot as pt
 
 from molmod.units import *
 
@@ -190,6 +189,7 @@ def inefficiency(signal, time = None, fn_png = 'stat_ineff.png', taus = None, eq
         unit = 1
         unit_ab = 'steps'
 
+    import matplotlib.pyplot as pt
     pt.clf()
     comap = pt.cm.get_cmap(name='jet')
     pt.xlabel(xlabel)
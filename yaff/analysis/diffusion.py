@@ -161,7 +161,7 @@ class Diffusion(AnalysisHook):
                 self.msds_error = []
                 for m in positive:
                     try:
-                        error = blav(self.outg['msd%03i' % (m+1)][:], minblock=10)[0]
+                        error = blav(self.outg['msd%03i' % (m+1)][:self.msdcounters[m]], minblock=10)[0]
                         self.msds_error.append(error)
                     except ValueError:
                         self.msds_error = None
@@ -204,13 +204,31 @@ class Diffusion(AnalysisHook):
             return self.counter - (self.counter//self.bsize)*self.bsize - m - 1 < 0
 
     def update_msd(self, msd, m):
-        self.msdsums[m] += msd
-        self.msdcounters[m] += 1
         if self.outg is not None:
+            # The dataset is extended geometrically. The excess rows are
+            # removed by trim_msds.
             ds = self.outg['msd%03i' % (m+1)]
-            row = ds.shape[0]
-            ds.resize(row+1, axis=0)
+            row = self.msdcounters[m]
+            if ds.shape[0] <= row:
+                ds.resize(max(row+1, 2*ds.shape[0]), axis=0)
             ds[row] = msd
+        self.msdsums[m] += msd
+        self.msdcounters[m] += 1
+
+    def trim_msds(self):
+        """Remove the unused rows from the MSD datasets in the output"""
+        if self.outg is not None:
+            for m in range(self.mult):
+                ds = self.outg['msd%03i' % (m+1)]
+                if ds.shape[0] != self.msdcounters[m]:
+                    ds.resize(self.msdcounters[m], axis=0)
+
+    def compute_offline(self):
+        AnalysisHook.compute_offline(self)
+        self.trim_msds()
+
+    def finalize(self, iterative):
+        self.trim_msds()
 
     def plot(self, fn_png='msds.png'):
         import matplotlib.pyplot as pt
@@ -28,7 +28,7 @@ from __future__ import division
 
 from yaff.log import log
 from yaff.sampling.iterative import Hook
-from yaff.analysis.utils import get_slice
+from yaff.analysis.utils import get_slice, get_dataset
 
 
 __all__ = ['AnalysisInput', 'AnalysisHook']
@@ -105,6 +105,12 @@ class AnalysisHook(Hook):
         else:
             self.init_online()
 
+    def get_state_keys(self, iterative):
+        keys = [ai.key for ai in self.analysis_inputs.values() if ai.key is not None]
+        if self.do_timestep:
+            keys.append('time')
+        return keys
+
     def __call__(self, iterative):
         # get the requested state items
         state_items = {}
@@ -133,11 +139,12 @@ class AnalysisHook(Hook):
         datasets = {}
         for key, ai in self.analysis_inputs.items():
             if ai.path is not None:
-                datasets['ds_' + key] = self.f[ai.path]
+                datasets['ds_' + key] = get_dataset(self.f, ai.path)
         self.configure_offline(**datasets)
         self.init_first()
         if self.do_timestep:
-            self.timestep = self.f['trajectory/time'][self.start+self.step] - self.f['trajectory/time'][self.start]
+            ds_time = get_dataset(self.f, 'trajectory/time')
+            self.timestep = ds_time[self.start+self.step] - ds_time[self.start]
             self.init_timestep()
         self.offline_loop(**datasets)
         self.compute_derived()
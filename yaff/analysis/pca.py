@@ -26,11 +26,7 @@
 
 from __future__ import division
 
-import h5py as h5
 import numpy as np
-import scipy.linalg as spla
-import matplotlib.pyplot as pt
-from scipy import random
 
 from molmod.units import *
 from molmod.constants import boltzmann
@@ -38,6 +34,7 @@ from molmod.io.xyz import XYZWriter
 from molmod.periodic import periodic as pd
 
 from yaff.log import log
+from yaff.analysis.utils import get_dataset
 
 __all__ = [
     'calc_cov_mat_internal', 'calc_cov_mat', 'calc_pca', 'pca_projection',
@@ -111,7 +108,7 @@ def calc_cov_mat(f, q_ref=None, start=0, end=None, step=1, select=None, path='tr
     """
 
     # Load in the relevant data
-    q = f[path][start:end:step,:,:]
+    q = get_dataset(f, path)[start:end:step,:,:]
     # Select the given atoms
     if select is not None:
         q = q[:,select,:]
@@ -199,6 +196,7 @@ def calc_pca(f_target, cov_mat=None, f=None, q_ref=None, start=0, end=None, step
         eigvec = eigvec[:,idx]
 
         # Create output HDF5 file
+        import h5py as h5
         with h5.File(f_target, 'w') as g:
             pca = g.create_group('pca')
             # Output reference structure q_ref
@@ -275,7 +273,7 @@ def pca_projection(f_target, f, pm, start=0, end=None, step=1, select=None, path
             If mass_weighted is True, the covariance matrix is mass-weighted.
     """
     # Load in the relevant data
-    q = f[path][start:end:step,:,:]
+    q = get_dataset(f, path)[start:end:step,:,:]
     # Select the given atoms
     if select is not None:
         q = q[:,select,:]
@@ -299,6 +297,7 @@ def pca_projection(f_target, f, pm, start=0, end=None, step=1, select=None, path
         prin_comp = np.dot(q, pm)
 
     # Create output HDF5 file
+    import h5py as h5
     with h5.File(f_target, 'a') as g:
         if not 'pca' in g:
             pca = g.create_group('pca')
@@ -344,7 +343,7 @@ def write_principal_mode(f, f_pca, index, n_frames=100, select=None, mw=True, sc
     # Atom numbers, masses and initial frame
     numbers = f['system/numbers']
     masses = f['system/masses']
-    pos = f['trajectory/pos']
+    pos = get_dataset(f, 'trajectory/pos')
     if select is not None:
         numbers = numbers[select]
         masses = masses[select]
@@ -393,6 +392,7 @@ def pca_similarity(covar_a, covar_b):
             The second covariance matrix.
     """
     # Take the square root of the symmetric matrices
+    import scipy.linalg as spla
     a_sq = spla.sqrtm(covar_a)
     b_sq = spla.sqrtm(covar_b)
 
@@ -443,7 +443,7 @@ def pca_convergence(f, eq_time=0*picosecond, n_parts=None, step=1, fn='PCA_conve
         n_parts = np.array([1,3,10,30,100,300])
 
     # Read in the timestep and the number of atoms
-    time = f['trajectory/time']
+    time = get_dataset(f, 'trajectory/time')
     timestep = time[1] - time[0]
     time_length = len(time)
 
@@ -475,7 +475,7 @@ def pca_convergence(f, eq_time=0*picosecond, n_parts=None, step=1, fn='PCA_conve
     ### ---PART B: SIMILARITY OF BOOTSTRAPPED TRAJECTORIES --- ###
 
     # Read in the positions, which will be used to generate bootstrapped trajectories
-    pos = f['trajectory/pos'][eq_size:,:,:]
+    pos = get_dataset(f, 'trajectory/pos')[eq_size:,:,:]
     pos = pos.reshape(pos.shape[0], -1)
 
     if mw:
@@ -494,7 +494,7 @@ def pca_convergence(f, eq_time=0*picosecond, n_parts=None, step=1, fn='PCA_conve
             log('Processing %s of %s bootstrapped trajectories' %(k+1,n_bootstrap))
             # Create a bootstrapped trajectory bt
             pos_bt = np.zeros(pos.shape)
-            random_time = random.random(time_length)*time_length
+            random_time = np.random.random(time_length)*time_length
             for h in np.arange(time_length):
                 pos_bt[h,:] = pos[random_time[h],:]
 
@@ -524,6 +524,7 @@ def pca_convergence(f, eq_time=0*picosecond, n_parts=None, step=1, fn='PCA_conve
 
     ### ---PART C: PROCESSING THE RESULTS --- ###
 
+    import matplotlib.pyplot as pt
     pt.clf()
     pt.semilogx((time[-1]-time[0])/n_parts/picosecond, sim_block/sim_bt_all, 'r-')
     pt.semilogx((time[-1]-time[0])/n_parts/picosecond, sim_block/sim_bt_all, 'rs')
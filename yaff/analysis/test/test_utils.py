@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# YAFF is yet another force-field code.
+# Copyright (C) 2011 Toon Verstraelen <Toon.Verstraelen@UGent.be>,
+# Louis Vanduyfhuys <Louis.Vanduyfhuys@UGent.be>, Center for Molecular Modeling
+# (CMM), Ghent University, Ghent, Belgium; all rights reserved unless otherwise
+# stated.
+#
+# This file is part of YAFF.
+#
+# YAFF is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# YAFF is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+# --
+
+
+from __future__ import division
+
+import h5py as h5
+import numpy as np
+
+from yaff import *
+
+
+def get_random_walk_file(name, dtype=float, scale=None):
+    np.random.seed(1)
+    pos = np.random.normal(0, 0.1, (50, 4, 3)).cumsum(axis=0)
+    f = h5.File('yaff.analysis.test.test_utils.%s.h5' % name, driver='core', backing_store=False)
+    tgrp = f.create_group('trajectory')
+    tgrp['time'] = np.arange(50, dtype=float)
+    if scale is None:
+        tgrp['pos'] = pos.astype(dtype)
+    else:
+        tgrp['pos'] = np.round(pos/scale).astype(dtype)
+        tgrp['pos'].attrs['scale'] = scale
+    return f, pos
+
+
+def test_get_dataset():
+    f, pos = get_random_walk_file('test_get_dataset')
+    with f:
+        assert get_dataset(f, 'trajectory/pos') == f['trajectory/pos']
+
+
+def test_get_dataset_float32():
+    f, pos = get_random_walk_file('test_get_dataset_float32', np.float32)
+    with f:
+        ds = get_dataset(f, 'trajectory/pos')
+        assert isinstance(ds, DecodedDataset)
+        assert ds.shape == pos.shape
+        assert len(ds) == len(pos)
+        assert ds.dtype == np.float64
+        assert ds[3].dtype == np.float64
+        assert abs(ds[:] - pos).max() < 1e-5
+        work = np.zeros((2, 3))
+        ds.read_direct(work, (5, [0, 2]))
+        assert (work == ds[5, [0, 2]]).all()
+
+
+def test_get_dataset_quantized():
+    f, pos = get_random_walk_file('test_get_dataset_quantized', np.int16, 1e-3)
+    with f:
+        ds = get_dataset(f, 'trajectory/pos')
+        assert isinstance(ds, DecodedDataset)
+        assert abs(ds[:] - pos).max() <= 0.5e-3
+        assert abs(ds[2:10:2, 1] - pos[2:10:2, 1]).max() <= 0.5e-3
+
+
+def test_diffusion_offline_quantized():
+    results = []
+    for dtype, scale in (float, None), (np.float32, None), (np.int16, 1e-3):
+        f, pos = get_random_walk_file('test_diffusion_offline_quantized', dtype, scale)
+        with f:
+            diff = Diffusion(f, mult=3)
+            results.append(diff.msds)
+    assert abs(results[1] - results[0]).max() < 1e-5
+    assert abs(results[2] - results[0]).max() < 1e-3
@@ -26,10 +26,10 @@
 
 from __future__ import division
 
-import h5py as h5
+import numpy as np
 
 
-__all__ = ['get_slice']
+__all__ = ['get_slice', 'get_dataset', 'DecodedDataset']
 
 
 def get_slice(f, start=0, end=-1, max_sample=None, step=None):
@@ -74,6 +74,7 @@ def get_slice(f, start=0, end=-1, max_sample=None, step=None):
     if f is None or 'trajectory' not in f:
         nrow = None
     else:
+        import h5py as h5
         nrow = min(ds.shape[0] for ds in f['trajectory'].values() if isinstance(ds, h5.Dataset))
         if end < 0:
             end = nrow + end + 1
@@ -93,3 +94,64 @@ def get_slice(f, start=0, end=-1, max_sample=None, step=None):
     elif max_sample is not None:
         raise ValueError('Both step and max_sample are given at the same time.')
     return start, end, step
+
+
+def get_dataset(f, path):
+    """Return a trajectory dataset that can be read in double precision
+
+       **Arguments:**
+
+       f
+            An HDF5.File instance.
+
+       path
+            The path of the dataset in the file.
+
+       Datasets stored in reduced precision or in quantized form (see
+       :class:`yaff.sampling.io.StoragePolicy`) are wrapped in a
+       ``DecodedDataset``, which converts the data to double precision when it
+       is read. Other datasets are returned as such.
+    """
+    ds = f[path]
+    if 'scale' in ds.attrs or (ds.dtype.kind == 'f' and ds.dtype != np.float64):
+        return DecodedDataset(ds)
+    return ds
+
+
+class DecodedDataset(object):
+    """Read-only view of a reduced precision or quantized dataset
+
+       Only the parts of the h5py.Dataset interface that are used in the
+       analysis routines are supported: ``shape``, ``chunks``, ``dtype``,
+       ``attrs``, ``len``, indexing and ``read_direct``.
+    """
+    def __init__(self, ds):
+        """
+           **Arguments:**
+
+           ds
+                An h5py.Dataset instance.
+        """
+        self.ds = ds
+        self.scale = ds.attrs.get('scale')
+
+    shape = property(lambda self: self.ds.shape)
+    chunks = property(lambda self: self.ds.chunks)
+    attrs = property(lambda self: self.ds.attrs)
+    dtype = np.dtype(float)
+
+    def __len__(self):
+        return len(self.ds)
+
+    def __getitem__(self, index):
+        result = np.array(self.ds[index], dtype=float)
+        if self.scale is not None:
+            result *= self.scale
+        return result
+
+    def read_direct(self, dest, source_sel=None, dest_sel=None):
+        if source_sel is None:
+            source_sel = Ellipsis
+        if dest_sel is None:
+            dest_sel = Ellipsis
+        dest[dest_sel] = self[source_sel]
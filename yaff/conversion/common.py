@@ -26,8 +26,6 @@
 
 from __future__ import division
 
-import h5py as h5
-
 from yaff.log import log
 
 
@@ -93,10 +91,14 @@ def get_last_trajectory_row(dss):
 
        dss
             A list of datasets or the trajectory group.
+
+       Rows that were allocated by ``write_to_dataset`` but never filled, e.g.
+       after an interrupted conversion, are not counted.
     '''
+    import h5py as h5
     if isinstance(dss, h5.Group):
         dss = dss.values()
-    row = min(ds.shape[0] for ds in dss)
+    row = min(ds.attrs.get('nrow', ds.shape[0]) for ds in dss)
     return row
 
 
@@ -113,10 +115,18 @@ def write_to_dataset(ds, value, row):
 
        row
             The row index.
+
+       The dataset is extended geometrically, to avoid a resize for every
+       new row. The excess rows are removed by ``check_trajectory_rows``.
+       Until then, the number of rows that contain data is kept in the
+       attribute ``nrow``.
     '''
     if ds.shape[0] <= row:
-        ds.resize(row+1, axis=0)
+        ds.resize(max(row+1, (3*ds.shape[0])//2), axis=0)
+        ds.attrs['nrow'] = row
     ds[row] = value
+    if 'nrow' in ds.attrs:
+        ds.attrs['nrow'] = max(ds.attrs['nrow'], row+1)
 
 
 def check_trajectory_rows(tgrp, dss, row):
@@ -132,7 +142,14 @@ def check_trajectory_rows(tgrp, dss, row):
 
        row
             The last row.
+
+       Datasets that were extended by ``write_to_dataset`` are first trimmed
+       to the given number of rows.
     '''
+    for ds in dss:
+        if 'nrow' in ds.attrs:
+            ds.resize(row, axis=0)
+            del ds.attrs['nrow']
     # check the sizes of the modified datasets
     for ds in dss:
         assert ds.shape[0] >= row
@@ -70,3 +70,23 @@ def test_xyz_to_hdf5_alt():
             assert abs(f['trajectory/test'][offset,0,0] - 3.340669) < 1e-5
             assert abs(f['trajectory/test'][-1,-1,-1] - -3.335574) < 1e-5
             assert abs(f['trajectory/test'][offset+3,2,1] - 3.363249) < 1e-5
+
+
+def test_xyz_to_hdf5_interrupted():
+    with h5.File('yaff.conversion.test.test_xyz.test_xyz_to_hdf5_interrupted.h5', driver='core', backing_store=False) as f:
+        fn_xyz = pkg_resources.resource_filename(__name__, '../../data/test/water_trajectory.xyz')
+        system = System.from_file(fn_xyz)
+        system.to_hdf5(f)
+        xyz_to_hdf5(f, fn_xyz)
+        # Mimic a conversion that stopped before the excess rows were trimmed.
+        ds = f['trajectory/pos']
+        write_to_dataset(ds, system.pos, 5)
+        assert ds.shape[0] > 6
+        assert get_last_trajectory_row(f['trajectory']) == 6
+        # A new conversion continues after the last row with data.
+        xyz_to_hdf5(f, fn_xyz)
+        assert ds.shape[0] == 11
+        assert 'nrow' not in ds.attrs
+        assert abs(ds[5] - system.pos).max() < 1e-10
+        assert abs(ds[6,0,0] - 3.340669*angstrom) < 1e-5
+        assert abs(ds[-1,-1,-1] - -3.335574*angstrom) < 1e-5
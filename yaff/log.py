@@ -33,6 +33,8 @@
 from __future__ import division
 
 import atexit
+import threading
+from contextlib import contextmanager
 
 from molmod.log import ScreenLog, TimerGroup
 
@@ -73,6 +75,30 @@ __/\\\__________________________________________________________________/\\\____
 ____\///__________________________________________________________________\///__
 """
 
-timer = TimerGroup()
+class MainThreadTimerGroup(TimerGroup):
+    '''A TimerGroup that only times sections of the thread that created it
+
+       The timer keeps a single stack of sections, which would get corrupted
+       when sections are entered concurrently by worker threads, e.g. when
+       force field parts are computed on a thread pool. Sections entered by
+       other threads are therefore ignored and do not appear in the report.
+       Because the timers measure the CPU time of the whole process, the time
+       spent in worker threads is still accounted to the section of the main
+       thread that waits for them.
+    '''
+    def __init__(self):
+        self._thread = threading.current_thread()
+        TimerGroup.__init__(self)
+
+    @contextmanager
+    def section(self, label):
+        if threading.current_thread() is self._thread:
+            with TimerGroup.section(self, label):
+                yield
+        else:
+            yield
+
+
+timer = MainThreadTimerGroup()
 log = ScreenLog('YAFF', yaff.__version__, head_banner, foot_banner, timer)
 atexit.register(log.print_footer)
@@ -83,6 +83,9 @@ from yaff.pes.iclist import *
 from yaff.pes.vlist import *
 from yaff.pes.generator import *
 from yaff.pes.ff import *
+from yaff.pes.ffcache import *
+from yaff.pes.ffsupercell import *
+from yaff.pes.ffvariants import *
 from yaff.pes.nlist import *
 from yaff.pes.parameters import *
 from yaff.pes.scaling import *
@@ -25,7 +25,7 @@
 
 cimport dlist
 
-cdef extern from "comlist.h":
+cdef extern from "comlist.h" nogil:
     ctypedef struct comlist_row_type:
         long i
         double w
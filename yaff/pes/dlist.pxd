@@ -25,7 +25,7 @@
 
 cimport cell
 
-cdef extern from "dlist.h":
+cdef extern from "dlist.h" nogil:
     ctypedef struct dlist_row_type:
         double dx, dy, dz
         long i, j
@@ -131,6 +131,38 @@ class DeltaList(object):
         """
         dlist_back(gpos, vtens, self.deltas, self.ndelta)
 
+    def back_hessian(self, hessian):
+        """Transform a Hessian towards the relative vectors into a Cartesian
+           Hessian.
+
+           **Arguments:**
+
+           hessian
+                A sparse matrix with shape (3*ndelta, 3*ndelta) containing
+                second derivatives of the energy towards the components of the
+                relative vectors.
+
+           **Returns:** a ``scipy.sparse.csr_matrix`` with shape
+           (3*natom, 3*natom).
+        """
+        import scipy.sparse
+        deltas = self.deltas[:self.ndelta]
+        rows = np.arange(3*self.ndelta)
+        jacobian = scipy.sparse.csr_matrix(
+            (
+                np.concatenate([np.ones(3*self.ndelta), -np.ones(3*self.ndelta)]),
+                (
+                    np.concatenate([rows, rows]),
+                    np.concatenate([
+                        (3*deltas['j'][:,None] + np.arange(3)).ravel(),
+                        (3*deltas['i'][:,None] + np.arange(3)).ravel(),
+                    ]),
+                ),
+            ),
+            shape=(3*self.ndelta, 3*self.system.natom)
+        )
+        return (jacobian.T*hessian*jacobian).tocsr()
+
     def lookup_atoms(self, row):
         """Look up the atom for a given row index."""
         return [self.deltas[row]['i'], self.deltas[row]['j']]
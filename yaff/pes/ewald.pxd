@@ -26,7 +26,7 @@
 cimport pair_pot
 cimport cell
 
-cdef extern from "ewald.h":
+cdef extern from "ewald.h" nogil:
     double compute_ewald_reci(double *pos, long natom, long natom_frame, double *charges,
                               cell.cell_type *unitcell, double alpha,
                               long *gmax, double gcut, double dielectric,
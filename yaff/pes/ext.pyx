@@ -61,8 +61,8 @@ __all__ = [
     'compute_ewald_corr',
     'comlist_dtype', 'comlist_forward', 'comlist_back',
     'delta_dtype', 'dlist_forward', 'dlist_back',
-    'iclist_dtype', 'iclist_forward', 'iclist_back',
-    'vlist_dtype', 'vlist_forward', 'vlist_back',
+    'iclist_dtype', 'iclist_forward', 'iclist_back', 'iclist_hessian',
+    'vlist_dtype', 'vlist_forward', 'vlist_back', 'vlist_hessian',
     'compute_grid3d',
 ]
 
@@ -421,11 +421,14 @@ def nlist_build(np.ndarray[double, ndim=2] pos, double rcut,
     assert status.flags['C_CONTIGUOUS']
     assert neighs.flags['C_CONTIGUOUS']
     assert rmax.shape[0] == unitcell.nvec
-    return nlist.nlist_build_low(
-        <double*>pos.data, rcut, <long*>rmax.data,
-        unitcell._c_cell, <long*>status.data,
-        <nlist.neigh_row_type*>neighs.data, len(pos), n_frame, len(neighs)
-    )
+    cdef bint complete
+    with nogil:
+        complete = nlist.nlist_build_low(
+            <double*>pos.data, rcut, <long*>rmax.data,
+            unitcell._c_cell, <long*>status.data,
+            <nlist.neigh_row_type*>neighs.data, pos.shape[0], n_frame, neighs.shape[0]
+        )
+    return complete
 
 
 def nlist_status_finish(status):
@@ -468,10 +471,11 @@ def nlist_recompute(np.ndarray[double, ndim=2] pos,
     assert pos_old.flags['C_CONTIGUOUS']
     assert pos.shape[0] == pos_old.shape[0]
     assert neighs.flags['C_CONTIGUOUS']
-    nlist.nlist_recompute_low(
-        <double*>pos.data, <double*>pos_old.data, unitcell._c_cell,
-        <nlist.neigh_row_type*>neighs.data, len(neighs)
-    )
+    with nogil:
+        nlist.nlist_recompute_low(
+            <double*>pos.data, <double*>pos_old.data, unitcell._c_cell,
+            <nlist.neigh_row_type*>neighs.data, neighs.shape[0]
+        )
 
 
 def nlist_inc_r(Cell unitcell, np.ndarray[long, ndim=1] r, np.ndarray[long, ndim=1] rmax):
@@ -722,11 +726,14 @@ cdef class PairPot:
             assert vtens.shape[1] == 3
             my_vtens = <double*>vtens.data
 
-        return pair_pot.pair_pot_compute(
-            <nlist.neigh_row_type*>neighs.data, nneigh,
-            <pair_pot.scaling_row_type*>stab.data, len(stab),
-            self._c_pair_pot, my_gpos, my_vtens
-        )
+        cdef double energy
+        with nogil:
+            energy = pair_pot.pair_pot_compute(
+                <nlist.neigh_row_type*>neighs.data, nneigh,
+                <pair_pot.scaling_row_type*>stab.data, stab.shape[0],
+                self._c_pair_pot, my_gpos, my_vtens
+            )
+        return energy
 
 
 cdef class PairPotLJ(PairPot):
@@ -1574,6 +1581,12 @@ cdef class PairPotDampDisp(PairPot):
 
     b_cross = property(_get_b_cross)
 
+    def _get_power(self):
+        '''The power to which 1/d is raised'''
+        return self._c_power
+
+    power = property(_get_power)
+
 
 cdef class PairPotDisp68BJDamp(PairPot):
     r'''Dispersion term with r^-6 and r^-8 term and Becke-Johnson damping
@@ -2424,11 +2437,14 @@ def compute_ewald_reci(np.ndarray[double, ndim=2] pos,
         assert vtens.shape[1] == 3
         my_vtens = <double*>vtens.data
 
-    return ewald.compute_ewald_reci(<double*>pos.data, len(pos), n_frame,
-                                    <double*>charges.data,
-                                    unitcell._c_cell, alpha, <long*>gmax.data,
-                                    gcut, dielectric, my_gpos, my_work,
-                                    my_vtens)
+    cdef double energy
+    with nogil:
+        energy = ewald.compute_ewald_reci(<double*>pos.data, pos.shape[0], n_frame,
+                                          <double*>charges.data,
+                                          unitcell._c_cell, alpha, <long*>gmax.data,
+                                          gcut, dielectric, my_gpos, my_work,
+                                          my_vtens)
+    return energy
 
 
 def compute_ewald_reci_dd(np.ndarray[double, ndim=2] pos,
@@ -2522,12 +2538,15 @@ def compute_ewald_reci_dd(np.ndarray[double, ndim=2] pos,
         assert vtens.shape[1] == 3
         my_vtens = <double*>vtens.data
 
-    return ewald.compute_ewald_reci_dd(<double*>pos.data, len(pos), n_frame,
-                                    <double*>charges.data,
-                                    <double*>dipoles.data,
-                                    unitcell._c_cell, alpha,
-                                    <long*>gmax.data, gcut, my_gpos, my_work,
-                                    my_vtens)
+    cdef double energy
+    with nogil:
+        energy = ewald.compute_ewald_reci_dd(<double*>pos.data, pos.shape[0], n_frame,
+                                          <double*>charges.data,
+                                          <double*>dipoles.data,
+                                          unitcell._c_cell, alpha,
+                                          <long*>gmax.data, gcut, my_gpos, my_work,
+                                          my_vtens)
+    return energy
 
 
 def compute_ewald_corr(np.ndarray[double, ndim=2] pos,
@@ -2599,11 +2618,14 @@ def compute_ewald_corr(np.ndarray[double, ndim=2] pos,
         assert vtens.shape[1] == 3
         my_vtens = <double*>vtens.data
 
-    return ewald.compute_ewald_corr(
-        <double*>pos.data, <double*>charges.data, unitcell._c_cell, alpha,
-        <pair_pot.scaling_row_type*>stab.data, len(stab), dielectric,
-        my_gpos, my_vtens, len(pos)
-    )
+    cdef double energy
+    with nogil:
+        energy = ewald.compute_ewald_corr(
+            <double*>pos.data, <double*>charges.data, unitcell._c_cell, alpha,
+            <pair_pot.scaling_row_type*>stab.data, stab.shape[0], dielectric,
+            my_gpos, my_vtens, pos.shape[0]
+        )
+    return energy
 
 def compute_ewald_corr_dd(np.ndarray[double, ndim=2] pos,
                        np.ndarray[double, ndim=1] charges,
@@ -2672,11 +2694,14 @@ def compute_ewald_corr_dd(np.ndarray[double, ndim=2] pos,
         assert vtens.shape[1] == 3
         my_vtens = <double*>vtens.data
 
-    return ewald.compute_ewald_corr_dd(
-        <double*>pos.data, <double*>charges.data, <double*>dipoles.data, unitcell._c_cell, alpha,
-        <pair_pot.scaling_row_type*>stab.data, len(stab), my_gpos,
-        my_vtens, len(pos)
-    )
+    cdef double energy
+    with nogil:
+        energy = ewald.compute_ewald_corr_dd(
+            <double*>pos.data, <double*>charges.data, <double*>dipoles.data, unitcell._c_cell, alpha,
+            <pair_pot.scaling_row_type*>stab.data, stab.shape[0], my_gpos,
+            my_vtens, pos.shape[0]
+        )
+    return energy
 
 
 #
@@ -2719,13 +2744,14 @@ def comlist_forward(np.ndarray[dlist.dlist_row_type, ndim=1] deltas not None,
     assert compos.shape[1] == 3
     assert comsizes.flags['C_CONTIGUOUS']
     assert comtab.flags['C_CONTIGUOUS']
-    comlist.comlist_forward(
-        <dlist.dlist_row_type*>deltas.data,
-        <double*>pos.data,
-        <double*>compos.data,
-        <long*>comsizes.data,
-        <comlist.comlist_row_type*>comtab.data,
-        len(comsizes))
+    with nogil:
+        comlist.comlist_forward(
+            <dlist.dlist_row_type*>deltas.data,
+            <double*>pos.data,
+            <double*>compos.data,
+            <long*>comsizes.data,
+            <comlist.comlist_row_type*>comtab.data,
+            comsizes.shape[0])
 
 
 def comlist_back(np.ndarray[dlist.dlist_row_type, ndim=1] deltas not None,
@@ -2761,13 +2787,14 @@ def comlist_back(np.ndarray[dlist.dlist_row_type, ndim=1] deltas not None,
     assert gcompos.shape[1] == 3
     assert comsizes.flags['C_CONTIGUOUS']
     assert comtab.flags['C_CONTIGUOUS']
-    comlist.comlist_back(
-        <dlist.dlist_row_type*>deltas.data,
-        <double*>gpos.data,
-        <double*>gcompos.data,
-        <long*>comsizes.data,
-        <comlist.comlist_row_type*>comtab.data,
-        len(comsizes))
+    with nogil:
+        comlist.comlist_back(
+            <dlist.dlist_row_type*>deltas.data,
+            <double*>gpos.data,
+            <double*>gcompos.data,
+            <long*>comsizes.data,
+            <comlist.comlist_row_type*>comtab.data,
+            comsizes.shape[0])
 
 
 #
@@ -2802,8 +2829,9 @@ def dlist_forward(np.ndarray[double, ndim=2] pos,
     assert pos.flags['C_CONTIGUOUS']
     assert pos.shape[1] == 3
     assert deltas.flags['C_CONTIGUOUS']
-    dlist.dlist_forward(<double*>pos.data, unitcell._c_cell,
-                        <dlist.dlist_row_type*>deltas.data, ndelta)
+    with nogil:
+        dlist.dlist_forward(<double*>pos.data, unitcell._c_cell,
+                            <dlist.dlist_row_type*>deltas.data, ndelta)
 
 def dlist_back(np.ndarray[double, ndim=2] gpos,
                np.ndarray[double, ndim=2] vtens,
@@ -2848,8 +2876,9 @@ def dlist_back(np.ndarray[double, ndim=2] gpos,
         assert vtens.shape[1] == 3
         my_vtens = <double*>vtens.data
 
-    dlist.dlist_back(my_gpos, my_vtens,
-                     <dlist.dlist_row_type*>deltas.data, ndelta)
+    with nogil:
+        dlist.dlist_back(my_gpos, my_vtens,
+                         <dlist.dlist_row_type*>deltas.data, ndelta)
 
 
 #
@@ -2878,8 +2907,9 @@ def iclist_forward(np.ndarray[dlist.dlist_row_type, ndim=1] deltas,
     '''
     assert deltas.flags['C_CONTIGUOUS']
     assert ictab.flags['C_CONTIGUOUS']
-    iclist.iclist_forward(<dlist.dlist_row_type*>deltas.data,
-                          <iclist.iclist_row_type*>ictab.data, nic)
+    with nogil:
+        iclist.iclist_forward(<dlist.dlist_row_type*>deltas.data,
+                              <iclist.iclist_row_type*>ictab.data, nic)
 
 def iclist_back(np.ndarray[dlist.dlist_row_type, ndim=1] deltas,
                 np.ndarray[iclist.iclist_row_type, ndim=1] ictab, long nic):
@@ -2900,8 +2930,53 @@ def iclist_back(np.ndarray[dlist.dlist_row_type, ndim=1] deltas,
     '''
     assert deltas.flags['C_CONTIGUOUS']
     assert ictab.flags['C_CONTIGUOUS']
-    iclist.iclist_back(<dlist.dlist_row_type*>deltas.data,
-                       <iclist.iclist_row_type*>ictab.data, nic)
+    with nogil:
+        iclist.iclist_back(<dlist.dlist_row_type*>deltas.data,
+                           <iclist.iclist_row_type*>ictab.data, nic)
+
+def iclist_hessian(np.ndarray[dlist.dlist_row_type, ndim=1] deltas,
+                   np.ndarray[iclist.iclist_row_type, ndim=1] ictab, long nic,
+                   np.ndarray[double, ndim=2] jacobian,
+                   np.ndarray[double, ndim=3] hessian):
+    '''First and second derivatives of the internal coordinates
+
+       **Arguments:**
+
+       deltas
+            The delta list array (input)
+
+       ictab
+            The table with internal coordinates (input).
+
+       nic
+            The number of records in the ``ictab`` array to consider.
+
+       jacobian
+            The derivatives of each internal coordinate towards the components
+            of its relative vectors (output). numpy array with shape (nic, 9).
+
+       hessian
+            The second derivatives of each internal coordinate towards the
+            components of its relative vectors (output). numpy array with shape
+            (nic, 9, 9).
+
+       The components of the relative vectors are ordered as
+       ``i0.x, i0.y, i0.z, i1.x, ..., i2.z``, where ``i0``, ``i1`` and ``i2``
+       refer to the fields in ``ictab``.
+    '''
+    assert deltas.flags['C_CONTIGUOUS']
+    assert ictab.flags['C_CONTIGUOUS']
+    assert jacobian.flags['C_CONTIGUOUS']
+    assert jacobian.shape[0] >= nic
+    assert jacobian.shape[1] == 9
+    assert hessian.flags['C_CONTIGUOUS']
+    assert hessian.shape[0] >= nic
+    assert hessian.shape[1] == 9
+    assert hessian.shape[2] == 9
+    with nogil:
+        iclist.iclist_hessian(<dlist.dlist_row_type*>deltas.data,
+                              <iclist.iclist_row_type*>ictab.data, nic,
+                              <double*>jacobian.data, <double*>hessian.data)
 
 
 #
@@ -2913,7 +2988,8 @@ vlist_dtype = np.asarray(<vlist.vlist_row_type[:1]>(&_vlist_row_tmp)).dtype
 
 
 def vlist_forward(np.ndarray[iclist.iclist_row_type, ndim=1] ictab,
-                  np.ndarray[vlist.vlist_row_type, ndim=1] vtab, long nv):
+                  np.ndarray[vlist.vlist_row_type, ndim=1] vtab, long nv,
+                  np.ndarray[double, ndim=1] kind_energies=None):
     '''Computes valence energy terms based on a list of internal coordinates
 
        **Arguments:**
@@ -2926,11 +3002,29 @@ def vlist_forward(np.ndarray[iclist.iclist_row_type, ndim=1] ictab,
 
        nv
             The number of records to consider in ``vtab``.
+
+       **Optional arguments:**
+
+       kind_energies
+            An output array for the sum of the energy terms for each kind of
+            internal coordinate, i.e. element ``i`` contains the energy of all
+            terms whose (first) internal coordinate has kind ``i``. Cross
+            terms are not included.
     '''
+    cdef double* kind_energies_ptr = NULL
+    cdef long nkind = 0
     assert ictab.flags['C_CONTIGUOUS']
     assert vtab.flags['C_CONTIGUOUS']
-    return vlist.vlist_forward(<iclist.iclist_row_type*>ictab.data,
-                               <vlist.vlist_row_type*>vtab.data, nv)
+    if kind_energies is not None:
+        assert kind_energies.flags['C_CONTIGUOUS']
+        kind_energies_ptr = <double*>kind_energies.data
+        nkind = kind_energies.shape[0]
+    cdef double energy
+    with nogil:
+        energy = vlist.vlist_forward(<iclist.iclist_row_type*>ictab.data,
+                                     <vlist.vlist_row_type*>vtab.data, nv,
+                                     kind_energies_ptr, nkind)
+    return energy
 
 def vlist_back(np.ndarray[iclist.iclist_row_type, ndim=1] ictab,
                np.ndarray[vlist.vlist_row_type, ndim=1] vtab, long nv):
@@ -2952,8 +3046,42 @@ def vlist_back(np.ndarray[iclist.iclist_row_type, ndim=1] ictab,
     '''
     assert ictab.flags['C_CONTIGUOUS']
     assert vtab.flags['C_CONTIGUOUS']
-    vlist.vlist_back(<iclist.iclist_row_type*>ictab.data,
-                     <vlist.vlist_row_type*>vtab.data, nv)
+    with nogil:
+        vlist.vlist_back(<iclist.iclist_row_type*>ictab.data,
+                         <vlist.vlist_row_type*>vtab.data, nv)
+
+def vlist_hessian(np.ndarray[iclist.iclist_row_type, ndim=1] ictab,
+                  np.ndarray[vlist.vlist_row_type, ndim=1] vtab, long nv,
+                  np.ndarray[double, ndim=2] hessian):
+    '''Second derivatives of the valence energy terms.
+
+       **Arguments:**
+
+       ictab
+            The table with internal coordinates (input).
+
+       vtab
+            The table with covalent energy terms (input).
+
+       nv
+            The number of records to consider in ``vtab``.
+
+       hessian
+            The second derivatives of each term towards its internal
+            coordinates (output). numpy array with shape (nv, 3). The three
+            columns contain the second derivative towards ``ic0``, the mixed
+            derivative towards ``ic0`` and ``ic1`` and the second derivative
+            towards ``ic1``, respectively.
+    '''
+    assert ictab.flags['C_CONTIGUOUS']
+    assert vtab.flags['C_CONTIGUOUS']
+    assert hessian.flags['C_CONTIGUOUS']
+    assert hessian.shape[0] >= nv
+    assert hessian.shape[1] == 3
+    with nogil:
+        vlist.vlist_hessian(<iclist.iclist_row_type*>ictab.data,
+                            <vlist.vlist_row_type*>vtab.data, nv,
+                            <double*>hessian.data)
 
 #
 # grid
@@ -2965,4 +3093,7 @@ def compute_grid3d(double[::1] center not None,
     assert center.shape[0] == 3
     cdef size_t shape[3]
     shape[:] = egrid.shape
-    return grid.compute_grid3d(&center[0], unitcell._c_cell, &egrid[0, 0, 0], &shape[0])
+    cdef double energy
+    with nogil:
+        energy = grid.compute_grid3d(&center[0], unitcell._c_cell, &egrid[0, 0, 0], &shape[0])
+    return energy
@@ -40,13 +40,17 @@
 
 from __future__ import division
 
+import os
+from multiprocessing.pool import ThreadPool
+
 import numpy as np
-import yaml
 import molmod
 
 from yaff.log import log, timer
+from yaff.pool import get_fork_pool, get_worker_args
 from yaff.pes.ext import compute_ewald_reci, compute_ewald_reci_dd, compute_ewald_corr, \
-    compute_ewald_corr_dd, PairPotEI, PairPotLJ, PairPotMM3, PairPotMM3CAP, PairPotGrimme, compute_grid3d
+    compute_ewald_corr_dd, PairPotEI, PairPotLJ, PairPotMM3, PairPotMM3CAP, PairPotGrimme, compute_grid3d, \
+    delta_dtype, iclist_dtype, vlist_dtype
 from yaff.pes.dlist import DeltaList
 from yaff.pes.iclist import InternalCoordinateList
 from yaff.pes.vlist import ValenceList, ValenceTerm
@@ -67,6 +71,14 @@ class ForcePart(object):
     '''Base class for anything that can compute energies (and optionally gradient
        and virial) for a ``System`` object.
     '''
+    # Subclasses set this to True when _internal_compute only adds
+    # contributions to its gpos and vtens arguments. Such parts can work
+    # directly on the arrays of the caller, see ``set_compute_mode``.
+    accumulates = False
+    # Subclasses set this to False when the results only depend on the cell
+    # vectors, such that they are not recomputed after update_pos.
+    depends_on_pos = True
+
     def __init__(self, name, system):
         """
            **Arguments:**
@@ -85,6 +97,16 @@ class ForcePart(object):
         self.energy = 0.0
         self.gpos = np.zeros((system.natom, 3), float)
         self.vtens = np.zeros((3, 3), float)
+        # settings of the compute method, see set_compute_mode:
+        self.keep_derivatives = True
+        self.nan_check = 1
+        self.cache_results = False
+        self._ncompute = 0
+        # version counters of the positions and the cell vectors, used to
+        # check if the results of the last call to compute are still valid:
+        self.pos_version = 0
+        self.rvecs_version = 0
+        self._cache = None
         self.clear()
 
     def clear(self):
@@ -94,6 +116,71 @@ class ForcePart(object):
         self.energy = np.nan
         self.gpos[:] = np.nan
         self.vtens[:] = np.nan
+        self._cache = None
+
+    def set_compute_mode(self, keep_derivatives=None, nan_check=None, cache_results=None):
+        '''Control how the compute method handles the derivatives
+
+           **Optional arguments:**
+
+           keep_derivatives
+                When True (default), the gradient and virial of this part are
+                computed in the ``gpos`` and ``vtens`` attributes, before they
+                are added to the arrays of the caller. When False, parts that
+                support it (see the ``accumulates`` attribute) add their
+                contributions directly to the arrays of the caller. This
+                avoids one (N, 3) buffer and a few passes over it per part,
+                but the ``gpos`` and ``vtens`` attributes of the part are then
+                no longer filled in.
+
+           nan_check
+                The derivatives are checked for not-a-number values every
+                ``nan_check`` calls to compute. The default (1) checks every
+                call, 0 disables the check. The energy is always checked.
+
+           cache_results
+                When True, the results of the last call to compute are reused
+                as long as the positions and cell vectors have not changed
+                through ``update_pos`` and ``update_rvecs``. Any other change
+                that affects the results, e.g. a modification of parameters
+                or a direct assignment to ``system.pos``, must be followed by
+                a call to the ``clear`` method. This is disabled by default.
+
+           Arguments that are not given are left unchanged.
+        '''
+        if keep_derivatives is not None:
+            self.keep_derivatives = keep_derivatives
+            if not keep_derivatives:
+                self.gpos[:] = np.nan
+                self.vtens[:] = np.nan
+                self._cache = None
+        if nan_check is not None:
+            if nan_check < 0:
+                raise ValueError('nan_check must be zero or positive.')
+            self.nan_check = nan_check
+        if cache_results is not None:
+            self.cache_results = cache_results
+            self._cache = None
+
+    def _get_cache_key(self):
+        '''The versions of the inputs on which the results depend'''
+        if self.depends_on_pos:
+            return self.pos_version, self.rvecs_version
+        return None, self.rvecs_version
+
+    def is_cached(self, do_gpos=False, do_vtens=False):
+        '''Return True when compute can reuse the results of the last call
+
+           **Optional arguments:**
+
+           do_gpos, do_vtens
+                Whether the gradient and the virial tensor are needed.
+        '''
+        if not self.cache_results or self._cache is None:
+            return False
+        key, has_gpos, has_vtens = self._cache
+        return key == self._get_cache_key() and \
+            (has_gpos or not do_gpos) and (has_vtens or not do_vtens)
 
     def update_rvecs(self, rvecs):
         '''Let the ``ForcePart`` object know that the cell vectors have changed.
@@ -103,6 +190,7 @@ class ForcePart(object):
            rvecs
                 The new cell vectors.
         '''
+        self.rvecs_version += 1
         self.clear()
 
     def update_pos(self, pos):
@@ -113,7 +201,9 @@ class ForcePart(object):
            pos
                 The new atomic coordinates.
         '''
-        self.clear()
+        self.pos_version += 1
+        if self.depends_on_pos:
+            self.clear()
 
     def compute(self, gpos=None, vtens=None):
         """Compute the energy and optionally some derivatives for this FF (part)
@@ -144,14 +234,26 @@ class ForcePart(object):
            The energy is returned. The optional arguments are Fortran-style
            output arguments. When they are present, the corresponding results
            are computed and **added** to the current contents of the array.
+
+           See ``set_compute_mode`` for the options that trade diagnostics
+           for speed.
         """
-        if gpos is None:
-            my_gpos = None
+        if self.is_cached(gpos is not None, vtens is not None):
+            if gpos is not None:
+                gpos += self.gpos
+            if vtens is not None:
+                vtens += self.vtens
+            return self.energy
+        direct = self.accumulates and not self.keep_derivatives
+        self._ncompute += 1
+        check = self.nan_check > 0 and self._ncompute % self.nan_check == 0
+        if gpos is None or direct:
+            my_gpos = gpos
         else:
             my_gpos = self.gpos
             my_gpos[:] = 0.0
-        if vtens is None:
-            my_vtens = None
+        if vtens is None or direct:
+            my_vtens = vtens
         else:
             my_vtens = self.vtens
             my_vtens[:] = 0.0
@@ -159,13 +261,25 @@ class ForcePart(object):
         if np.isnan(self.energy):
             raise ValueError('The energy is not-a-number (nan).')
         if gpos is not None:
-            if np.isnan(my_gpos).any():
+            if check and np.isnan(my_gpos).any():
                 raise ValueError('Some gpos element(s) is/are not-a-number (nan).')
-            gpos += my_gpos
+            if not direct:
+                gpos += my_gpos
         if vtens is not None:
-            if np.isnan(my_vtens).any():
+            if check and np.isnan(my_vtens).any():
                 raise ValueError('Some vtens element(s) is/are not-a-number (nan).')
-            vtens += my_vtens
+            if not direct:
+                vtens += my_vtens
+        if self.cache_results:
+            key = self._get_cache_key()
+            has_gpos = gpos is not None and not direct
+            has_vtens = vtens is not None and not direct
+            # Derivatives from an earlier call with the same inputs remain
+            # valid when they were not recomputed now.
+            if self._cache is not None and self._cache[0] == key:
+                has_gpos = has_gpos or self._cache[1]
+                has_vtens = has_vtens or self._cache[2]
+            self._cache = (key, has_gpos, has_vtens)
         return self.energy
 
     def _internal_compute(self, gpos, vtens):
@@ -175,7 +289,9 @@ class ForcePart(object):
 
 class ForceField(ForcePart):
     '''A complete force field model.'''
-    def __init__(self, system, parts, nlist=None):
+    accumulates = True
+
+    def __init__(self, system, parts, nlist=None, nthread=1):
         """
            **Arguments:**
 
@@ -192,12 +308,33 @@ class ForceField(ForcePart):
            nlist
                 A ``NeighborList`` instance. This is required if some items in the
                 parts list use this nlist object.
+
+           nthread
+                The number of threads used to compute the parts concurrently.
+                Each part then writes to its own gradient and virial buffers,
+                which are summed afterwards. This is only beneficial when
+                several parts are expensive, e.g. real-space pair potentials
+                and the reciprocal Ewald sum, because only the low-level
+                routines run without the global interpreter lock. This can
+                also be changed later through the ``nthread`` attribute. The
+                threads are stopped by ``close`` or when the force field is
+                garbage collected.
         """
         ForcePart.__init__(self, 'all', system)
         self.system = system
         self.parts = []
         self.nlist = nlist
         self.needs_nlist_update = nlist is not None
+        self.nthread = nthread
+        self._thread_pool = None
+        self._thread_pool_key = None
+        self._part_gpos = None
+        self._part_vtens = None
+        # bookkeeping of the generators, see generate and update_parameters
+        self.generator_records = None
+        # Only the parts may reuse their results, see set_compute_mode. This
+        # is opt-in because direct changes to system.pos go unnoticed.
+        self.cache_parts = False
         for part in parts:
             self.add_part(part)
         if log.do_medium:
@@ -206,8 +343,11 @@ class ForceField(ForcePart):
                     len(self.parts), ', '.join(part.name for part in self.parts)
                 ))
                 log('Neighborlist present: %s' % (self.nlist is not None))
+                if self.nthread > 1:
+                    log('Parts are computed with %i threads.' % self.nthread)
 
     def add_part(self, part):
+        part.set_compute_mode(cache_results=self.cache_parts)
         self.parts.append(part)
         # Make the parts also accessible as simple attributes.
         name = 'part_%s' % part.name
@@ -216,7 +356,7 @@ class ForceField(ForcePart):
         self.__dict__[name] = part
 
     @classmethod
-    def generate(cls, system, parameters, **kwargs):
+    def generate(cls, system, parameters, cache=None, **kwargs):
         """Create a force field for the given system with the given parameters.
 
            **Arguments:**
@@ -231,8 +371,18 @@ class ForceField(ForcePart):
                 the Parameters class, or (iv) the filename of the parameter file
                 in the YAML format.
 
+           **Optional arguments:**
+
+           cache
+                The filename of an HDF5 file in which the generated tables are
+                stored. When the file exists and matches the topology of the
+                system, the parameters and the optional arguments, the force
+                field is rebuilt from the file without running the generators.
+                Otherwise, the force field is generated and the file is
+                (over)written. See :mod:`yaff.pes.ffcache`.
+
            See the constructor of the :class:`yaff.pes.generator.FFArgs` class
-           for the available optional arguments.
+           for the other optional arguments.
 
            This method takes care of setting up the FF object, and configuring
            all the necessary FF parts. This is a lot easier than creating an FF
@@ -241,28 +391,83 @@ class ForceField(ForcePart):
         """
         if system.ffatype_ids is None:
             raise ValueError('The generators needs ffatype_ids in the system object.')
+        if cache is not None:
+            from yaff.pes.ffcache import get_ff_cache_key, dump_ff_cache, load_ff_cache
+            key = get_ff_cache_key(system, parameters, kwargs)
+            if os.path.isfile(cache):
+                with log.section('GEN'), timer.section('Generator cache'):
+                    ff = load_ff_cache(cache, system, key)
+                    if ff is not None:
+                        if log.do_medium:
+                            log('Loaded force field from cache %s' % cache)
+                        return ff
+                    elif log.do_medium:
+                        log('Cache %s is outdated' % cache)
+            ff = cls.generate(system, parameters, **kwargs)
+            with log.section('GEN'), timer.section('Generator cache'):
+                if dump_ff_cache(cache, ff, key) and log.do_medium:
+                    log('Wrote force field cache %s' % cache)
+            return ff
         with log.section('GEN'), timer.section('Generator'):
-            from yaff.pes.generator import apply_generators, FFArgs
-            from yaff.pes.parameters import Parameters
+            from yaff.pes.generator import apply_generators, load_parameters, FFArgs
             if log.do_medium:
                 log('Generating force field from %s' % str(parameters))
-            if isinstance(parameters, str):
-                if parameters[-3:] == 'txt':
-                    parameters = Parameters.from_file(parameters)
-                    ff_args = FFArgs(**kwargs)
-                    apply_generators(system, parameters, ff_args)
-                else:
-                    yaml_dict = yaml.safe_load(open(parameters))
-                    ff_args = FFArgs(**kwargs)
-                    apply_generators(system, yaml_dict, ff_args)
-            else:
-                if isinstance(parameters, Parameters):
-                    raise NotImplementedError
-                else:
-                    yaml_dict = parameters
-                    ff_args = FFArgs(**kwargs)
-                    apply_generators(system, yaml_dict, ff_args)
-            return ForceField(system, ff_args.parts, ff_args.nlist)
+            ff_args = FFArgs(**kwargs)
+            apply_generators(system, load_parameters(parameters), ff_args)
+            ff = ForceField(system, ff_args.parts, ff_args.nlist)
+            ff.generator_records = ff_args.records
+            return ff
+
+    def update_parameters(self, parameters):
+        """Overwrite the parameters of a generated force field in-place.
+
+           **Arguments:**
+
+           parameters
+                The new parameters, in any of the formats accepted by
+                ``generate``.
+
+           The new parameters must contain the same sections as the ones used
+           to generate this force field and may only differ in the values of
+           the parameters of existing terms, e.g. force constants and rest
+           values. The atom types, the neighbor list and the scalings are not
+           matched again, which makes this much cheaper than ``generate``
+           when parameters are optimized. A ValueError is raised when the new
+           parameters would add or remove terms.
+
+           This is only supported for force fields made with ``generate`` and
+           not for all generators. Terms from unsupported generators raise a
+           NotImplementedError.
+        """
+        if self.generator_records is None:
+            raise ValueError('Only the parameters of force fields made with ForceField.generate can be updated.')
+        with log.section('GEN'), timer.section('Generator update'):
+            from yaff.pes.generator import update_generators, load_parameters
+            update_generators(self.system, load_parameters(parameters), self.generator_records)
+            for part in self.parts:
+                if isinstance(part, ForcePartTailCorrection):
+                    part_pair = getattr(self, 'part_%s' % part.name[len('tailcorr_'):])
+                    part.ecorr, part.wcorr = part_pair.pair_pot.prepare_tailcorrections(self.system.natom)
+                part.clear()
+            self.clear()
+            if log.do_medium:
+                log('Updated the parameters of %i generators.' % len(self.generator_records))
+
+    def supercell(self, *reps):
+        """Return a force field for a supercell of the system.
+
+           **Arguments:**
+
+           reps
+                The number of repetitions along each cell vector.
+
+           The tables of all parts are tiled over the periodic images, such
+           that the generators are not needed. The system of the new force
+           field is ``self.system.supercell(*reps)``. See
+           :mod:`yaff.pes.ffsupercell` for more details.
+        """
+        from yaff.pes.ffsupercell import get_ff_supercell
+        return get_ff_supercell(self, reps)
 
     def add_part_valence_com(self, comsystem, com_ff_tuple):
         '''
@@ -287,10 +492,27 @@ class ForceField(ForcePart):
         part_valence_com.name = 'valence_com'
         self.add_part(part_valence_com)
 
+    def set_compute_mode(self, keep_derivatives=None, nan_check=None, cache_results=None):
+        '''See :meth:`yaff.pes.ff.ForcePart.set_compute_mode`
+
+           The settings are applied to the force field and all its parts. The
+           mode of individual parts can be changed afterwards, e.g. to keep
+           the gradient of one part for diagnostics. Results are only cached
+           by the parts, such that the force field itself always sums the
+           contributions of its parts.
+        '''
+        ForcePart.set_compute_mode(self, keep_derivatives, nan_check)
+        if cache_results is not None:
+            self.cache_parts = cache_results
+        for part in self.parts:
+            part.set_compute_mode(keep_derivatives, nan_check, cache_results)
+
     def update_rvecs(self, rvecs):
         '''See :meth:`yaff.pes.ff.ForcePart.update_rvecs`'''
         ForcePart.update_rvecs(self, rvecs)
         self.system.cell.update_rvecs(rvecs)
+        for part in self.parts:
+            part.rvecs_version += 1
         if self.nlist is not None:
             self.nlist.update_rmax()
             self.needs_nlist_update = True
@@ -299,16 +521,181 @@ class ForceField(ForcePart):
         '''See :meth:`yaff.pes.ff.ForcePart.update_pos`'''
         ForcePart.update_pos(self, pos)
         self.system.pos[:] = pos
+        # Only the version counters of the parts are updated. Parts that only
+        # depend on the cell vectors keep their cached results.
+        for part in self.parts:
+            part.pos_version += 1
         if self.nlist is not None:
             self.needs_nlist_update = True
 
+    def compute_batch(self, pos_frames, rvecs_frames=None, gpos=True, vtens=False, nproc=None):
+        """Compute the energy and derivatives for a series of configurations
+
+           **Arguments:**
+
+           pos_frames
+                An array with shape (nframe, N, 3) with the atomic positions
+                of all configurations. The topology of the system (number of
+                atoms, bonds, atom types, ...) must be the same for all
+                frames.
+
+           **Optional arguments:**
+
+           rvecs_frames
+                An array with shape (nframe, nvec, 3) with the cell vectors of
+                all configurations. When not given, the current cell vectors
+                are used for all frames.
+
+           gpos
+                When True, the gradient of the energy towards the Cartesian
+                coordinates is computed for all frames.
+
+           vtens
+                When True, the virial tensor is computed for all frames.
+
+           nproc
+                The number of worker processes over which the frames are
+                distributed. By default, all frames are computed in the
+                current process.
+
+           **Returns:** a tuple ``(energies, gpos_frames, vtens_frames)``
+           with arrays of shape (nframe,), (nframe, N, 3) and (nframe, 3, 3).
+           The arrays that were not requested are replaced by None.
+
+           The frames are computed one after the other with the same parts
+           and neighbor list, such that a neighbor list with a nonzero skin
+           is only rebuilt when the displacements between subsequent frames
+           require it. Frames should therefore preferably be ordered, e.g. as
+           in a trajectory. The original positions and cell vectors are
+           restored afterwards. Worker processes are started with ``fork``
+           and inherit a copy of the force field.
+        """
+        pos_frames = np.asarray(pos_frames, float)
+        if pos_frames.ndim != 3 or pos_frames.shape[1:] != self.system.pos.shape:
+            raise TypeError('The positions must be an array with shape (nframe, %i, 3).' % self.system.natom)
+        nframe = len(pos_frames)
+        if rvecs_frames is not None:
+            rvecs_frames = np.asarray(rvecs_frames, float)
+            if rvecs_frames.shape != (nframe,) + self.system.cell.rvecs.shape:
+                raise TypeError('The cell vectors must be an array with shape (%i, %i, 3).' % (nframe, self.system.cell.nvec))
+        if log.do_high:
+            with log.section('FFBATCH'):
+                log('Computing %i frames with %i process(es).' % (nframe, max(1, nproc or 1)))
+        pos_backup = self.system.pos.copy()
+        rvecs_backup = self.system.cell.rvecs.copy()
+        try:
+            if nproc is None or nproc <= 1 or nframe < 2:
+                return self._compute_frames(pos_frames, rvecs_frames, gpos, vtens)
+            return self._compute_frames_parallel(pos_frames, rvecs_frames, gpos, vtens, nproc)
+        finally:
+            if rvecs_frames is not None:
+                self.update_rvecs(rvecs_backup)
+            self.update_pos(pos_backup)
+
+    def _compute_frames(self, pos_frames, rvecs_frames, gpos, vtens):
+        '''Compute a series of frames in the current process'''
+        nframe = len(pos_frames)
+        energies = np.zeros(nframe, float)
+        gpos_frames = np.zeros(pos_frames.shape, float) if gpos else None
+        vtens_frames = np.zeros((nframe, 3, 3), float) if vtens else None
+        for iframe in range(nframe):
+            if rvecs_frames is not None and (rvecs_frames[iframe] != self.system.cell.rvecs).any():
+                self.update_rvecs(rvecs_frames[iframe])
+            self.update_pos(pos_frames[iframe])
+            energies[iframe] = self.compute(
+                None if gpos_frames is None else gpos_frames[iframe],
+                None if vtens_frames is None else vtens_frames[iframe],
+            )
+        return energies, gpos_frames, vtens_frames
+
+    def _compute_frames_parallel(self, pos_frames, rvecs_frames, gpos, vtens, nproc):
+        '''Distribute a series of frames over worker processes'''
+        # Contiguous blocks of frames keep the neighbor list reuse effective.
+        bounds = np.linspace(0, len(pos_frames), nproc+1).astype(int)
+        blocks = [(begin, end) for begin, end in zip(bounds[:-1], bounds[1:]) if end > begin]
+        pool = get_fork_pool(len(blocks), (self, pos_frames, rvecs_frames, gpos, vtens))
+        try:
+            results = pool.map(_compute_batch_block, blocks)
+        finally:
+            pool.close()
+            pool.join()
+        energies = np.concatenate([result[0] for result in results])
+        gpos_frames = np.concatenate([result[1] for result in results]) if gpos else None
+        vtens_frames = np.concatenate([result[2] for result in results]) if vtens else None
+        return energies, gpos_frames, vtens_frames
+
     def _internal_compute(self, gpos, vtens):
-        if self.needs_nlist_update:
+        if self.needs_nlist_update and not all(part.is_cached(gpos is not None, vtens is not None) for part in self.parts):
             self.nlist.update()
             self.needs_nlist_update = False
+        if self.nthread > 1 and len(self.parts) > 1:
+            return self._compute_parts_threaded(gpos, vtens)
         result = sum([part.compute(gpos, vtens) for part in self.parts])
         return result
 
+    def close(self):
+        '''Stop the threads used to compute the parts concurrently
+
+           A new pool of threads is started when needed, so the force field
+           can still be used afterwards.
+        '''
+        # A pool inherited by a forked process has no running threads.
+        if self._thread_pool is not None and self._thread_pool_key[0] == os.getpid():
+            self._thread_pool.close()
+        self._thread_pool = None
+        self._thread_pool_key = None
+
+    def __del__(self):
+        if getattr(self, '_thread_pool', None) is not None:
+            self.close()
+
+    def _get_thread_pool(self):
+        '''Return a pool with nthread threads, created in this process'''
+        key = (os.getpid(), self.nthread)
+        if self._thread_pool_key != key:
+            self.close()
+            self._thread_pool = ThreadPool(self.nthread)
+            self._thread_pool_key = key
+        return self._thread_pool
+
+    def _compute_parts_threaded(self, gpos, vtens):
+        '''Compute the parts concurrently, each with its own output buffers'''
+        npart = len(self.parts)
+        if gpos is not None and (self._part_gpos is None or len(self._part_gpos) != npart):
+            self._part_gpos = np.zeros((npart, self.system.natom, 3), float)
+        if vtens is not None and (self._part_vtens is None or len(self._part_vtens) != npart):
+            self._part_vtens = np.zeros((npart, 3, 3), float)
+
+        def compute_part(ipart):
+            my_gpos = None
+            my_vtens = None
+            if gpos is not None:
+                my_gpos = self._part_gpos[ipart]
+                my_gpos[:] = 0.0
+            if vtens is not None:
+                my_vtens = self._part_vtens[ipart]
+                my_vtens[:] = 0.0
+            return self.parts[ipart].compute(my_gpos, my_vtens)
+
+        with timer.section('FF threads'):
+            energies = self._get_thread_pool().map(compute_part, range(npart), chunksize=1)
+        if gpos is not None:
+            gpos += self._part_gpos.sum(axis=0)
+        if vtens is not None:
+            vtens += self._part_vtens.sum(axis=0)
+        return sum(energies)
+
+
+def _compute_batch_block(bounds):
+    '''Compute a block of frames in a worker process of compute_batch'''
+    ff, pos_frames, rvecs_frames, gpos, vtens = get_worker_args()
+    begin, end = bounds
+    return ff._compute_frames(
+        pos_frames[begin:end],
+        None if rvecs_frames is None else rvecs_frames[begin:end],
+        gpos, vtens,
+    )
+
 
 class ForcePartPair(ForcePart):
     '''A pairwise (short-range) non-bonding interaction term.
@@ -320,6 +707,8 @@ class ForcePartPair(ForcePart):
        Waals term. (This may be changed in future to improve the computational
        efficiency.)
     '''
+    accumulates = True
+
     def __init__(self, system, nlist, scalings, pair_pot):
         '''
            **Arguments:**
@@ -404,6 +793,9 @@ class ForcePartEwaldReciprocal(ForcePart):
         self.alpha = alpha
         self.gcut = gcut
         self.dielectric = dielectric
+        # The low-level routine rescales all of gpos and vtens for the
+        # dielectric constant.
+        self.accumulates = (dielectric == 1.0)
         self.update_gmax()
         self.work = np.empty(system.natom*2)
         if exclude_frame == True and n_frame < 0:
@@ -445,6 +837,8 @@ class ForcePartEwaldReciprocalDD(ForcePart):
     '''The long-range contribution to the dipole-dipole
        electrostatic interaction in 3D periodic systems.
     '''
+    accumulates = True
+
     def __init__(self, system, alpha, gcut=0.35, exclude_frame=False, n_frame=0):
         '''
            **Arguments:**
@@ -549,6 +943,9 @@ class ForcePartEwaldCorrection(ForcePart):
         self.system = system
         self.alpha = alpha
         self.dielectric = dielectric
+        # The low-level routine rescales all of gpos and vtens for the
+        # dielectric constant.
+        self.accumulates = (dielectric == 1.0)
         self.scalings = scalings
         if log.do_medium:
             with log.section('FPINIT'):
@@ -573,6 +970,8 @@ class ForcePartEwaldCorrectionDD(ForcePart):
        This correction is only needed if scaling rules apply to the short-range
        electrostatics.
     '''
+    accumulates = True
+
     def __init__(self, system, alpha, scalings):
         '''
            **Arguments:**
@@ -619,6 +1018,9 @@ class ForcePartEwaldNeutralizing(ForcePart):
 
        This term is only required of the system is not neutral.
     '''
+    accumulates = True
+    depends_on_pos = False
+
     def __init__(self, system, alpha, dielectric=1.0):
         '''
            **Arguments:**
@@ -699,6 +1101,8 @@ class ForcePartValence(ForcePart):
        comes from the field of neural networks. More details can be found in the
        chapter, :ref:`dg_sec_backprop`.
     '''
+    accumulates = True
+
     def __init__(self, system):
         '''
            Parameters
@@ -737,6 +1141,43 @@ class ForcePartValence(ForcePart):
             with log.section('VTERM'):
                 log('%7i&%s %s' % (self.vlist.nv, term.get_log(), ' '.join(ic.get_log() for ic in term.ics)))
         self.vlist.add_term(term)
+        self._cache = None
+
+    def set_tables(self, deltas, ictab, vtab):
+        '''Replace all terms by precomputed tables.
+
+           **Arguments:**
+
+           deltas, ictab, vtab
+                Arrays with dtypes ``delta_dtype``, ``iclist_dtype`` and
+                ``vlist_dtype``, respectively, e.g. the used rows of the tables
+                of another ``ForcePartValence`` object.
+
+           The lookup tables of the delta and internal coordinate lists are
+           rebuilt, such that terms can still be added afterwards.
+        '''
+        dlist = self.dlist
+        dlist.deltas = np.zeros(max(len(deltas), 10), delta_dtype)
+        dlist.deltas[:len(deltas)] = deltas
+        dlist.ndelta = len(deltas)
+        dlist.lookup = dict(zip(zip(deltas['i'].tolist(), deltas['j'].tolist()), range(len(deltas))))
+        iclist = self.iclist
+        iclist.ictab = np.zeros(max(len(ictab), 10), iclist_dtype)
+        iclist.ictab[:len(ictab)] = ictab
+        iclist.nic = len(ictab)
+        iclist.lookup = {}
+        for row, ic in enumerate(ictab.tolist()):
+            key = (ic[0],)
+            for i in range(4):
+                if ic[1+2*i] == -1:
+                    break
+                key += ic[1+2*i:3+2*i]
+            iclist.lookup[key] = row
+        vlist = self.vlist
+        vlist.vtab = np.zeros(max(len(vtab), 10), vlist_dtype)
+        vlist.vtab[:len(vtab)] = vtab
+        vlist.nv = len(vtab)
+        self._cache = None
 
     def _internal_compute(self, gpos, vtens):
         with timer.section('Valence'):
@@ -749,12 +1190,33 @@ class ForcePartValence(ForcePart):
                 self.dlist.back(gpos, vtens)
             return energy
 
+    def compute_hessian(self):
+        """Compute the analytic Cartesian Hessian of the covalent energy.
+
+           The second derivatives are back-propagated through the three
+           layers, in the same way as the gradient. (See class docstring.)
+
+           **Returns:** a ``scipy.sparse.csr_matrix`` with shape
+           (3*natom, 3*natom).
+        """
+        with timer.section('Valence Hessian'):
+            self.dlist.forward()
+            self.iclist.forward()
+            self.vlist.forward()
+            self.vlist.back()
+            hessian = self.vlist.hessian()
+            hessian = self.iclist.back_hessian(hessian)
+            return self.dlist.back_hessian(hessian)
+
 
 class ForcePartValenceCOM(ForcePartValence):
     '''
     Part of a force-field model with interactions that act on centers of mass
     At this moment, only covalent interactions are supported.
     '''
+    # The gradient and virial are rescaled after the back-propagation.
+    accumulates = False
+
     def __init__(self, comsystem, scaling=None):
         ForcePart.__init__(self, 'valence_com', comsystem)
         #ForcePartValence.__init__(self, system)
@@ -800,6 +1262,9 @@ class ForcePartValenceCOM(ForcePartValence):
             #print('ValenceCOM energy: ', energy)
             return energy
 
+    def compute_hessian(self):
+        raise NotImplementedError('The analytic Hessian is not available for interactions between centers of mass.')
+
     def _scale(self, gpos, vtens, energy):
         '''
         Scales the gpos and energy
@@ -846,6 +1311,8 @@ class ForcePartBias(ForcePart):
        volume, an instance of ``CollectiveVariable`` can be used together with
        an instance of the ``BiasPotential`` class.
     '''
+    accumulates = True
+
     def __init__(self, system, comlist=None):
         '''
            **Arguments:**
@@ -922,6 +1389,7 @@ class ForcePartBias(ForcePart):
         else:
             raise NotImplementedError
         self.terms.append(term)
+        self._cache = None
 
     def get_term_energy(self, index):
         kind, iterm = self.term_lookup[index]
@@ -993,6 +1461,9 @@ class ForcePartBias(ForcePart):
 
 class ForcePartPressure(ForcePart):
     '''Applies a constant istropic pressure.'''
+    accumulates = True
+    depends_on_pos = False
+
     def __init__(self, system, pext):
         '''
            **Arguments:**
@@ -1041,6 +1512,8 @@ class ForcePartPressure(ForcePart):
 
 class ForcePartGrid(ForcePart):
     '''Energies obtained by grid interpolation.'''
+    accumulates = True
+
     def __init__(self, system, grids):
         '''
            **Arguments:**
@@ -1084,6 +1557,9 @@ class ForcePartGrid(ForcePart):
 class ForcePartTailCorrection(ForcePart):
     '''Corrections to energy and virial tensor to compensate for neglecting
     pair potentials at long range'''
+    accumulates = True
+    depends_on_pos = False
+
     def __init__(self, system, part_pair):
         '''
            **Arguments:**
@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+# YAFF is yet another force-field code.
+# Copyright (C) 2011 Toon Verstraelen <Toon.Verstraelen@UGent.be>,
+# Louis Vanduyfhuys <Louis.Vanduyfhuys@UGent.be>, Center for Molecular Modeling
+# (CMM), Ghent University, Ghent, Belgium; all rights reserved unless otherwise
+# stated.
+#
+# This file is part of YAFF.
+#
+# YAFF is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# YAFF is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+# --
+'''Persistent cache of generated force fields
+
+   Setting up a force field with ``ForceField.generate`` involves a lot of
+   Python bookkeeping: every valence term is registered in the delta and
+   internal coordinate lists, the scaling tables are derived from the bond
+   graph and the pair potential parameters are mixed. The result only depends
+   on the topology of the system, the parameters and the generator options.
+   This module stores the resulting tables in a single HDF5 file, such that
+   subsequent runs can rebuild the force field without calling the generators.
+
+   The cache file is keyed by a hash of the topology, the parameters and the
+   generator options. When the key does not match, the force field is
+   generated as usual and the cache file is overwritten. The bookkeeping of
+   the generators is stored as well, such that ``ForceField.update_parameters``
+   also works for a force field that is loaded from the cache.
+
+   The tables are read into memory instead of being memory-mapped from the
+   HDF5 file. The low-level routines need C-contiguous arrays that are owned
+   by the delta, internal coordinate and valence lists, because these lists
+   grow when terms are added. ``ForcePartValence.set_tables`` therefore
+   copies the tables anyway and a memory map would only add a dependency on
+   the layout of the HDF5 file.
+'''
+
+
+from __future__ import division
+
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from yaff.log import log
+from yaff.version import __version__
+from yaff.pes.ext import Switch3, Hammer, PairPotLJ, PairPotMM3, \
+    PairPotMM3CAP, PairPotGrimme, PairPotExpRep, PairPotQMDFFRep, \
+    PairPotLJCross, PairPotDampDisp, PairPotDisp68BJDamp, PairPotEI
+from yaff.pes.ff import ForceField, ForcePart, ForcePartPair, ForcePartValence, \
+    ForcePartValenceCOM, ForcePartEwaldReciprocal, ForcePartEwaldCorrection, \
+    ForcePartEwaldNeutralizing, ForcePartTailCorrection
+from yaff.pes.nlist import NeighborList
+from yaff.pes.scaling import Scalings
+
+
+__all__ = ['get_ff_cache_key', 'dump_ff_cache', 'load_ff_cache']
+
+
+# Increase this number when the layout of the cache file changes.
+cache_format = 2
+
+
+# For each supported pair potential: the arguments that precede rcut in the
+# constructor and the optional keyword arguments. The ffatype_ids are taken
+# from the system.
+pair_pot_fields = {
+    PairPotLJ: (['sigmas', 'epsilons'], []),
+    PairPotMM3: (['sigmas', 'epsilons', 'onlypaulis'], []),
+    PairPotMM3CAP: (['sigmas', 'epsilons', 'onlypaulis'], []),
+    PairPotGrimme: (['r0', 'c6'], []),
+    PairPotExpRep: (['ffatype_ids', 'amp_cross', 'b_cross'], []),
+    PairPotQMDFFRep: (['ffatype_ids', 'amp_cross', 'b_cross'], []),
+    PairPotLJCross: (['ffatype_ids', 'eps_cross', 'sig_cross'], []),
+    PairPotDampDisp: (['ffatype_ids', 'cn_cross', 'b_cross'], ['power']),
+    PairPotDisp68BJDamp: (['ffatype_ids', 'c6_cross', 'c8_cross', 'R_cross'],
+                          ['c6_scale', 'c8_scale', 'bj_a', 'bj_b']),
+    PairPotEI: (['charges', 'alpha'], ['dielectric', 'radii']),
+}
+
+
+def _describe_truncation(tr):
+    if tr is None:
+        return 'none', 0.0
+    elif isinstance(tr, Switch3):
+        return 'Switch3', tr.width
+    elif isinstance(tr, Hammer):
+        return 'Hammer', tr.tau
+    else:
+        raise NotImplementedError('Unsupported truncation %s' % tr)
+
+
+def _create_truncation(kind, par):
+    if kind == 'none':
+        return None
+    elif kind == 'Switch3':
+        return Switch3(par)
+    elif kind == 'Hammer':
+        return Hammer(par)
+    else:
+        raise KeyError('Unknown truncation %s' % kind)
+
+
+def get_ff_cache_key(system, parameters, ff_kwargs):
+    '''Compute the key that identifies a generated force field
+
+       **Arguments:**
+
+       system
+            An instance of the System class. Only the topology (atom numbers,
+            atom types, bonds and the number of cell vectors) is used, the
+            positions and the cell vectors do not affect the key.
+
+       parameters
+            The parameters in any of the formats accepted by
+            ``ForceField.generate``, or a dictionary loaded from a YAML file.
+            Filenames are hashed by the contents of the files.
+
+       ff_kwargs
+            A dictionary with the optional arguments of the ``FFArgs`` class.
+
+       **Returns:** a hexadecimal SHA1 digest.
+    '''
+    sha = hashlib.sha1()
+    def feed(label, value):
+        sha.update(label.encode('ascii'))
+        if isinstance(value, np.ndarray):
+            sha.update(str(value.dtype).encode('ascii'))
+            sha.update(str(value.shape).encode('ascii'))
+            sha.update(np.ascontiguousarray(value).tobytes())
+        elif isinstance(value, bytes):
+            sha.update(value)
+        else:
+            sha.update(repr(value).encode('utf-8'))
+    feed('version', (cache_format, __version__))
+    feed('numbers', system.numbers)
+    feed('ffatypes', [str(ffatype) for ffatype in system.ffatypes])
+    feed('ffatype_ids', system.ffatype_ids)
+    feed('bonds', system.bonds)
+    feed('nvec', system.cell.nvec)
+    from yaff.pes.parameters import Parameters
+    if isinstance(parameters, str):
+        parameters = [parameters]
+    if isinstance(parameters, Parameters):
+        for prefix, section in sorted(parameters.sections.items()):
+            for suffix, definition in sorted(section.definitions.items()):
+                feed('%s:%s' % (prefix, suffix), [data for counter, data in definition])
+    elif isinstance(parameters, dict):
+        import yaml
+        feed('parameters', yaml.dump(parameters))
+    else:
+        for fn in parameters:
+            with open(fn, 'rb') as f:
+                feed('parameters', f.read())
+    for name in sorted(ff_kwargs):
+        value = ff_kwargs[name]
+        if name == 'tr':
+            value = _describe_truncation(value)
+        feed(name, value)
+    return sha.hexdigest()
+
+
+def _dump_scalings(f, scalings, scalings_ids):
+    key = id(scalings)
+    if key not in scalings_ids:
+        grp = f.create_group('scalings/%i' % len(scalings_ids))
+        grp['stab'] = scalings.stab
+        for name in 'scale1', 'scale2', 'scale3', 'scale4':
+            grp.attrs[name] = getattr(scalings, name)
+        scalings_ids[key] = len(scalings_ids)
+    return scalings_ids[key]
+
+
+def _dump_part(f, grp, part, ff, scalings_ids):
+    if isinstance(part, ForcePartValence) and not isinstance(part, ForcePartValenceCOM):
+        grp.attrs['kind'] = 'valence'
+        grp['deltas'] = part.dlist.deltas[:part.dlist.ndelta]
+        grp['ictab'] = part.iclist.ictab[:part.iclist.nic]
+        grp['vtab'] = part.vlist.vtab[:part.vlist.nv]
+    elif isinstance(part, ForcePartPair):
+        pair_pot = part.pair_pot
+        fields = pair_pot_fields.get(pair_pot.__class__)
+        if fields is None or part.nlist is not ff.nlist:
+            raise NotImplementedError('Pair potential %s can not be cached' % pair_pot.name)
+        grp.attrs['kind'] = 'pair'
+        grp.attrs['pair_pot'] = pair_pot.__class__.__name__
+        grp.attrs['scalings'] = _dump_scalings(f, part.scalings, scalings_ids)
+        grp.attrs['rcut'] = pair_pot.rcut
+        grp.attrs['truncation'], grp.attrs['truncation_par'] = \
+            _describe_truncation(pair_pot.get_truncation())
+        args, kwargs = fields
+        for name in args + kwargs:
+            if name == 'ffatype_ids':
+                continue
+            value = getattr(pair_pot, name)
+            if isinstance(value, np.ndarray):
+                grp[name] = value
+            else:
+                grp.attrs[name] = value
+    elif isinstance(part, ForcePartEwaldReciprocal):
+        grp.attrs['kind'] = 'ewald_reci'
+        grp.attrs['alpha'] = part.alpha
+        grp.attrs['gcut'] = part.gcut
+        grp.attrs['dielectric'] = part.dielectric
+        grp.attrs['n_frame'] = part.n_frame
+    elif isinstance(part, ForcePartEwaldCorrection):
+        grp.attrs['kind'] = 'ewald_cor'
+        grp.attrs['alpha'] = part.alpha
+        grp.attrs['dielectric'] = part.dielectric
+        grp.attrs['scalings'] = _dump_scalings(f, part.scalings, scalings_ids)
+    elif isinstance(part, ForcePartEwaldNeutralizing):
+        grp.attrs['kind'] = 'ewald_neut'
+        grp.attrs['alpha'] = part.alpha
+        grp.attrs['dielectric'] = part.dielectric
+    elif isinstance(part, ForcePartTailCorrection):
+        names = [other.name for other in ff.parts]
+        pair_name = part.name[len('tailcorr_'):]
+        if pair_name not in names:
+            raise NotImplementedError('Tail correction without pair part')
+        grp.attrs['kind'] = 'tailcorr'
+        grp.attrs['part_pair'] = names.index(pair_name)
+    else:
+        raise NotImplementedError('Force part %s can not be cached' % part.name)
+
+
+def _encode_records(value, part_ids):
+    '''Convert the records of the generators into JSON-compatible objects'''
+    if isinstance(value, ForcePart):
+        return {'part': part_ids[id(value)]}
+    elif isinstance(value, dict):
+        return dict((k, _encode_records(v, part_ids)) for k, v in value.items())
+    elif isinstance(value, (tuple, list)):
+        return [_encode_records(v, part_ids) for v in value]
+    elif isinstance(value, np.integer):
+        return int(value)
+    else:
+        return value
+
+
+def _decode_records(value, parts):
+    '''Inverse of _encode_records, lists become tuples'''
+    if isinstance(value, dict):
+        if 'part' in value:
+            return parts[value['part']]
+        return dict((str(k), _decode_records(v, parts)) for k, v in value.items())
+    elif isinstance(value, list):
+        return tuple(_decode_records(v, parts) for v in value)
+    else:
+        return value
+
+
+def dump_ff_cache(fn, ff, key):
+    '''Write the tables of a generated force field to an HDF5 file
+
+       **Arguments:**
+
+       fn
+            The filename of the cache file. An existing file is overwritten.
+
+       ff
+            A ForceField instance, typically created with
+            ``ForceField.generate``.
+
+       key
+            The key obtained with ``get_ff_cache_key``.
+
+       **Returns:** True when the cache file was written, False when the force
+       field contains parts that can not be cached.
+    '''
+    import h5py as h5
+    try:
+        with h5.File(fn, 'w') as f:
+            f.attrs['key'] = key
+            f.attrs['nparts'] = len(ff.parts)
+            system = ff.system
+            if system.charges is not None:
+                f['system/charges'] = system.charges
+            if system.radii is not None:
+                f['system/radii'] = system.radii
+            if ff.nlist is not None:
+                grp = f.create_group('nlist')
+                grp.attrs['skin'] = ff.nlist.skin
+                grp.attrs['n_frame'] = ff.nlist.n_frame
+            scalings_ids = {}
+            for ipart, part in enumerate(ff.parts):
+                _dump_part(f, f.create_group('parts/%i' % ipart), part, ff, scalings_ids)
+            if ff.generator_records is not None:
+                part_ids = dict((id(part), ipart) for ipart, part in enumerate(ff.parts))
+                f.attrs['records'] = json.dumps(_encode_records(ff.generator_records, part_ids))
+    except NotImplementedError as e:
+        if log.do_warning:
+            log.warn('Not writing force field cache %s: %s' % (fn, e))
+        os.remove(fn)
+        return False
+    return True
+
+
+def _load_valence(grp, system):
+    part = ForcePartValence(system)
+    part.set_tables(grp['deltas'][()], grp['ictab'][()], grp['vtab'][()])
+    return part
+
+
+def _load_part(f, grp, system, nlist, scalings, parts):
+    kind = grp.attrs['kind']
+    if kind == 'valence':
+        return _load_valence(grp, system)
+    elif kind == 'pair':
+        pair_pot_class = dict((cls.__name__, cls) for cls in pair_pot_fields)[grp.attrs['pair_pot']]
+        args, kwargs = pair_pot_fields[pair_pot_class]
+        def get(name):
+            if name == 'ffatype_ids':
+                return system.ffatype_ids
+            elif name in grp:
+                return grp[name][()]
+            else:
+                return grp.attrs[name]
+        tr = _create_truncation(grp.attrs['truncation'], grp.attrs['truncation_par'])
+        pair_pot = pair_pot_class(
+            *([get(name) for name in args] + [grp.attrs['rcut'], tr]),
+            **dict((name, get(name)) for name in kwargs)
+        )
+        return ForcePartPair(system, nlist, scalings[grp.attrs['scalings']], pair_pot)
+    elif kind == 'ewald_reci':
+        n_frame = int(grp.attrs['n_frame'])
+        return ForcePartEwaldReciprocal(
+            system, grp.attrs['alpha'], grp.attrs['gcut'], grp.attrs['dielectric'],
+            n_frame > 0, n_frame
+        )
+    elif kind == 'ewald_cor':
+        return ForcePartEwaldCorrection(
+            system, grp.attrs['alpha'], scalings[grp.attrs['scalings']],
+            grp.attrs['dielectric']
+        )
+    elif kind == 'ewald_neut':
+        return ForcePartEwaldNeutralizing(system, grp.attrs['alpha'], grp.attrs['dielectric'])
+    elif kind == 'tailcorr':
+        return ForcePartTailCorrection(system, parts[grp.attrs['part_pair']])
+    else:
+        raise KeyError('Unknown force part kind %s' % kind)
+
+
+def load_ff_cache(fn, system, key):
+    '''Rebuild a force field from an HDF5 cache file
+
+       **Arguments:**
+
+       fn
+            The filename of the cache file.
+
+       system
+            An instance of the System class, with the same topology as the
+            system for which the cache was written.
+
+       key
+            The key obtained with ``get_ff_cache_key``.
+
+       **Returns:** a ForceField instance or None when the key in the file does
+       not match.
+    '''
+    import h5py as h5
+    with h5.File(fn, 'r') as f:
+        if f.attrs.get('key') != key:
+            return None
+        if 'system/charges' in f:
+            system.charges = f['system/charges'][()]
+        if 'system/radii' in f:
+            system.radii = f['system/radii'][()]
+        nlist = None
+        if 'nlist' in f:
+            n_frame = int(f['nlist'].attrs['n_frame'])
+            nlist = NeighborList(system, f['nlist'].attrs['skin'], n_frame > 0, n_frame)
+        scalings = []
+        if 'scalings' in f:
+            for iscalings in range(len(f['scalings'])):
+                grp = f['scalings/%i' % iscalings]
+                scalings.append(Scalings.from_stab(
+                    grp['stab'][()], *[grp.attrs[name] for name in ('scale1', 'scale2', 'scale3', 'scale4')]
+                ))
+        parts = []
+        for ipart in range(f.attrs['nparts']):
+            parts.append(_load_part(f, f['parts/%i' % ipart], system, nlist, scalings, parts))
+        records = f.attrs.get('records')
+    ff = ForceField(system, parts, nlist)
+    if records is not None:
+        ff.generator_records = _decode_records(json.loads(records), parts)
+    return ff
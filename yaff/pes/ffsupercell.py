@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+# YAFF is yet another force-field code.
+# Copyright (C) 2011 Toon Verstraelen <Toon.Verstraelen@UGent.be>,
+# Louis Vanduyfhuys <Louis.Vanduyfhuys@UGent.be>, Center for Molecular Modeling
+# (CMM), Ghent University, Ghent, Belgium; all rights reserved unless otherwise
+# stated.
+#
+# This file is part of YAFF.
+#
+# YAFF is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# YAFF is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+# --
+'''Replication of force fields in supercells
+
+   The tables of an existing force field are tiled over the periodic images of
+   a supercell, such that the generators do not have to match all terms again
+   for the larger system. The atoms in the supercell are ordered as in
+   ``System.supercell``: all atoms of the first image, then all atoms of the
+   second image, and so on.
+
+   Relative vectors that cross the boundary of the original cell are connected
+   to the proper periodic image in the supercell, using the minimum image
+   convention in the original cell. Internal coordinates and cross terms are
+   made consistent by tracking the periodic image of all atoms involved. As
+   for ``ForceField.generate``, this assumes that the original cell is large
+   enough for the minimum image convention to be unambiguous.
+'''
+
+
+from __future__ import division
+
+import numpy as np
+
+from yaff.log import log, timer
+from yaff.pes.ext import delta_dtype, iclist_dtype, vlist_dtype, \
+    scaling_dtype
+from yaff.pes.ff import ForceField, ForcePartPair, ForcePartValence, \
+    ForcePartValenceCOM, ForcePartEwaldReciprocal, ForcePartEwaldCorrection, \
+    ForcePartEwaldNeutralizing, ForcePartTailCorrection, ForcePartPressure
+from yaff.pes.ffcache import pair_pot_fields
+from yaff.pes.nlist import NeighborList
+from yaff.pes.scaling import Scalings
+
+
+__all__ = ['get_ff_supercell']
+
+
+# Pair potential parameters that are given per atom. All other arrays are
+# given per atom type.
+per_atom_fields = set(['sigmas', 'epsilons', 'onlypaulis', 'r0', 'c6', 'charges', 'radii'])
+
+
+class SupercellImages(object):
+    '''Bookkeeping of the periodic images in a supercell'''
+    def __init__(self, system, reps):
+        '''
+           **Arguments:**
+
+           system
+                The original system.
+
+           reps
+                A tuple with the number of repetitions along each cell vector.
+        '''
+        self.system = system
+        self.reps = reps
+        self.images = np.array(list(np.ndindex(reps)))
+        self.nimage = len(self.images)
+
+    def get_shifts(self, i, j):
+        '''The periodic image of atoms j relative to atoms i
+
+           The minimum image convention of the original cell is used, in the
+           same way as in the low-level routines.
+        '''
+        deltas = self.system.pos[j] - self.system.pos[i]
+        return -np.ceil(np.dot(deltas, self.system.cell.gvecs.T) - 0.5).astype(int)
+
+    def get_shifted(self, shifts):
+        '''Indexes of the images, shifted by the given image vectors
+
+           **Returns:** an array with shape (nimage, len(shifts)).
+        '''
+        shifted = (self.images[:,None,:] + shifts) % self.reps
+        return np.ravel_multi_index(tuple(np.rollaxis(shifted, 2)), self.reps)
+
+    def tile_pairs(self, i, j):
+        '''Translate pairs of atom indexes to all images of the supercell
+
+           Atom ``i`` is translated to each image and atom ``j`` is taken
+           from the periodic image that is nearest to atom ``i``.
+        '''
+        natom = self.system.natom
+        new_i = np.arange(self.nimage)[:,None]*natom + i
+        new_j = self.get_shifted(self.get_shifts(i, j))*natom + j
+        return new_i.ravel(), new_j.ravel()
+
+
+def _get_ic_atoms(deltas, shifts, rows):
+    '''Assign periodic images to the atoms of one internal coordinate
+
+       **Arguments:**
+
+       deltas
+            The table of relative vectors.
+
+       shifts
+            The periodic image of atom j relative to atom i for each row in
+            the table of relative vectors.
+
+       rows
+            The rows of the relative vectors used by the internal coordinate.
+
+       **Returns:** a dictionary with the periodic image of each atom, relative
+       to the first atom of the first relative vector, and a list with the
+       periodic image of the first atom of each relative vector.
+    '''
+    atoms = {deltas[rows[0]]['i']: np.zeros(shifts.shape[1], int)}
+    offsets = [None]*len(rows)
+    todo = list(range(len(rows)))
+    while len(todo) > 0:
+        for k in todo:
+            i, j = deltas[rows[k]]['i'], deltas[rows[k]]['j']
+            if i in atoms:
+                offsets[k] = atoms[i]
+            elif j in atoms:
+                offsets[k] = atoms[j] - shifts[rows[k]]
+            else:
+                continue
+            atoms.setdefault(i, offsets[k])
+            atoms.setdefault(j, offsets[k] + shifts[rows[k]])
+            todo.remove(k)
+            break
+        else:
+            raise ValueError('The relative vectors of an internal coordinate are not connected.')
+    return atoms, offsets
+
+
+def _tile_valence(part, system, images):
+    dlist = part.dlist
+    iclist = part.iclist
+    vlist = part.vlist
+    ndelta = dlist.ndelta
+    nic = iclist.nic
+    nv = vlist.nv
+    deltas = dlist.deltas[:ndelta]
+    ictab = iclist.ictab[:nic]
+    vtab = vlist.vtab[:nv]
+    nimage = images.nimage
+
+    # A) Relative vectors
+    new_deltas = np.zeros(nimage*ndelta, delta_dtype)
+    new_deltas['i'], new_deltas['j'] = images.tile_pairs(deltas['i'], deltas['j'])
+    shifts = images.get_shifts(deltas['i'], deltas['j'])
+
+    # B) Internal coordinates. The periodic image of the relative vectors is
+    # derived from the atoms they share, which is only done for the original
+    # cell.
+    new_ictab = np.zeros(nimage*nic, iclist_dtype)
+    new_ictab['value'] = np.nan
+    new_ictab['grad'] = np.nan
+    new_ictab['kind'] = np.tile(ictab['kind'], nimage)
+    ic_atoms = []
+    offsets = np.zeros((4, nic, shifts.shape[1]), int)
+    for row in range(nic):
+        rows = [ictab[row]['i%i' % k] for k in range(4) if ictab[row]['i%i' % k] != -1]
+        atoms, ic_offsets = _get_ic_atoms(deltas, shifts, rows)
+        ic_atoms.append(atoms)
+        offsets[:len(rows),row] = ic_offsets
+    for k in range(4):
+        used = ictab['i%i' % k] != -1
+        new_rows = images.get_shifted(offsets[k])*ndelta + ictab['i%i' % k]
+        new_ictab['i%i' % k] = np.where(used, new_rows, -1).ravel()
+        new_ictab['sign%i' % k] = np.tile(ictab['sign%i' % k], nimage)
+
+    # C) Valence terms. The second internal coordinate of cross terms is
+    # taken from the periodic image that shares atoms with the first.
+    new_vtab = np.zeros(nimage*nv, vlist_dtype)
+    for name in vlist_dtype.names:
+        if name not in ('ic0', 'ic1'):
+            new_vtab[name] = np.tile(vtab[name], nimage)
+    new_vtab['energy'] = np.nan
+    new_vtab['ic0'] = (np.arange(nimage)[:,None]*nic + vtab['ic0']).ravel()
+    ic_shifts = np.zeros((nv, shifts.shape[1]), int)
+    for row in (vtab['ic1'] != -1).nonzero()[0]:
+        atoms0 = ic_atoms[vtab[row]['ic0']]
+        atoms1 = ic_atoms[vtab[row]['ic1']]
+        common = [i for i in atoms0 if i in atoms1]
+        if len(common) > 0:
+            ic_shifts[row] = atoms0[common[0]] - atoms1[common[0]]
+    used = vtab['ic1'] != -1
+    new_rows = images.get_shifted(ic_shifts)*nic + vtab['ic1']
+    new_vtab['ic1'] = np.where(used, new_rows, -1).ravel()
+
+    new_part = ForcePartValence(system)
+    new_part.set_tables(new_deltas, new_ictab, new_vtab)
+    return new_part
+
+
+def _tile_scalings(scalings, images):
+    stab = scalings.stab
+    new_stab = np.zeros(images.nimage*len(stab), scaling_dtype)
+    a, b = images.tile_pairs(stab['a'], stab['b'])
+    new_stab['a'] = np.maximum(a, b)
+    new_stab['b'] = np.minimum(a, b)
+    new_stab['scale'] = np.tile(stab['scale'], images.nimage)
+    new_stab['nbond'] = np.tile(stab['nbond'], images.nimage)
+    new_stab = new_stab[np.lexsort((new_stab['b'], new_stab['a']))]
+    return Scalings.from_stab(
+        new_stab, scalings.scale1, scalings.scale2, scalings.scale3,
+        scalings.scale4
+    )
+
+
+def _tile_pair_pot(pair_pot, system, images):
+    fields = pair_pot_fields.get(pair_pot.__class__)
+    if fields is None:
+        raise NotImplementedError('Pair potential %s can not be replicated' % pair_pot.name)
+    args, kwargs = fields
+    def get(name):
+        if name == 'ffatype_ids':
+            return system.ffatype_ids
+        value = getattr(pair_pot, name)
+        if name in per_atom_fields:
+            return np.tile(value, images.nimage)
+        elif isinstance(value, np.ndarray):
+            return value.copy()
+        else:
+            return value
+    return pair_pot.__class__(
+        *([get(name) for name in args] + [pair_pot.rcut, pair_pot.get_truncation()]),
+        **dict((name, get(name)) for name in kwargs)
+    )
+
+
+def get_ff_supercell(ff, reps):
+    '''Replicate a force field in a supercell
+
+       **Arguments:**
+
+       ff
+            A ForceField instance for a periodic system.
+
+       reps
+            A tuple with the number of repetitions along each cell vector.
+
+       **Returns:** a ForceField instance for ``ff.system.supercell(*reps)``.
+    '''
+    reps = tuple(reps)
+    with log.section('SUPER'), timer.section('FF supercell'):
+        system = ff.system.supercell(*reps)
+        images = SupercellImages(ff.system, reps)
+        if log.do_medium:
+            log('Replicating force field in a %s supercell with %i atoms' % (
+                'x'.join(str(rep) for rep in reps), system.natom))
+        nlist = None
+        if ff.nlist is not None:
+            if ff.nlist.n_frame > 0:
+                raise NotImplementedError('Framework exclusion can not be replicated.')
+            nlist = NeighborList(system, ff.nlist.skin)
+        all_scalings = {}
+        def get_scalings(scalings):
+            if id(scalings) not in all_scalings:
+                all_scalings[id(scalings)] = _tile_scalings(scalings, images)
+            return all_scalings[id(scalings)]
+        parts = []
+        for part in ff.parts:
+            if isinstance(part, ForcePartValence) and not isinstance(part, ForcePartValenceCOM):
+                new_part = _tile_valence(part, system, images)
+            elif isinstance(part, ForcePartPair):
+                if part.nlist is not ff.nlist:
+                    raise NotImplementedError('Pair parts must use the neighbor list of the force field.')
+                new_part = ForcePartPair(
+                    system, nlist, get_scalings(part.scalings),
+                    _tile_pair_pot(part.pair_pot, system, images)
+                )
+            elif isinstance(part, ForcePartEwaldReciprocal):
+                if part.n_frame > 0:
+                    raise NotImplementedError('Framework exclusion can not be replicated.')
+                new_part = ForcePartEwaldReciprocal(system, part.alpha, part.gcut, part.dielectric)
+            elif isinstance(part, ForcePartEwaldCorrection):
+                new_part = ForcePartEwaldCorrection(
+                    system, part.alpha, get_scalings(part.scalings), part.dielectric
+                )
+            elif isinstance(part, ForcePartEwaldNeutralizing):
+                new_part = ForcePartEwaldNeutralizing(system, part.alpha, part.dielectric)
+            elif isinstance(part, ForcePartTailCorrection):
+                names = [other.name for other in parts]
+                new_part = ForcePartTailCorrection(system, parts[names.index(part.name[len('tailcorr_'):])])
+            elif isinstance(part, ForcePartPressure):
+                new_part = ForcePartPressure(system, part.pext)
+            else:
+                raise NotImplementedError('Force part %s can not be replicated.' % part.name)
+            parts.append(new_part)
+        return ForceField(system, parts, nlist)
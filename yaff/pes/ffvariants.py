@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+# YAFF is yet another force-field code.
+# Copyright (C) 2011 Toon Verstraelen <Toon.Verstraelen@UGent.be>,
+# Louis Vanduyfhuys <Louis.Vanduyfhuys@UGent.be>, Center for Molecular Modeling
+# (CMM), Ghent University, Ghent, Belgium; all rights reserved unless otherwise
+# stated.
+#
+# This file is part of YAFF.
+#
+# YAFF is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# YAFF is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+# --
+'''Evaluation of several force-field variants on the same configurations
+
+   Free-energy perturbation and the comparison of force fields require the
+   energies of a series of configurations with several variants of a force
+   field, e.g. with slightly different parameters. The ``ForceFieldVariants``
+   class lets such variants share the atomic positions, the cell, the neighbor
+   list and the tables of relative vectors and internal coordinates. For each
+   configuration, these are only updated once, after which the energy of each
+   variant is computed.
+'''
+
+
+from __future__ import division
+
+import numpy as np
+
+from yaff.log import log, timer
+from yaff.pes.ff import ForceField, ForcePartValence, ForcePartValenceCOM
+
+
+__all__ = ['ForceFieldVariants']
+
+
+class SharedInternalCoordinate(object):
+    '''Internal coordinate with precomputed rows in a delta list
+
+       This is used to register an existing row of one internal coordinate
+       list in another one, through ``InternalCoordinateList.add_ic``.
+    '''
+    def __init__(self, kind, rows_signs):
+        self.kind = kind
+        self.rows_signs = rows_signs
+
+    def get_rows_signs(self, dlist):
+        return self.rows_signs
+
+
+class ForceFieldVariants(object):
+    '''A set of force fields for the same system that share geometric data'''
+    def __init__(self, ffs):
+        '''
+           **Arguments:**
+
+           ffs
+                A list of ForceField instances for the same system, i.e. with
+                the same atoms in the same order.
+
+           The force fields are modified such that they share the positions,
+           the cell, the neighbor list and the tables of relative vectors and
+           internal coordinates of the first force field. Each force field can
+           still be used on its own, but the positions and cell vectors should
+           be changed for all of them together, e.g. with the ``update_pos``
+           and ``update_rvecs`` methods of this class.
+        '''
+        if len(ffs) == 0:
+            raise TypeError('At least one force field is required.')
+        self.ffs = list(ffs)
+        system = self.ffs[0].system
+        for ff in self.ffs[1:]:
+            if ff.system.natom != system.natom or (ff.system.numbers != system.numbers).any():
+                raise TypeError('All force fields must describe the same atoms.')
+        with log.section('FFVAR'), timer.section('FF variants'):
+            self._share_geometry()
+            self._share_nlist()
+            self._share_valence()
+            if log.do_medium:
+                log('Sharing geometric data between %i force fields.' % len(self.ffs))
+                if self.part_valence is not None:
+                    log('Shared relative vectors: %i' % self.part_valence.dlist.ndelta)
+                    log('Shared internal coordinates: %i' % self.part_valence.iclist.nic)
+
+    @classmethod
+    def generate(cls, system, parameters_list, **kwargs):
+        '''Generate a force field for each set of parameters
+
+           **Arguments:**
+
+           system
+                An instance of the System class.
+
+           parameters_list
+                A list of parameters, each of which is accepted by
+                ``ForceField.generate``.
+
+           All optional arguments are passed on to ``ForceField.generate``.
+           Each force field gets its own copy of the system, such that
+           variants may assign different charges to the atoms.
+        '''
+        ffs = []
+        for ivariant, parameters in enumerate(parameters_list):
+            if ivariant > 0:
+                system = system.subsystem(np.arange(system.natom))
+            ffs.append(ForceField.generate(system, parameters, **kwargs))
+        return cls(ffs)
+
+    def __len__(self):
+        return len(self.ffs)
+
+    def _share_geometry(self):
+        system = self.ffs[0].system
+        for ff in self.ffs[1:]:
+            if ff.system is not system:
+                ff.system.pos = system.pos
+                ff.system.cell = system.cell
+
+    def _share_nlist(self):
+        self.nlist = None
+        for ff in self.ffs:
+            if ff.nlist is None:
+                continue
+            if self.nlist is None:
+                self.nlist = ff.nlist
+                continue
+            for part in ff.parts:
+                if getattr(part, 'nlist', None) is ff.nlist:
+                    part.nlist = self.nlist
+                    if part.pair_pot.rcut > self.nlist.rcut:
+                        self.nlist.request_rcut(part.pair_pot.rcut)
+                        self.nlist.rebuild_next = True
+            ff.nlist = self.nlist
+
+    def _share_valence(self):
+        self.part_valence = None
+        self.valence_parts = []
+        for ff in self.ffs:
+            for part in ff.parts:
+                if not isinstance(part, ForcePartValence) or isinstance(part, ForcePartValenceCOM):
+                    continue
+                if self.part_valence is None:
+                    self.part_valence = part
+                elif part.iclist is not self.part_valence.iclist:
+                    self._merge_valence(part)
+                self.valence_parts.append(part)
+
+    def _merge_valence(self, part):
+        '''Register the internal coordinates of a valence part in the shared tables'''
+        dlist = self.part_valence.dlist
+        iclist = self.part_valence.iclist
+        # Relative vectors
+        deltas = part.dlist.deltas[:part.dlist.ndelta]
+        delta_map = [dlist.add_delta(i, j) for i, j in zip(deltas['i'].tolist(), deltas['j'].tolist())]
+        # Internal coordinates
+        ictab = part.iclist.ictab[:part.iclist.nic]
+        ic_map = np.zeros(len(ictab), int)
+        for row, ic in enumerate(ictab.tolist()):
+            rows_signs = []
+            for k in range(4):
+                if ic[1+2*k] == -1:
+                    break
+                new_row, sign = delta_map[ic[1+2*k]]
+                rows_signs.append((new_row, sign*ic[2+2*k]))
+            ic_map[row] = iclist.add_ic(SharedInternalCoordinate(ic[0], rows_signs))
+        # Valence terms
+        vtab = part.vlist.vtab[:part.vlist.nv]
+        vtab['ic0'] = ic_map[vtab['ic0']]
+        mask = vtab['ic1'] != -1
+        vtab['ic1'][mask] = ic_map[vtab['ic1'][mask]]
+        part.dlist = dlist
+        part.iclist = iclist
+        part.vlist.iclist = iclist
+        part.clear()
+
+    def update_pos(self, pos):
+        '''Update the positions of all force fields'''
+        for ff in self.ffs:
+            ff.update_pos(pos)
+
+    def update_rvecs(self, rvecs):
+        '''Update the cell vectors of all force fields'''
+        for ff in self.ffs:
+            ff.update_rvecs(rvecs)
+
+    def compute(self):
+        '''Compute the energies of all variants for the current configuration
+
+           **Returns:** an array with one energy per force field.
+
+           The neighbor list, the relative vectors and the internal coordinates
+           are updated once. The remaining parts are computed for each force
+           field separately.
+        '''
+        with timer.section('FF variants'):
+            if self.nlist is not None and any(ff.needs_nlist_update for ff in self.ffs):
+                self.nlist.update()
+            for ff in self.ffs:
+                ff.needs_nlist_update = False
+            if self.part_valence is not None:
+                self.part_valence.dlist.forward()
+                self.part_valence.iclist.forward()
+            energies = np.zeros(len(self.ffs), float)
+            for ivariant, ff in enumerate(self.ffs):
+                for part in ff.parts:
+                    if any(part is other for other in self.valence_parts):
+                        part.energy = part.vlist.forward()
+                    else:
+                        part.compute()
+                    energies[ivariant] += part.energy
+                ff.energy = energies[ivariant]
+            return energies
+
+    def compute_frames(self, pos_frames, rvecs_frames=None):
+        '''Compute the energies of all variants for a series of configurations
+
+           **Arguments:**
+
+           pos_frames
+                An array with shape (nframe, N, 3) with the atomic positions
+                of all configurations.
+
+           **Optional arguments:**
+
+           rvecs_frames
+                An array with shape (nframe, nvec, 3) with the cell vectors of
+                all configurations. When not given, the current cell vectors
+                are used for all frames.
+
+           **Returns:** an array with shape (nframe, nvariant) with the
+           energies.
+
+           The original positions and cell vectors are restored afterwards.
+        '''
+        system = self.ffs[0].system
+        pos_frames = np.asarray(pos_frames, float)
+        if pos_frames.ndim != 3 or pos_frames.shape[1:] != system.pos.shape:
+            raise TypeError('The positions must be an array with shape (nframe, %i, 3).' % system.natom)
+        nframe = len(pos_frames)
+        if rvecs_frames is not None:
+            rvecs_frames = np.asarray(rvecs_frames, float)
+            if rvecs_frames.shape != (nframe,) + system.cell.rvecs.shape:
+                raise TypeError('The cell vectors must be an array with shape (%i, %i, 3).' % (nframe, system.cell.nvec))
+        pos_backup = system.pos.copy()
+        rvecs_backup = system.cell.rvecs.copy()
+        energies = np.zeros((nframe, len(self.ffs)), float)
+        try:
+            for iframe in range(nframe):
+                if rvecs_frames is not None and (rvecs_frames[iframe] != system.cell.rvecs).any():
+                    self.update_rvecs(rvecs_frames[iframe])
+                self.update_pos(pos_frames[iframe])
+                energies[iframe] = self.compute()
+        finally:
+            if rvecs_frames is not None:
+                self.update_rvecs(rvecs_backup)
+            self.update_pos(pos_backup)
+        return energies
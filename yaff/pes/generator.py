@@ -79,7 +79,7 @@ __all__ = [
     'NonbondedGenerator', 'LJGenerator', 'MM3Generator', 'MM3CAPGenerator', 'ExpRepGenerator',
     'DampDispGenerator', 'FixedChargeGenerator', 'D3BJGenerator',
 
-    'apply_generators',
+    'load_parameters', 'apply_generators', 'update_generators',
 ]
 
 
@@ -166,6 +166,9 @@ class FFArgs(object):
         self.exclude_frame = exclude_frame
         self.n_frame = n_frame
         self.tailcorrections = tailcorrections
+        # bookkeeping of the generated terms per prefix, used to update the
+        # parameters afterwards, see ForceField.update_parameters
+        self.records = {}
 
     def get_nlist(self, system):
         if self.nlist is None:
@@ -277,6 +280,52 @@ class Generator(object):
         '''
         raise NotImplementedError
 
+    def prepare_update(self, system, parsec_yaml, parsec, records):
+        '''Prepare to overwrite the parameters of the terms generated earlier
+
+           **Arguments:**
+
+           system
+                The System object of the force field
+
+           parsec_yaml
+                A yaml dictionary or None
+
+           parsec
+                An instance of the ParameterSection class or None
+
+           records
+                The bookkeeping of the terms added by this generator, see
+                ``FFArgs.records``, or None when this generator did not
+                contribute to the force field.
+
+           **Returns:** a function without arguments that writes the new
+           parameters.
+
+           All checks are carried out before the function is returned, such
+           that a failing update leaves the force field untouched. Only the
+           values of the parameters may change. When terms would be added or
+           removed, a ValueError is raised. Generators that do not support
+           updates raise a NotImplementedError.
+        '''
+        raise NotImplementedError('Generator %s does not support in-place parameter updates. Generate a new force field instead.' % self.prefix)
+
+    def check_new_section(self, records):
+        '''Raise a ValueError when this generator did not contribute before'''
+        if records is None:
+            raise ValueError('The parameters contain a new section %s. Generate a new force field instead.' % self.prefix)
+
+    def check_records(self, par_table, records):
+        '''Check that a new par_table matches the same terms as the records'''
+        self.check_new_section(records)
+        counts = {}
+        for record in records:
+            key, ipar = record[2], record[3]
+            counts[key] = max(counts.get(key, 0), ipar+1)
+        for key, count in counts.items():
+            if len(par_table.get(key, [])) != count:
+                raise ValueError('The number of %s terms for atom types %s has changed. Generate a new force field instead.' % (self.prefix, ','.join(key)))
+
     def check_suffixes(self, parsec):
         for suffix in parsec.definitions:
             if suffix not in self.suffixes:
@@ -489,20 +538,31 @@ class ValenceGenerator(Generator):
            ff_ars
                 An instance of the FFargs class
         '''
+        par_table, constraints = self.load_par_table(parsec_yaml, parsec)
+        if len(par_table) > 0:
+            self.apply(par_table, constraints, system, ff_args)
+
+    def load_par_table(self, parsec_yaml, parsec):
+        '''Return the par_table and the constraints of a parameter section'''
         if parsec == None:
-            par_table, constraints = self.parse_yaml(parsec_yaml)
-            #print('applying valence generator {} with constraints: '.format(self.VClass.__name__))
-            #print(constraints)
-            if len(par_table) > 0:
-                self.apply(par_table, constraints, system, ff_args)
+            return self.parse_yaml(parsec_yaml)
         else:
-            constraints = []
             self.check_suffixes(parsec)
             conversions = self.process_units(parsec['UNIT'])
-            par_table = self.process_pars(parsec['PARS'], conversions, self.nffatype)
-            if len(par_table) > 0:
-                self.apply(par_table, constraints, system, ff_args)
-
+            return self.process_pars(parsec['PARS'], conversions, self.nffatype), []
+
+    def prepare_update(self, system, parsec_yaml, parsec, records):
+        '''See :meth:`yaff.pes.generator.Generator.prepare_update`'''
+        par_table, constraints = self.load_par_table(parsec_yaml, parsec)
+        if len(constraints) > 0:
+            raise NotImplementedError('Generator %s does not support in-place updates of terms with constraints. Generate a new force field instead.' % self.prefix)
+        self.check_records(par_table, records)
+        updates = []
+        for part_valence, rows, key, ipar, indexes in records:
+            vterm = self.get_vterm(par_table[key][ipar], indexes)
+            check_vterm(part_valence, rows[0], vterm)
+            updates.append((part_valence, rows[0], vterm))
+        return lambda: update_vterms(updates)
 
     def apply(self, par_table, constraints, system, ff_args):
         '''Generate terms for the system based on the par_table
@@ -525,20 +585,19 @@ class ValenceGenerator(Generator):
         if system.bonds is None:
             raise ValueError('The system must have bonds in order to define valence terms.')
         part_valence = ff_args.get_part_valence(system)
+        records = ff_args.records.setdefault(self.prefix, [])
         for indexes in self.iter_indexes(system):
             key = tuple(system.get_ffatype(i) for i in indexes)
             par_list = par_table.get(key, [])
-            for pars in par_list:
+            for ipar, pars in enumerate(par_list):
                 vterm = self.get_vterm(pars, indexes)
-                if len(constraints) == 0:
+                add = True
+                for constraint in constraints:
+                    if not constraint.satisfy(vterm, pars, part_valence, system):
+                        add = False
+                if add:
                     part_valence.add_term(vterm)
-                else:
-                    add = True
-                    for constraint in constraints:
-                        if not constraint.satisfy(vterm, pars, part_valence, system):
-                            add = False
-                    if add:
-                        part_valence.add_term(vterm)
+                    records.append((part_valence, [part_valence.vlist.nv-1], key, ipar, indexes))
 
 
     def get_vterm(self, pars, indexes):
@@ -1085,17 +1144,30 @@ class ValenceCrossGenerator(Generator):
            ff_args
                 An instance of the FFargs class
         '''
+        par_table, constraints = self.load_par_table(parsec_yaml, parsec)
+        if len(par_table) > 0:
+            self.apply(par_table, constraints, system, ff_args)
+
+    def load_par_table(self, parsec_yaml, parsec):
+        '''Return the par_table and the constraints of a parameter section'''
         if parsec == None:
-            par_table, constraints = self.parse_yaml(parsec_yaml)
-            if len(par_table) > 0:
-                self.apply(par_table, constraints, system, ff_args)
+            return self.parse_yaml(parsec_yaml)
         else:
-            constraints = None
             self.check_suffixes(parsec)
             conversions = self.process_units(parsec['UNIT'])
-            par_table = self.process_pars(parsec['PARS'], conversions, self.nffatype)
-            if len(par_table) > 0:
-                self.apply(par_table, constraints, system, ff_args)
+            return self.process_pars(parsec['PARS'], conversions, self.nffatype), []
+
+    def prepare_update(self, system, parsec_yaml, parsec, records):
+        '''See :meth:`yaff.pes.generator.Generator.prepare_update`'''
+        par_table, constraints = self.load_par_table(parsec_yaml, parsec)
+        self.check_records(par_table, records)
+        updates = []
+        for part_valence, rows, key, ipar, indexes in records:
+            vterms = self.get_vterms(par_table[key][ipar], indexes)
+            for row, vterm in zip(rows, vterms):
+                check_vterm(part_valence, row, vterm)
+                updates.append((part_valence, row, vterm))
+        return lambda: update_vterms(updates)
 
     def apply(self, par_table, constraints, system, ff_args):
         '''Generate terms for the system based on the par_table
@@ -1115,6 +1187,28 @@ class ValenceCrossGenerator(Generator):
         if system.bonds is None:
             raise ValueError('The system must have bonds in order to define valence cross terms.')
         part_valence = ff_args.get_part_valence(system)
+        records = ff_args.records.setdefault(self.prefix, [])
+        for indexes in self.iter_indexes(system):
+            key = tuple(system.get_ffatype(i) for i in indexes)
+            par_list = par_table.get(key, [])
+            for ipar, pars in enumerate(par_list):
+                rows = []
+                for vterm in self.get_vterms(pars, indexes):
+                    part_valence.add_term(vterm)
+                    rows.append(part_valence.vlist.nv-1)
+                records.append((part_valence, rows, key, ipar, indexes))
+
+    def get_vterms(self, pars, indexes):
+        '''Return a list of ValenceTerm instances for all cross terms
+
+           **Arguments:**
+
+           pars
+                The parameters of one line in the par_table.
+
+           indexes
+                The atom indices used to define the internal coordinates
+        '''
         vterms = []
         ics = []
         for i in range(6):
@@ -1130,21 +1224,18 @@ class ValenceCrossGenerator(Generator):
             0: self.get_indexes0, 1: self.get_indexes1, 2: self.get_indexes2,
             3: self.get_indexes3, 4: self.get_indexes4, 5: self.get_indexes5,
         }
-        for indexes in self.iter_indexes(system):
-            key = tuple(system.get_ffatype(i) for i in indexes)
-            par_list = par_table.get(key, [])
-            for pars in par_list:
-                for i, j, VClass_ij in vterms:
-                    ICClass_i = self.__class__.__dict__['ICClass%i' %i]
-                    assert ICClass_i is not None, 'IC%i has no ICClass defined' %i
-                    ICClass_j = self.__class__.__dict__['ICClass%i' %j]
-                    assert ICClass_i is not None, 'IC%i has no ICClass defined' %j
-                    K_ij = pars[vterms.index([i,j,VClass_ij])]
-                    rv_i = pars[len(vterms)+ics.index(i)]
-                    rv_j = pars[len(vterms)+ics.index(j)]
-                    args_ij = (K_ij, rv_i, rv_j, ICClass_i(*get_indexes[i](indexes)), ICClass_j(*get_indexes[j](indexes)))
-                    if True:
-                        part_valence.add_term(VClass_ij(*args_ij))
+        result = []
+        for i, j, VClass_ij in vterms:
+            ICClass_i = self.__class__.__dict__['ICClass%i' %i]
+            assert ICClass_i is not None, 'IC%i has no ICClass defined' %i
+            ICClass_j = self.__class__.__dict__['ICClass%i' %j]
+            assert ICClass_i is not None, 'IC%i has no ICClass defined' %j
+            K_ij = pars[vterms.index([i,j,VClass_ij])]
+            rv_i = pars[len(vterms)+ics.index(i)]
+            rv_j = pars[len(vterms)+ics.index(j)]
+            args_ij = (K_ij, rv_i, rv_j, ICClass_i(*get_indexes[i](indexes)), ICClass_j(*get_indexes[j](indexes)))
+            result.append(VClass_ij(*args_ij))
+        return result
 
     def iter_indexes(self, system):
         '''Iterate over all tuples of indexes for the pair of internal coordinates'''
@@ -1708,7 +1799,9 @@ class LJGenerator(NonbondedGenerator):
     suffixes = ['UNIT', 'SCALE', 'PARS']
     par_info = [('SIGMA', float), ('EPSILON', float)]
 
-    def __call__(self, system, parsec, ff_args):
+    def __call__(self, system, parsec_yaml, parsec, ff_args):
+        if parsec is None:
+            raise NotImplementedError('Generator %s does not support YAML parameters.' % self.prefix)
         self.check_suffixes(parsec)
         conversions = self.process_units(parsec['UNIT'])
         par_table = self.process_pars(parsec['PARS'], conversions, 1)
@@ -1746,7 +1839,9 @@ class LJCrossGenerator(NonbondedGenerator):
     suffixes = ['UNIT', 'SCALE', 'PARS']
     par_info = [('SIGMA', float), ('EPSILON', float)]
 
-    def __call__(self, system, parsec, ff_args):
+    def __call__(self, system, parsec_yaml, parsec, ff_args):
+        if parsec is None:
+            raise NotImplementedError('Generator %s does not support YAML parameters.' % self.prefix)
         self.check_suffixes(parsec)
         conversions = self.process_units(parsec['UNIT'])
         par_table = self.process_pars(parsec['PARS'], conversions, 1)
@@ -1790,21 +1885,22 @@ class MM3Generator(NonbondedGenerator):
         '''
         maintains support for Parameters object
         '''
+        par_table, scale_table = self.load_par_table(parsec_yaml, parsec)
+        self.apply(par_table, scale_table, system, ff_args)
+
+    def load_par_table(self, parsec_yaml, parsec):
+        '''Return the par_table and the scale_table of a parameter section'''
         if parsec_yaml is None:
             self.check_suffixes(parsec)
             conversions = self.process_units(parsec['UNIT'])
             par_table = self.process_pars(parsec['PARS'], conversions, 1)
             scale_table = self.process_scales(parsec['SCALE'])
-            #print(par_table, scale_table)
-            self.apply(par_table, scale_table, system, ff_args)
+            return par_table, scale_table
         else:
-            par_table, scale_table = self.parse_yaml(parsec_yaml)
-            #print(par_table, scale_table)
-            self.apply(par_table, scale_table, system, ff_args)
+            return self.parse_yaml(parsec_yaml)
 
-
-    def apply(self, par_table, scale_table, system, ff_args):
-        # Prepare the atomic parameters
+    def get_atom_pars(self, par_table, system):
+        '''Return the sigmas, epsilons and onlypaulis of all atoms'''
         sigmas = np.zeros(system.natom)
         epsilons = np.zeros(system.natom)
         onlypaulis = np.zeros(system.natom, np.int32)
@@ -1815,6 +1911,25 @@ class MM3Generator(NonbondedGenerator):
                 raise TypeError('Superposition should not be allowed for non-covalent terms.')
             elif len(par_list) == 1:
                 sigmas[i], epsilons[i], onlypaulis[i] = par_list[0]
+        return sigmas, epsilons, onlypaulis
+
+    def prepare_update(self, system, parsec_yaml, parsec, records):
+        '''See :meth:`yaff.pes.generator.Generator.prepare_update`'''
+        par_table, scale_table = self.load_par_table(parsec_yaml, parsec)
+        self.check_new_section(records)
+        part_pair, = records
+        check_scalings(part_pair.scalings, scale_table, self.prefix)
+        sigmas, epsilons, onlypaulis = self.get_atom_pars(par_table, system)
+        if (part_pair.pair_pot.onlypaulis != onlypaulis).any():
+            raise ValueError('The ONLYPAULI parameters of the MM3 terms can not be updated.')
+        def update():
+            part_pair.pair_pot.sigmas[:] = sigmas
+            part_pair.pair_pot.epsilons[:] = epsilons
+        return update
+
+    def apply(self, par_table, scale_table, system, ff_args):
+        # Prepare the atomic parameters
+        sigmas, epsilons, onlypaulis = self.get_atom_pars(par_table, system)
 
         # Prepare the global parameters
         scalings = Scalings(system, scale_table[1], scale_table[2], scale_table[3], scale_table[4])
@@ -1828,6 +1943,7 @@ class MM3Generator(NonbondedGenerator):
         nlist = ff_args.get_nlist(system)
         part_pair = ForcePartPair(system, nlist, scalings, pair_pot)
         ff_args.parts.append(part_pair)
+        ff_args.records[self.prefix] = [part_pair]
 
 
 class MM3CAPGenerator(NonbondedGenerator):
@@ -1835,7 +1951,9 @@ class MM3CAPGenerator(NonbondedGenerator):
     suffixes = ['UNIT', 'SCALE', 'PARS']
     par_info = [('SIGMA', float), ('EPSILON', float), ('ONLYPAULI', int)]
 
-    def __call__(self, system, parsec, ff_args):
+    def __call__(self, system, parsec_yaml, parsec, ff_args):
+        if parsec is None:
+            raise NotImplementedError('Generator %s does not support YAML parameters.' % self.prefix)
         self.check_suffixes(parsec)
         conversions = self.process_units(parsec['UNIT'])
         par_table = self.process_pars(parsec['PARS'], conversions, 1)
@@ -1879,7 +1997,9 @@ class ExpRepGenerator(NonbondedGenerator):
         ('B', 'ARITHMETIC_COR'): (1, 1),
     }
 
-    def __call__(self, system, parsec, ff_args):
+    def __call__(self, system, parsec_yaml, parsec, ff_args):
+        if parsec is None:
+            raise NotImplementedError('Generator %s does not support YAML parameters.' % self.prefix)
         self.check_suffixes(parsec)
         conversions = self.process_units(parsec['UNIT'])
         par_table = self.process_pars(parsec['PARS'], conversions, 1)
@@ -1951,7 +2071,9 @@ class QMDFFRepGenerator(NonbondedGenerator):
     par_info = [('A', float), ('B', float)]
     pairpar_info = [('A', float), ('B', float)]
 
-    def __call__(self, system, parsec, ff_args):
+    def __call__(self, system, parsec_yaml, parsec, ff_args):
+        if parsec is None:
+            raise NotImplementedError('Generator %s does not support YAML parameters.' % self.prefix)
         self.check_suffixes(parsec)
         conversions = self.process_units(parsec['UNIT'])
         cpar_table = self.process_pars(parsec['CPARS'], conversions, 2)
@@ -1999,7 +2121,9 @@ class DampDispGenerator(NonbondedGenerator):
     par_info = [('C6', float), ('B', float), ('VOL', float)]
     cpar_info = [('C6', float), ('B', float)]
 
-    def __call__(self, system, parsec, ff_args):
+    def __call__(self, system, parsec_yaml, parsec, ff_args):
+        if parsec is None:
+            raise NotImplementedError('Generator %s does not support YAML parameters.' % self.prefix)
         self.check_suffixes(parsec)
         conversions = self.process_units(parsec['UNIT'])
         par_table = self.process_pars(parsec['PARS'], conversions, 1)
@@ -2059,7 +2183,9 @@ class D3BJGenerator(NonbondedGenerator):
     pairpar_info = [('C6', float), ('C8', float)]
     globalpar_info = [('S6', float), ('S8', float),('A1', float), ('A2', float)]
 
-    def __call__(self, system, parsec, ff_args):
+    def __call__(self, system, parsec_yaml, parsec, ff_args):
+        if parsec is None:
+            raise NotImplementedError('Generator %s does not support YAML parameters.' % self.prefix)
         self.check_suffixes(parsec)
         conversions = self.process_units(parsec['UNIT'])
         #Parameters for every couple of ffatypes
@@ -2109,6 +2235,11 @@ class FixedChargeGenerator(NonbondedGenerator):
     par_info = [('Q0', float), ('P', float), ('R', float)]
 
     def __call__(self, system, parsec_yaml, parsec, ff_args):
+        atom_table, bond_table, scale_table, dielectric = self.load_par_table(parsec_yaml, parsec)
+        self.apply(atom_table, bond_table, scale_table, dielectric, system, ff_args)
+
+    def load_par_table(self, parsec_yaml, parsec):
+        '''Return the atom_table, bond_table, scale_table and dielectric of a parameter section'''
         if parsec_yaml is None:
             self.check_suffixes(parsec)
             conversions = self.process_units(parsec['UNIT'])
@@ -2116,10 +2247,27 @@ class FixedChargeGenerator(NonbondedGenerator):
             bond_table = self.process_bonds(parsec['BOND'], conversions)
             scale_table = self.process_scales(parsec['SCALE'])
             dielectric = self.process_dielectric(parsec['DIELECTRIC'])
-            self.apply(atom_table, bond_table, scale_table, dielectric, system, ff_args)
+            return atom_table, bond_table, scale_table, dielectric
         else:
-            atom_table, bond_table, scale_table, dielectric = self.parse_yaml(parsec_yaml)
-            self.apply(atom_table, bond_table, scale_table, dielectric, system, ff_args)
+            return self.parse_yaml(parsec_yaml)
+
+    def prepare_update(self, system, parsec_yaml, parsec, records):
+        '''See :meth:`yaff.pes.generator.Generator.prepare_update`
+
+           The charges and radii are overwritten in the arrays of the system,
+           which are shared with the electrostatic parts.
+        '''
+        atom_table, bond_table, scale_table, dielectric = self.load_par_table(parsec_yaml, parsec)
+        self.check_new_section(records)
+        part_pair, = records
+        check_scalings(part_pair.scalings, scale_table, self.prefix)
+        if dielectric != part_pair.pair_pot.dielectric:
+            raise ValueError('The dielectric constant of the FIXQ terms can not be updated.')
+        charges, radii = self.compute_charges(atom_table, bond_table, system)
+        def update():
+            system.charges[:] = charges
+            system.radii[:] = radii
+        return update
 
     def parse_yaml(self, parsec_yaml):
         '''
@@ -2213,16 +2361,26 @@ class FixedChargeGenerator(NonbondedGenerator):
             system.charges = np.zeros(system.natom)
         elif log.do_warning and abs(system.charges).max() != 0:
             log.warn('Overwriting charges in system.')
-        system.charges[:] = 0.0
-        system.radii = np.zeros(system.natom)
+        charges, system.radii = self.compute_charges(atom_table, bond_table, system)
+        system.charges[:] = charges
+
+        # prepare other parameters
+        scalings = Scalings(system, scale_table[1], scale_table[2], scale_table[3], scale_table[4])
 
-        # compute the charges
+        # Setup the electrostatic pars
+        ff_args.add_electrostatic_parts(system, scalings, dielectric)
+        ff_args.records[self.prefix] = [ff_args.get_part_pair(PairPotEI)]
+
+    def compute_charges(self, atom_table, bond_table, system):
+        '''Return the charges and radii of all atoms in the system'''
+        charges = np.zeros(system.natom)
+        radii = np.zeros(system.natom)
         for i in range(system.natom):
             pars = atom_table.get(system.get_ffatype(i))
             if pars is not None:
                 charge, radius = pars
-                system.charges[i] += charge
-                system.radii[i] = radius
+                charges[i] += charge
+                radii[i] = radius
             elif log.do_warning:
                 log.warn('No charge defined for atom %i with fftype %s.' % (i, system.get_ffatype(i)))
         for i0, i1 in system.iter_bonds():
@@ -2235,14 +2393,84 @@ class FixedChargeGenerator(NonbondedGenerator):
                 if log.do_warning:
                     log.warn('No charge transfer parameter for atom pair (%i,%i) with fftype (%s,%s).' % (i0, i1, system.get_ffatype(i0), system.get_ffatype(i1)))
             else:
-                system.charges[i0] += charge_transfer
-                system.charges[i1] -= charge_transfer
+                charges[i0] += charge_transfer
+                charges[i1] -= charge_transfer
+        return charges, radii
 
-        # prepare other parameters
-        scalings = Scalings(system, scale_table[1], scale_table[2], scale_table[3], scale_table[4])
 
-        # Setup the electrostatic pars
-        ff_args.add_electrostatic_parts(system, scalings, dielectric)
+def check_vterm(part_valence, row, vterm):
+    '''Check that a ValenceTerm can replace an existing row in the table of valence terms
+
+       **Arguments:**
+
+       part_valence
+            The ForcePartValence instance that contains the term.
+
+       row
+            The row in the table of valence terms.
+
+       vterm
+            A ValenceTerm instance with the new parameters.
+    '''
+    vtab = part_valence.vlist.vtab
+    ictab = part_valence.iclist.ictab
+    if vtab[row]['kind'] != vterm.kind or ictab[vtab[row]['ic0']]['kind'] != vterm.ics[0].kind:
+        raise ValueError('The new parameters change the kind of a valence term. Generate a new force field instead.')
+
+
+def update_vterms(updates):
+    '''Overwrite the parameters of existing rows in the tables of valence terms
+
+       **Arguments:**
+
+       updates
+            A list of (part_valence, row, vterm) tuples, see check_vterm.
+    '''
+    for part_valence, row, vterm in updates:
+        vtab = part_valence.vlist.vtab
+        for i in range(len(vterm.pars)):
+            vtab[row]['par%i' % i] = vterm.pars[i]
+
+
+def check_scalings(scalings, scale_table, prefix):
+    '''Raise a ValueError when the scale_table does not match the scalings'''
+    old = (scalings.scale1, scalings.scale2, scalings.scale3, scalings.scale4)
+    new = tuple(scale_table[i] for i in range(1, 5))
+    if old != new:
+        raise ValueError('The SCALE parameters of the %s terms can not be updated.' % prefix)
+
+
+def get_generators():
+    '''Return a dictionary with an instance of all generators with a prefix'''
+    generators = {}
+    for x in globals().values():
+        if isinstance(x, type) and issubclass(x, Generator) and x.prefix is not None:
+            generators[x.prefix] = x()
+    return generators
+
+
+def load_parameters(parameters):
+    '''Load parameters in a form that is accepted by apply_generators
+
+       **Arguments:**
+
+       parameters
+            See :meth:`yaff.pes.ff.ForceField.generate`.
+
+       **Returns:** a Parameters instance or a dictionary with the contents of
+       a YAML file.
+    '''
+    if isinstance(parameters, str):
+        if parameters[-3:] == 'txt':
+            return Parameters.from_file(parameters)
+        else:
+            import yaml
+            with open(parameters) as f:
+                return yaml.safe_load(f)
+    elif isinstance(parameters, (list, tuple)):
+        return Parameters.from_file(parameters)
+    else:
+        return parameters
 
 
 def apply_generators(system, yaml_dict, ff_args):
@@ -2261,10 +2489,7 @@ def apply_generators(system, yaml_dict, ff_args):
     '''
 
     # Collect all the generators that have a prefix.
-    generators = {}
-    for x in globals().values():
-        if isinstance(x, type) and issubclass(x, Generator) and x.prefix is not None:
-            generators[x.prefix] = x()
+    generators = get_generators()
 
     # maintain compatibility with old format
     if isinstance(yaml_dict, Parameters):
@@ -2321,3 +2546,44 @@ def apply_generators(system, yaml_dict, ff_args):
         for i0, i1, i2 in system.iter_angles():
             if frozenset([i0, i1, i2]) not in groups:
                 log.warn('No covalent three-body term for atoms ({}, {} {})'.format(i0, i1, i2))
+
+
+def update_generators(system, yaml_dict, records):
+    '''Overwrite the parameters of the terms made earlier by apply_generators
+
+       **Arguments:**
+
+       system
+            The System instance of the force field.
+
+       yaml_dict
+            A Parameters instance or a dictionary loaded from a .yaml file.
+
+       records
+            The ``records`` attribute of the FFArgs instance that was used to
+            generate the force field.
+
+       The parameters must contain the same sections as those used to
+       generate the force field and may only differ in the values of the
+       parameters of the existing terms. All sections are checked before any
+       parameter is overwritten. A NotImplementedError is raised when one of
+       the generators does not support updates.
+    '''
+    generators = get_generators()
+    if isinstance(yaml_dict, Parameters):
+        sections = [(prefix, None, section) for prefix, section in yaml_dict.sections.items()]
+    else:
+        sections = [(prefix, section, None) for prefix, section in yaml_dict.items()]
+    prefixes = set()
+    updates = []
+    for prefix, parsec_yaml, parsec in sections:
+        generator = generators.get(prefix)
+        if generator is None:
+            continue
+        updates.append(generator.prepare_update(system, parsec_yaml, parsec, records.get(prefix)))
+        prefixes.add(prefix)
+    for prefix in records:
+        if prefix not in prefixes:
+            raise ValueError('The parameters no longer contain the section %s. Generate a new force field instead.' % prefix)
+    for update in updates:
+        update()
@@ -24,5 +24,5 @@
 
 cimport cell
 
-cdef extern from "grid.h":
+cdef extern from "grid.h" nogil:
     double compute_grid3d(double* center, cell.cell_type *cell, double* egrid, size_t* shape)
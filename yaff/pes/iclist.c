@@ -631,3 +631,290 @@ void iclist_back(dlist_row_type* deltas, iclist_row_type* ictab, long nic) {
     ic_back_fns[ictab[i].kind](ictab + i, deltas, ictab[i].value, ictab[i].grad);
   }
 }
+
+
+// Second order derivatives of the internal coordinates.
+//
+// The Hessian of an internal coordinate towards the components of its (at most
+// three) relative vectors is computed with forward-mode automatic
+// differentiation: every intermediate result carries its value, its gradient
+// and its Hessian towards the nine components of the relative vectors. The
+// expressions below follow the forward routines above line by line, such that
+// the derivatives are exact up to round-off errors.
+
+#define IC_NDERIV 9
+
+typedef struct {
+  double v;                          // value
+  double g[IC_NDERIV];               // first derivatives
+  double h[IC_NDERIV*IC_NDERIV];     // second derivatives (row major)
+} ic_deriv_type;
+
+void deriv_var(ic_deriv_type* out, double value, long index) {
+  long k;
+  (*out).v = value;
+  for (k=0; k<IC_NDERIV; k++) (*out).g[k] = 0.0;
+  for (k=0; k<IC_NDERIV*IC_NDERIV; k++) (*out).h[k] = 0.0;
+  (*out).g[index] = 1.0;
+}
+
+void deriv_add(ic_deriv_type* out, ic_deriv_type* a, ic_deriv_type* b, double fb) {
+  // out = a + fb*b
+  long k;
+  (*out).v = (*a).v + fb*(*b).v;
+  for (k=0; k<IC_NDERIV; k++) (*out).g[k] = (*a).g[k] + fb*(*b).g[k];
+  for (k=0; k<IC_NDERIV*IC_NDERIV; k++) (*out).h[k] = (*a).h[k] + fb*(*b).h[k];
+}
+
+void deriv_mul(ic_deriv_type* out, ic_deriv_type* a, ic_deriv_type* b) {
+  // out = a*b, out may not coincide with a or b
+  long k, l;
+  (*out).v = (*a).v*(*b).v;
+  for (k=0; k<IC_NDERIV; k++) (*out).g[k] = (*a).v*(*b).g[k] + (*b).v*(*a).g[k];
+  for (k=0; k<IC_NDERIV; k++) {
+    for (l=0; l<IC_NDERIV; l++) {
+      (*out).h[k*IC_NDERIV+l] = (*a).v*(*b).h[k*IC_NDERIV+l] + (*b).v*(*a).h[k*IC_NDERIV+l]
+                              + (*a).g[k]*(*b).g[l] + (*b).g[k]*(*a).g[l];
+    }
+  }
+}
+
+void deriv_chain(ic_deriv_type* out, ic_deriv_type* a, double f0, double f1, double f2) {
+  // out = f(a), with f0, f1 and f2 the value, first and second derivative of
+  // f evaluated at a. out may coincide with a.
+  long k, l;
+  for (k=0; k<IC_NDERIV; k++) {
+    for (l=0; l<IC_NDERIV; l++) {
+      (*out).h[k*IC_NDERIV+l] = f1*(*a).h[k*IC_NDERIV+l] + f2*(*a).g[k]*(*a).g[l];
+    }
+  }
+  for (k=0; k<IC_NDERIV; k++) (*out).g[k] = f1*(*a).g[k];
+  (*out).v = f0;
+}
+
+void deriv_scale(ic_deriv_type* out, ic_deriv_type* a, double f) {
+  deriv_chain(out, a, f*(*a).v, f, 0.0);
+}
+
+void deriv_sqrt(ic_deriv_type* out, ic_deriv_type* a) {
+  double s = sqrt((*a).v);
+  deriv_chain(out, a, s, 0.5/s, -0.25/s/(*a).v);
+}
+
+void deriv_inv(ic_deriv_type* out, ic_deriv_type* a) {
+  double x = 1.0/(*a).v;
+  deriv_chain(out, a, x, -x*x, 2.0*x*x*x);
+}
+
+void deriv_acos(ic_deriv_type* out, ic_deriv_type* a) {
+  double c, s;
+  c = (*a).v;
+  // Guard against round-off errors before taking the dot product.
+  if (c > 1) {
+    c = 1;
+  } else if (c < -1) {
+    c = -1;
+  }
+  s = 1.0 - c*c;
+  deriv_chain(out, a, acos(c), -1.0/sqrt(s), -c/s/sqrt(s));
+}
+
+void deriv_div(ic_deriv_type* out, ic_deriv_type* a, ic_deriv_type* b) {
+  ic_deriv_type tmp;
+  deriv_inv(&tmp, b);
+  deriv_mul(out, a, &tmp);
+}
+
+void deriv_dot(ic_deriv_type* out, ic_deriv_type* a, ic_deriv_type* b) {
+  // Dot product of two vectors with three components
+  ic_deriv_type tmp;
+  long i;
+  deriv_mul(out, a, b);
+  for (i=1; i<3; i++) {
+    deriv_mul(&tmp, a+i, b+i);
+    deriv_add(out, out, &tmp, 1.0);
+  }
+}
+
+void deriv_cross(ic_deriv_type* out, ic_deriv_type* a, ic_deriv_type* b) {
+  // Cross product of two vectors, out may not coincide with a or b
+  ic_deriv_type tmp;
+  long i;
+  for (i=0; i<3; i++) {
+    deriv_mul(out+i, a+(i+1)%3, b+(i+2)%3);
+    deriv_mul(&tmp, a+(i+2)%3, b+(i+1)%3);
+    deriv_add(out+i, out+i, &tmp, -1.0);
+  }
+}
+
+void deriv_load(ic_deriv_type* vec, dlist_row_type* delta, long offset) {
+  deriv_var(vec, (*delta).dx, offset);
+  deriv_var(vec+1, (*delta).dy, offset+1);
+  deriv_var(vec+2, (*delta).dz, offset+2);
+}
+
+typedef void (*ic_hessian_type)(iclist_row_type*, ic_deriv_type*, ic_deriv_type*);
+
+void hessian_bond(iclist_row_type* ic, ic_deriv_type* d, ic_deriv_type* out) {
+  deriv_dot(out, d, d);
+  deriv_sqrt(out, out);
+}
+
+void hessian_bend_cos(iclist_row_type* ic, ic_deriv_type* d, ic_deriv_type* out) {
+  ic_deriv_type n0, n1, tmp;
+  deriv_dot(&n0, d, d);
+  deriv_dot(&n1, d+3, d+3);
+  deriv_mul(&tmp, &n0, &n1);
+  deriv_sqrt(&tmp, &tmp);
+  deriv_dot(&n0, d, d+3);
+  deriv_div(out, &n0, &tmp);
+  deriv_scale(out, out, (*ic).sign0*(*ic).sign1);
+}
+
+void hessian_bend_angle(iclist_row_type* ic, ic_deriv_type* d, ic_deriv_type* out) {
+  hessian_bend_cos(ic, d, out);
+  deriv_acos(out, out);
+}
+
+void hessian_dihed_cos(iclist_row_type* ic, ic_deriv_type* d, ic_deriv_type* out) {
+  ic_deriv_type a[3], b[3], n1sq, fac0, fac2, na, nb, tmp;
+  long i;
+  deriv_dot(&n1sq, d+3, d+3);
+  deriv_dot(&tmp, d, d+3);
+  deriv_div(&fac0, &tmp, &n1sq);
+  deriv_dot(&tmp, d+3, d+6);
+  deriv_div(&fac2, &tmp, &n1sq);
+  for (i=0; i<3; i++) {
+    deriv_mul(&tmp, &fac0, d+3+i);
+    deriv_add(a+i, d+i, &tmp, -1.0);
+    deriv_mul(&tmp, &fac2, d+3+i);
+    deriv_add(b+i, d+6+i, &tmp, -1.0);
+  }
+  deriv_dot(&na, a, a);
+  deriv_dot(&nb, b, b);
+  deriv_mul(&tmp, &na, &nb);
+  deriv_sqrt(&tmp, &tmp);
+  deriv_dot(&na, a, b);
+  deriv_div(out, &na, &tmp);
+  deriv_scale(out, out, (*ic).sign0*(*ic).sign2);
+}
+
+void hessian_dihed_angle(iclist_row_type* ic, ic_deriv_type* d, ic_deriv_type* out) {
+  hessian_dihed_cos(ic, d, out);
+  deriv_acos(out, out);
+}
+
+void hessian_oop_cos_low(ic_deriv_type* d0, ic_deriv_type* d1, ic_deriv_type* d2, ic_deriv_type* out) {
+  ic_deriv_type n[3], n_sq, tmp0, tmp1;
+  deriv_cross(n, d0, d1);
+  deriv_dot(&n_sq, n, n);
+  deriv_dot(&tmp0, d2, d2);
+  deriv_dot(&tmp1, n, d2);
+  deriv_mul(out, &tmp1, &tmp1);
+  deriv_mul(&tmp1, &tmp0, &n_sq);
+  deriv_div(&tmp0, out, &tmp1);
+  deriv_chain(out, &tmp0, 1.0 - tmp0.v, -1.0, 0.0);
+  deriv_sqrt(out, out);
+}
+
+void hessian_oop_cos(iclist_row_type* ic, ic_deriv_type* d, ic_deriv_type* out) {
+  hessian_oop_cos_low(d, d+3, d+6, out);
+}
+
+void hessian_oop_meancos(iclist_row_type* ic, ic_deriv_type* d, ic_deriv_type* out) {
+  ic_deriv_type tmp;
+  hessian_oop_cos_low(d, d+3, d+6, out);
+  hessian_oop_cos_low(d+6, d, d+3, &tmp);
+  deriv_add(out, out, &tmp, 1.0);
+  hessian_oop_cos_low(d+3, d+6, d, &tmp);
+  deriv_add(out, out, &tmp, 1.0);
+  deriv_scale(out, out, 1.0/3.0);
+}
+
+void hessian_oop_angle(iclist_row_type* ic, ic_deriv_type* d, ic_deriv_type* out) {
+  hessian_oop_cos_low(d, d+3, d+6, out);
+  deriv_acos(out, out);
+}
+
+void hessian_oop_meanangle(iclist_row_type* ic, ic_deriv_type* d, ic_deriv_type* out) {
+  ic_deriv_type tmp;
+  hessian_oop_cos_low(d, d+3, d+6, out);
+  deriv_acos(out, out);
+  hessian_oop_cos_low(d+6, d, d+3, &tmp);
+  deriv_acos(&tmp, &tmp);
+  deriv_add(out, out, &tmp, 1.0);
+  hessian_oop_cos_low(d+3, d+6, d, &tmp);
+  deriv_acos(&tmp, &tmp);
+  deriv_add(out, out, &tmp, 1.0);
+  deriv_scale(out, out, 1.0/3.0);
+}
+
+void hessian_oop_distance(iclist_row_type* ic, ic_deriv_type* d, ic_deriv_type* out) {
+  ic_deriv_type n[3], n_norm, tmp;
+  deriv_cross(n, d, d+3);
+  deriv_dot(&n_norm, n, n);
+  deriv_sqrt(&n_norm, &n_norm);
+  deriv_dot(&tmp, n, d+6);
+  deriv_div(out, &tmp, &n_norm);
+  deriv_scale(out, out, (*ic).sign0*(*ic).sign1*(*ic).sign2);
+}
+
+void hessian_oop_squaredist(iclist_row_type* ic, ic_deriv_type* d, ic_deriv_type* out) {
+  ic_deriv_type n[3], n_sq, tmp0, tmp1;
+  deriv_cross(n, d, d+3);
+  deriv_dot(&n_sq, n, n);
+  deriv_dot(&tmp0, n, d+6);
+  deriv_mul(&tmp1, &tmp0, &tmp0);
+  deriv_div(out, &tmp1, &n_sq);
+}
+
+void hessian_dihed_cos2(iclist_row_type* ic, ic_deriv_type* d, ic_deriv_type* out) {
+  double c;
+  hessian_dihed_cos(ic, d, out);
+  c = (*out).v;
+  deriv_chain(out, out, 2.0*c*c-1.0, 4.0*c, 4.0);
+}
+
+void hessian_dihed_cos3(iclist_row_type* ic, ic_deriv_type* d, ic_deriv_type* out) {
+  double c;
+  hessian_dihed_cos(ic, d, out);
+  c = (*out).v;
+  deriv_chain(out, out, c*(4.0*c*c-3.0), 12.0*c*c-3.0, 24.0*c);
+}
+
+void hessian_dihed_cos4(iclist_row_type* ic, ic_deriv_type* d, ic_deriv_type* out) {
+  double c;
+  hessian_dihed_cos(ic, d, out);
+  c = (*out).v;
+  deriv_chain(out, out, 8.0*c*c*(c*c-1.0)+1.0, 16.0*c*(2.0*c*c-1.0), 96.0*c*c-16.0);
+}
+
+void hessian_dihed_cos6(iclist_row_type* ic, ic_deriv_type* d, ic_deriv_type* out) {
+  double c, c2;
+  hessian_dihed_cos(ic, d, out);
+  c = (*out).v;
+  c2 = c*c;
+  deriv_chain(out, out, c2*(c2*(32.0*c2-48.0)+18.0)-1.0,
+              12.0*c*(16.0*c2*(c2-1.0)+3.0), 960.0*c2*c2-576.0*c2+36.0);
+}
+
+ic_hessian_type ic_hessian_fns[16] = {
+  hessian_bond, hessian_bend_cos, hessian_bend_angle, hessian_dihed_cos, hessian_dihed_angle, hessian_bond,
+  hessian_oop_cos, hessian_oop_meancos, hessian_oop_angle, hessian_oop_meanangle, hessian_oop_distance,
+  hessian_oop_squaredist, hessian_dihed_cos2, hessian_dihed_cos3, hessian_dihed_cos4, hessian_dihed_cos6
+};
+
+void iclist_hessian(dlist_row_type* deltas, iclist_row_type* ictab, long nic, double* jacobian, double* hessian) {
+  long i, k;
+  ic_deriv_type d[IC_NDERIV], out;
+  for (i=0; i<nic; i++) {
+    // Unused relative vectors are set to zero and get no derivatives.
+    for (k=0; k<IC_NDERIV; k++) deriv_var(d+k, 0.0, k);
+    if (ictab[i].i0 >= 0) deriv_load(d, deltas + ictab[i].i0, 0);
+    if (ictab[i].i1 >= 0) deriv_load(d+3, deltas + ictab[i].i1, 3);
+    if (ictab[i].i2 >= 0) deriv_load(d+6, deltas + ictab[i].i2, 6);
+    ic_hessian_fns[ictab[i].kind](ictab + i, d, &out);
+    for (k=0; k<IC_NDERIV; k++) jacobian[IC_NDERIV*i+k] = out.g[k];
+    for (k=0; k<IC_NDERIV*IC_NDERIV; k++) hessian[IC_NDERIV*IC_NDERIV*i+k] = out.h[k];
+  }
+}
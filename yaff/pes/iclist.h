@@ -39,5 +39,6 @@ typedef struct {
 
 void iclist_forward(dlist_row_type* deltas, iclist_row_type* ictab, long nic);
 void iclist_back(dlist_row_type* deltas, iclist_row_type* ictab, long nic);
+void iclist_hessian(dlist_row_type* deltas, iclist_row_type* ictab, long nic, double* jacobian, double* hessian);
 
 #endif
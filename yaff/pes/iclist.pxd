@@ -25,7 +25,7 @@
 
 cimport dlist
 
-cdef extern from "iclist.h":
+cdef extern from "iclist.h" nogil:
     ctypedef struct iclist_row_type:
         long kind
         long i0, sign0, i1, sign1, i2, sign2, i3, sign3
@@ -33,3 +33,4 @@ cdef extern from "iclist.h":
 
     void iclist_forward(dlist.dlist_row_type* deltas, iclist_row_type* ictab, long nic)
     void iclist_back(dlist.dlist_row_type* deltas, iclist_row_type* ictab, long nic)
+    void iclist_hessian(dlist.dlist_row_type* deltas, iclist_row_type* ictab, long nic, double* jacobian, double* hessian)
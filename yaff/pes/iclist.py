@@ -63,7 +63,8 @@ from __future__ import division
 import numpy as np
 
 from yaff.log import log
-from yaff.pes.ext import iclist_dtype, iclist_forward, iclist_back
+from yaff.pes.ext import iclist_dtype, iclist_forward, iclist_back, \
+    iclist_hessian
 
 
 __all__ = [
@@ -140,6 +141,52 @@ class InternalCoordinateList(object):
         """
         iclist_back(self.dlist.deltas, self.ictab, self.nic)
 
+    def back_hessian(self, hessian):
+        """Transform a Hessian towards the internal coordinates into a Hessian
+           towards the components of the relative vectors in ``self.dlist``.
+
+           **Arguments:**
+
+           hessian
+                A sparse matrix with shape (nic, nic) containing the second
+                derivatives of the energy towards the internal coordinates.
+
+           The first derivatives of the energy towards the internal coordinates
+           must be present in ``self.ictab``, i.e. the ``back`` method of the
+           valence list must be called first.
+
+           **Returns:** a ``scipy.sparse.csr_matrix`` with shape
+           (3*ndelta, 3*ndelta).
+        """
+        import scipy.sparse
+        ictab = self.ictab[:self.nic]
+        jacobian = np.zeros((self.nic, 9), float)
+        icderivs = np.zeros((self.nic, 9, 9), float)
+        iclist_hessian(self.dlist.deltas, self.ictab, self.nic, jacobian, icderivs)
+        # Columns in the delta Hessian of the nine components of each ic.
+        rows = np.array([ictab['i0'], ictab['i1'], ictab['i2']]).T
+        mask = np.repeat(rows >= 0, 3, axis=1)
+        cols = (3*rows[:,:,None] + np.arange(3)).reshape(self.nic, 9)
+        # Wilson B-matrix with respect to the relative vectors
+        shape = (3*self.dlist.ndelta, 3*self.dlist.ndelta)
+        bmat = scipy.sparse.csr_matrix(
+            (jacobian[mask], (np.repeat(np.arange(self.nic), mask.sum(axis=1)), cols[mask])),
+            shape=(self.nic, shape[0])
+        )
+        # Second-order contribution: gradient times the Hessian of each ic
+        mask2 = mask[:,:,None] & mask[:,None,:]
+        second = scipy.sparse.csr_matrix(
+            (
+                (ictab['grad'][:,None,None]*icderivs)[mask2],
+                (
+                    np.broadcast_to(cols[:,:,None], mask2.shape)[mask2],
+                    np.broadcast_to(cols[:,None,:], mask2.shape)[mask2],
+                ),
+            ),
+            shape=shape
+        )
+        return (bmat.T*hessian*bmat + second).tocsr()
+
     def lookup_atoms(self, row):
         """Look up the atom for a given row index."""
         result = []
@@ -25,7 +25,7 @@
 
 cimport cell
 
-cdef extern from "nlist.h":
+cdef extern from "nlist.h" nogil:
     ctypedef struct neigh_row_type:
         long a, b
         double d
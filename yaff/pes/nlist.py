@@ -35,7 +35,9 @@
 
    The ``NeighborList`` object contains algorithms to detect whether a full rebuild
    of the neighbor list is required, or whether a recomputation of the distances
-   and relative vectors is sufficient.
+   and relative vectors is sufficient. Changes of the cell vectors (e.g. in NPT
+   simulations) are treated as an affine deformation of the positions at the
+   last rebuild, such that the skin remains useful when the cell fluctuates.
 '''
 
 
@@ -103,6 +105,9 @@ class NeighborList(object):
         self.n_frame = n_frame
         # for skin algorithm:
         self._pos_old = None
+        self._rvecs_old = None
+        self._gvecs_old = None
+        self._radius_old = None
         self.rebuild_next = False
 
     def request_rcut(self, rcut):
@@ -120,7 +125,10 @@ class NeighborList(object):
            ``rmax[1]`` and ``rmax[2]``, respectively.
 
            Updating ``rmax`` may be necessary for two reasons: (i) the cutoff
-           has changed, and (ii) the cell vectors have changed.
+           has changed, and (ii) the cell vectors have changed. The new value
+           of ``rmax`` is only used in the next rebuild. Whether a rebuild is
+           needed, is determined in the ``update`` method, taking into account
+           the cell deformation since the last rebuild.
         """
         # determine the number of periodic images
         self.rmax = np.ceil((self.rcut+self.skin)/self.system.cell.rspacings-0.5).astype(int)
@@ -131,9 +139,6 @@ class NeighborList(object):
                 log('rmax a,b     = %i,%i' % tuple(self.rmax))
             elif len(self.rmax) == 3:
                 log('rmax a,b,c   = %i,%i,%i' % tuple(self.rmax))
-        # Request a rebuild of the neighborlist because there is no simple way
-        # to figure out whether an update is sufficient.
-        self.rebuild_next = True
 
     def update(self):
         '''Rebuild or recompute the neighbor lists
@@ -185,7 +190,7 @@ class NeighborList(object):
             else:
                 # just *recompute* the deltas and the distance in the
                 # neighborlist
-                nlist_recompute(self.system.pos, self._pos_old, self.system.cell, self.neighs[:self.nneigh])
+                nlist_recompute(self.system.pos, self._get_pos_old(), self.system.cell, self.neighs[:self.nneigh])
                 if log.do_debug:
                     log('Recomputed')
 
@@ -197,19 +202,63 @@ class NeighborList(object):
                 self._pos_old = self.system.pos.copy()
             else:
                 self._pos_old[:] = self.system.pos
+            self._rvecs_old = self.system.cell.rvecs.copy()
+            self._gvecs_old = self.system.cell.gvecs.copy()
+            self._radius_old = self.rcut + self.skin
+
+    def _get_deformation(self):
+        '''Internal method that returns the cell deformation since the last rebuild.
+
+           The result is a 3x3 matrix that transforms (row) vectors in the old
+           cell to the corresponding vectors in the current cell, or None if
+           the cell did not change.
+        '''
+        rvecs = self.system.cell.rvecs
+        if self._rvecs_old is None or (self._rvecs_old == rvecs).all():
+            return None
+        return np.dot(self._gvecs_old.T, rvecs)
+
+    def _get_pos_old(self):
+        '''Internal method that returns the positions of the last rebuild,
+           affinely deformed to the current cell vectors.
+        '''
+        deformation = self._get_deformation()
+        if deformation is None:
+            return self._pos_old
+        return np.dot(self._pos_old, deformation)
 
     def _need_rebuild(self):
-        '''Internal method that determines if a rebuild is needed.'''
+        '''Internal method that determines if a rebuild is needed.
+
+           All pairs that were left out in the last rebuild were separated by
+           at least ``rcut + skin`` at that time. A cell deformation reduces
+           this distance by at most the smallest singular value of the
+           deformation matrix. The remaining (non-affine) displacement of the
+           atoms further reduces it. A rebuild is needed when the result drops
+           below the current cutoff.
+        '''
         if self.skin <= 0 or self._pos_old is None or self.rebuild_next:
             return True
+        deformation = self._get_deformation()
+        if deformation is not None and self.system.cell.nvec < 3:
+            # For partially periodic systems, there is no simple way to figure
+            # out whether an update is sufficient after a change of the cell
+            # vectors.
+            return True
         else:
             # Compute an upper bound for the maximum relative displacement.
-            disp = np.sqrt(((self.system.pos - self._pos_old)**2).sum(axis=1).max())
+            disp = np.sqrt(((self.system.pos - self._get_pos_old())**2).sum(axis=1).max())
             disp *= 2*(self.rmax.max()+1)
+            # Shortest distance of a pair that is not in the list, after
+            # the cell deformation.
+            if deformation is None:
+                radius = self._radius_old
+            else:
+                radius = self._radius_old*np.linalg.svd(deformation, compute_uv=False).min()
             if log.do_debug:
-                log('Maximum relative displacement %s      Skin %s' % (log.length(disp), log.length(self.skin)))
-            # Compare with skin parameter
-            return disp >= self.skin
+                log('Maximum relative displacement %s      Margin %s' % (log.length(disp), log.length(radius - self.rcut)))
+            # Compare with the margin beyond the cutoff
+            return disp >= radius - self.rcut
 
 
     def to_dictionary(self):
@@ -28,7 +28,7 @@ cimport nlist
 cimport truncation
 cimport slater
 
-cdef extern from "pair_pot.h":
+cdef extern from "pair_pot.h" nogil:
     ctypedef struct scaling_row_type:
         long a, b
         double scale
@@ -104,6 +104,34 @@ class Scalings(object):
         self.stab = np.array(stab, dtype=scaling_dtype)
         self.check_mic(system)
 
+    @classmethod
+    def from_stab(cls, stab, scale1=0.0, scale2=0.0, scale3=1.0, scale4=1.0):
+        '''Create a Scalings object from an existing scaling table.
+
+           **Arguments:**
+
+           stab
+                An array with dtype ``scaling_dtype``, e.g. the ``stab``
+                attribute of another Scalings object.
+
+           **Optional arguments:**
+
+           scale1, scale2, scale3, scale4
+                The scaling of the 1-2, 1-3, 1-4 and 1-5 pairs, respectively.
+
+           The bond graph is not analyzed and no minimum image checks are
+           carried out, so the caller is responsible for passing a consistent
+           table.
+        '''
+        scalings = cls.__new__(cls)
+        scalings.items = []
+        scalings.scale1 = scale1
+        scalings.scale2 = scale2
+        scalings.scale3 = scale3
+        scalings.scale4 = scale4
+        scalings.stab = np.array(stab, dtype=scaling_dtype)
+        return scalings
+
     def check_mic(self, system):
         '''Check if each scale2 and scale3 are uniquely defined.
 
@@ -26,6 +26,7 @@
 from __future__ import division
 
 import numpy as np
+import pkg_resources
 
 from molmod import check_delta
 
@@ -35,7 +36,8 @@ from yaff.test.common import get_system_water32
 
 __all__ = [
     'check_gpos_part', 'check_vtens_part', 'check_gpos_ff', 'check_vtens_ff',
-    'get_part_water32_9A_lj'
+    'check_hessian_part', 'get_part_water32_9A_lj', 'get_ff_water32_lj',
+    'write_parameters_water', 'scale_parameter',
 ]
 
 
@@ -106,6 +108,30 @@ def check_vtens_part(system, part, nlists=None, symm_vtens=True):
     check_delta(fn, x, dxs)
 
 
+def check_hessian_part(system, part, eps=1e-5, threshold=1e-6):
+    """Compare part.compute_hessian with finite differences of the gradient"""
+    hessian = part.compute_hessian()
+    assert hessian.shape == (3*system.natom, 3*system.natom)
+    hessian = hessian.toarray()
+    assert np.isfinite(hessian).all()
+    assert abs(hessian - hessian.T).max() < threshold*abs(hessian).max()
+    pos0 = system.pos.copy()
+    x = pos0.ravel()
+    fd = np.zeros(hessian.shape)
+    for i in range(len(x)):
+        grads = []
+        for sign in 1, -1:
+            x1 = x.copy()
+            x1[i] += sign*eps
+            system.pos[:] = x1.reshape(-1, 3)
+            gpos = np.zeros(system.pos.shape, float)
+            part.compute(gpos)
+            grads.append(gpos.ravel())
+        fd[i] = (grads[0] - grads[1])/(2*eps)
+    system.pos[:] = pos0
+    assert abs(hessian - fd).max() < threshold*abs(hessian).max()
+
+
 def check_gpos_ff(ff):
     def fn(x, do_gradient=False):
         ff.update_pos(x.reshape(ff.system.natom, 3))
@@ -189,3 +215,44 @@ def get_part_water32_9A_lj():
         x = (sigma/d)**6
         return 4*epsilon*(x*(x-1))*np.exp(1.0/(d-rcut))
     return system, nlist, scalings, part_pair, pair_fn
+
+
+
+def get_ff_water32_lj(skin=0):
+    # Harmonic bonds and bends, combined with Lennard-Jones interactions
+    system = get_system_water32()
+    nlist = NeighborList(system, skin)
+    scalings = Scalings(system)
+    part_valence = ForcePartValence(system)
+    for i, j in system.bonds:
+        part_valence.add_term(Harmonic(450.0*kcalmol/angstrom**2, 0.9572*angstrom, Bond(i, j)))
+    for i1 in range(system.natom):
+        for i0 in system.neighs1[i1]:
+            for i2 in system.neighs1[i1]:
+                if i0 > i2:
+                    part_valence.add_term(Harmonic(55.000*kcalmol/rad**2, 104.52*deg, BendAngle(i0, i1, i2)))
+    sigmas = np.where(system.numbers == 1, 0.2245, 1.7682)*angstrom*(2.0)**(5.0/6.0)
+    epsilons = np.where(system.numbers == 1, -0.0460, -0.1521)*kcalmol
+    pair_pot = PairPotLJ(sigmas, epsilons, 7*angstrom, Switch3(3*angstrom))
+    part_pair = ForcePartPair(system, nlist, scalings, pair_pot)
+    return ForceField(system, [part_valence, part_pair], nlist)
+
+
+def write_parameters_water(fn, suffixes=('bondharm', 'bendaharm', 'fixq', 'mm3')):
+    # Combine several of the water parameter files in one file
+    with open(fn, 'w') as f:
+        for suffix in suffixes:
+            fn_part = pkg_resources.resource_filename(__name__, '../../data/test/parameters_water_%s.txt' % suffix)
+            with open(fn_part) as g:
+                f.write(g.read())
+            f.write('\n')
+
+
+def scale_parameter(parameters, prefix, suffix, index, scale):
+    definition = parameters[prefix][suffix]
+    lines = []
+    for counter, data in definition:
+        words = data.split()
+        words[index] = '%.10e' % (scale*float(words[index]))
+        lines.append((counter, ' '.join(words)))
+    definition.lines = lines
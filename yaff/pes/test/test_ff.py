@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+# YAFF is yet another force-field code.
+# Copyright (C) 2011 Toon Verstraelen <Toon.Verstraelen@UGent.be>,
+# Louis Vanduyfhuys <Louis.Vanduyfhuys@UGent.be>, Center for Molecular Modeling
+# (CMM), Ghent University, Ghent, Belgium; all rights reserved unless otherwise
+# stated.
+#
+# This file is part of YAFF.
+#
+# YAFF is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# YAFF is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+# --
+
+
+from __future__ import division
+
+import numpy as np
+from nose.tools import assert_raises
+
+from molmod import angstrom
+
+from yaff.pes.ff import ForcePart
+from yaff.pes.iclist import Bond
+from yaff.pes.vlist import Harmonic
+from yaff.pes.test.common import get_ff_water32_lj
+
+
+def get_frames(ff, nframe=6, amplitude=0.05*angstrom, strain=0.0):
+    np.random.seed(1)
+    pos_frames = ff.system.pos + np.random.normal(0, amplitude, (nframe,) + ff.system.pos.shape)
+    rvecs_frames = np.array([
+        ff.system.cell.rvecs*(1 + np.random.uniform(-strain, strain))
+        for iframe in range(nframe)
+    ])
+    return pos_frames, rvecs_frames
+
+
+def compute_reference(ff, pos_frames, rvecs_frames=None):
+    energies = []
+    gpos_frames = []
+    vtens_frames = []
+    pos_backup = ff.system.pos.copy()
+    rvecs_backup = ff.system.cell.rvecs.copy()
+    for iframe in range(len(pos_frames)):
+        if rvecs_frames is not None:
+            ff.update_rvecs(rvecs_frames[iframe])
+        ff.update_pos(pos_frames[iframe])
+        gpos = np.zeros(ff.system.pos.shape)
+        vtens = np.zeros((3, 3))
+        energies.append(ff.compute(gpos, vtens))
+        gpos_frames.append(gpos)
+        vtens_frames.append(vtens)
+    ff.update_rvecs(rvecs_backup)
+    ff.update_pos(pos_backup)
+    return np.array(energies), np.array(gpos_frames), np.array(vtens_frames)
+
+
+def test_compute_batch():
+    ff = get_ff_water32_lj(skin=1*angstrom)
+    pos0 = ff.system.pos.copy()
+    pos_frames, rvecs_frames = get_frames(ff)
+    energies_ref, gpos_ref, vtens_ref = compute_reference(ff, pos_frames)
+    energies, gpos_frames, vtens_frames = ff.compute_batch(pos_frames, vtens=True)
+    assert abs(energies - energies_ref).max() < 1e-10
+    assert abs(gpos_frames - gpos_ref).max() < 1e-10
+    assert abs(vtens_frames - vtens_ref).max() < 1e-10
+    # The original positions are restored
+    assert (ff.system.pos == pos0).all()
+    energies, gpos_frames, vtens_frames = ff.compute_batch(pos_frames, gpos=False)
+    assert abs(energies - energies_ref).max() < 1e-10
+    assert gpos_frames is None
+    assert vtens_frames is None
+
+
+def test_compute_batch_rvecs():
+    ff = get_ff_water32_lj(skin=1*angstrom)
+    rvecs0 = ff.system.cell.rvecs.copy()
+    pos_frames, rvecs_frames = get_frames(ff, strain=0.01)
+    energies_ref, gpos_ref, vtens_ref = compute_reference(ff, pos_frames, rvecs_frames)
+    energies, gpos_frames, vtens_frames = ff.compute_batch(pos_frames, rvecs_frames, vtens=True)
+    assert abs(energies - energies_ref).max() < 1e-10
+    assert abs(gpos_frames - gpos_ref).max() < 1e-10
+    assert abs(vtens_frames - vtens_ref).max() < 1e-10
+    assert (ff.system.cell.rvecs == rvecs0).all()
+
+
+def test_compute_batch_nproc():
+    ff = get_ff_water32_lj()
+    pos_frames, rvecs_frames = get_frames(ff, nframe=5)
+    energies_ref, gpos_ref, vtens_ref = compute_reference(ff, pos_frames)
+    energies, gpos_frames, vtens_frames = ff.compute_batch(pos_frames, vtens=True, nproc=2)
+    assert abs(energies - energies_ref).max() < 1e-10
+    assert abs(gpos_frames - gpos_ref).max() < 1e-10
+    assert abs(vtens_frames - vtens_ref).max() < 1e-10
+
+
+def test_compute_batch_shape():
+    ff = get_ff_water32_lj()
+    with assert_raises(TypeError):
+        ff.compute_batch(ff.system.pos)
+    with assert_raises(TypeError):
+        ff.compute_batch([ff.system.pos], [ff.system.cell.rvecs[:2]])
+
+
+def test_compute_mode_direct():
+    ff = get_ff_water32_lj()
+    gpos_ref = np.zeros(ff.system.pos.shape)
+    vtens_ref = np.zeros((3, 3))
+    energy_ref = ff.compute(gpos_ref, vtens_ref)
+    ff.set_compute_mode(keep_derivatives=False, nan_check=0)
+    ff.part_pair_lj.set_compute_mode(keep_derivatives=True)
+    ff.update_pos(ff.system.pos)
+    gpos = np.zeros(ff.system.pos.shape)
+    vtens = np.zeros((3, 3))
+    energy = ff.compute(gpos, vtens)
+    assert abs(energy - energy_ref) < 1e-10
+    assert abs(gpos - gpos_ref).max() < 1e-10
+    assert abs(vtens - vtens_ref).max() < 1e-10
+    # Only the derivatives of the pair part are kept
+    assert np.isnan(ff.gpos).all()
+    assert np.isnan(ff.part_valence.gpos).all()
+    assert abs(ff.part_valence.energy + ff.part_pair_lj.energy - energy) < 1e-10
+    assert abs(ff.part_pair_lj.gpos).max() > 0
+
+
+class NaNPart(ForcePart):
+    accumulates = True
+
+    def __init__(self, system):
+        ForcePart.__init__(self, 'nan', system)
+
+    def _internal_compute(self, gpos, vtens):
+        if gpos is not None:
+            gpos[0, 0] += np.nan
+        return 0.0
+
+
+def test_compute_mode_nan_check():
+    ff = get_ff_water32_lj()
+    part = NaNPart(ff.system)
+    gpos = np.zeros(ff.system.pos.shape)
+    with assert_raises(ValueError):
+        part.compute(gpos)
+    part.set_compute_mode(keep_derivatives=False, nan_check=0)
+    part.compute(gpos)
+    # Only every second call is checked
+    part.set_compute_mode(nan_check=2)
+    part.compute(gpos)
+    with assert_raises(ValueError):
+        part.compute(gpos)
+    with assert_raises(ValueError):
+        part.set_compute_mode(nan_check=-1)
+
+
+class CountingPart(ForcePart):
+    accumulates = True
+
+    def __init__(self, system, name='counting', depends_on_pos=True):
+        ForcePart.__init__(self, name, system)
+        self.system = system
+        self.depends_on_pos = depends_on_pos
+        self.counter = 0
+
+    def _internal_compute(self, gpos, vtens):
+        self.counter += 1
+        if gpos is not None:
+            gpos += 1.0
+        if vtens is not None:
+            vtens += self.system.cell.volume
+        return self.system.pos.sum() + self.system.cell.volume
+
+
+def test_compute_cache():
+    ff = get_ff_water32_lj()
+    ff.set_compute_mode(cache_results=True)
+    part_pos = CountingPart(ff.system, 'pos')
+    part_cell = CountingPart(ff.system, 'cell', depends_on_pos=False)
+    ff.add_part(part_pos)
+    ff.add_part(part_cell)
+    gpos = np.zeros(ff.system.pos.shape)
+    energy0 = ff.compute(gpos)
+    assert part_pos.counter == 1
+    # Repeated calls reuse the results of all parts
+    gpos1 = np.zeros(ff.system.pos.shape)
+    assert ff.compute(gpos1) == energy0
+    assert (gpos1 == gpos).all()
+    assert part_pos.counter == 1
+    ff.compute()
+    assert part_pos.counter == 1
+    # The virial was not computed yet
+    vtens = np.zeros((3, 3))
+    ff.compute(vtens=vtens)
+    assert part_pos.counter == 2
+    assert part_cell.counter == 2
+    # Only parts that depend on the positions are recomputed
+    ff.update_pos(ff.system.pos + 0.01)
+    energy1 = ff.compute(gpos)
+    assert part_pos.counter == 3
+    assert part_cell.counter == 2
+    assert abs(energy1 - energy0 - 0.01*ff.system.pos.size) < 1e-8
+    ff.update_rvecs(ff.system.cell.rvecs*1.01)
+    ff.compute()
+    assert part_pos.counter == 4
+    assert part_cell.counter == 3
+    # Explicit invalidation and disabling of the cache
+    part_pos.clear()
+    ff.compute()
+    assert part_pos.counter == 5
+    ff.set_compute_mode(cache_results=False)
+    ff.compute()
+    ff.compute()
+    assert part_pos.counter == 7
+    assert part_cell.counter == 5
+
+
+def test_compute_cache_default():
+    # Without explicit opt-in, direct changes to the positions are noticed.
+    ff = get_ff_water32_lj()
+    energy0 = ff.compute()
+    part_energy0 = ff.part_valence.compute()
+    ff.system.pos[0, 0] += 0.3
+    assert ff.part_valence.compute() != part_energy0
+    assert ff.compute() != energy0
+
+
+def test_compute_cache_valence_add_term():
+    ff = get_ff_water32_lj()
+    ff.set_compute_mode(cache_results=True)
+    energy0 = ff.part_valence.compute()
+    ff.part_valence.add_term(Harmonic(1.0, 0.0, Bond(0, 1)))
+    energy1 = ff.part_valence.compute()
+    assert energy1 != energy0
+
+
+def test_compute_threads():
+    ff = get_ff_water32_lj()
+    ff.add_part(CountingPart(ff.system))
+    gpos_ref = np.zeros(ff.system.pos.shape)
+    vtens_ref = np.zeros((3, 3))
+    energy_ref = ff.compute(gpos_ref, vtens_ref)
+    ff.nthread = 2
+    ff.set_compute_mode(keep_derivatives=False, cache_results=False)
+    for irep in range(2):
+        gpos = np.zeros(ff.system.pos.shape)
+        vtens = np.zeros((3, 3))
+        energy = ff.compute(gpos, vtens)
+        assert abs(energy - energy_ref) < 1e-10
+        assert abs(gpos - gpos_ref).max() < 1e-10
+        assert abs(vtens - vtens_ref).max() < 1e-10
+    assert abs(ff.compute() - energy_ref) < 1e-10
+    # The threads are stopped and started again when needed.
+    pool = ff._thread_pool
+    ff.close()
+    assert ff._thread_pool is None
+    pool.join()
+    assert abs(ff.compute() - energy_ref) < 1e-10
+    assert ff._thread_pool is not None
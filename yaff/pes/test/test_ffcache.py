@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# YAFF is yet another force-field code.
+# Copyright (C) 2011 Toon Verstraelen <Toon.Verstraelen@UGent.be>,
+# Louis Vanduyfhuys <Louis.Vanduyfhuys@UGent.be>, Center for Molecular Modeling
+# (CMM), Ghent University, Ghent, Belgium; all rights reserved unless otherwise
+# stated.
+#
+# This file is part of YAFF.
+#
+# YAFF is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# YAFF is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+# --
+
+
+from __future__ import division
+
+import os
+
+import numpy as np
+import pkg_resources
+
+from molmod import angstrom
+from molmod.test.common import tmpdir
+
+from yaff import *
+from yaff.test.common import get_system_water32
+from yaff.pes.test.common import write_parameters_water, scale_parameter
+
+
+def check_ff_equal(ff0, ff1):
+    assert [part.name for part in ff0.parts] == [part.name for part in ff1.parts]
+    assert (ff0.system.charges == ff1.system.charges).all()
+    gpos0 = np.zeros(ff0.system.pos.shape)
+    vtens0 = np.zeros((3, 3))
+    energy0 = ff0.compute(gpos0, vtens0)
+    gpos1 = np.zeros(ff1.system.pos.shape)
+    vtens1 = np.zeros((3, 3))
+    energy1 = ff1.compute(gpos1, vtens1)
+    assert abs(energy0 - energy1) < 1e-10
+    assert abs(gpos0 - gpos1).max() < 1e-10
+    assert abs(vtens0 - vtens1).max() < 1e-10
+
+
+def test_ffcache_water32():
+    with tmpdir(__name__, 'test_ffcache_water32') as dn:
+        fn_pars = os.path.join(dn, 'parameters.txt')
+        fn_cache = os.path.join(dn, 'ff.h5')
+        write_parameters_water(fn_pars)
+        ff0 = ForceField.generate(get_system_water32(), fn_pars, rcut=9*angstrom, tailcorrections=True)
+        ff1 = ForceField.generate(get_system_water32(), fn_pars, rcut=9*angstrom, tailcorrections=True, cache=fn_cache)
+        assert os.path.isfile(fn_cache)
+        check_ff_equal(ff0, ff1)
+        ff2 = ForceField.generate(get_system_water32(), fn_pars, rcut=9*angstrom, tailcorrections=True, cache=fn_cache)
+        check_ff_equal(ff0, ff2)
+        assert (ff0.part_valence.vlist.vtab[:ff0.part_valence.vlist.nv]['par0'] ==
+                ff2.part_valence.vlist.vtab[:ff2.part_valence.vlist.nv]['par0']).all()
+        assert (ff0.part_pair_mm3.scalings.stab == ff2.part_pair_mm3.scalings.stab).all()
+        # Existing internal coordinates are found in the restored lookup tables
+        nic = ff2.part_valence.iclist.nic
+        ndelta = ff2.part_valence.dlist.ndelta
+        ff2.part_valence.add_term(Harmonic(1.0, 1.0, Bond(0, 1)))
+        assert ff2.part_valence.iclist.nic == nic
+        assert ff2.part_valence.dlist.ndelta == ndelta
+
+
+def test_ffcache_key():
+    system = get_system_water32()
+    fn_pars = pkg_resources.resource_filename(__name__, '../../data/test/parameters_water_mm3.txt')
+    key = get_ff_cache_key(system, fn_pars, {'rcut': 9*angstrom})
+    assert key == get_ff_cache_key(system, fn_pars, {'rcut': 9*angstrom})
+    assert key != get_ff_cache_key(system, fn_pars, {'rcut': 8*angstrom})
+    assert key != get_ff_cache_key(system, fn_pars, {'rcut': 9*angstrom, 'tr': Switch3(2*angstrom)})
+    # The positions do not affect the key
+    system.pos[:] += 0.1
+    assert key == get_ff_cache_key(system, fn_pars, {'rcut': 9*angstrom})
+    # An outdated cache file is overwritten
+    with tmpdir(__name__, 'test_ffcache_key') as dn:
+        fn_cache = os.path.join(dn, 'ff.h5')
+        ff0 = ForceField.generate(system, fn_pars, rcut=8*angstrom, cache=fn_cache)
+        assert load_ff_cache(fn_cache, system, key) is None
+        ff1 = ForceField.generate(system, fn_pars, rcut=9*angstrom, cache=fn_cache)
+        assert ff1.part_pair_mm3.pair_pot.rcut == 9*angstrom
+        ff2 = load_ff_cache(fn_cache, system, key)
+        assert ff2.part_pair_mm3.pair_pot.rcut == 9*angstrom
+        check_ff_equal(ff1, ff2)
+
+
+def test_ffcache_key_parameters():
+    system = get_system_water32()
+    fn_mm3 = pkg_resources.resource_filename(__name__, '../../data/test/parameters_water_mm3.txt')
+    fn_bondharm = pkg_resources.resource_filename(__name__, '../../data/test/parameters_water_bondharm.txt')
+    key = get_ff_cache_key(system, [fn_mm3, fn_bondharm], {})
+    assert key != get_ff_cache_key(system, [fn_mm3], {})
+    assert key == get_ff_cache_key(system, [fn_mm3, fn_bondharm], {})
+    parameters = Parameters.from_file([fn_mm3, fn_bondharm])
+    key = get_ff_cache_key(system, parameters, {})
+    assert key == get_ff_cache_key(system, parameters.copy(), {})
+    parameters['BONDHARM']['PARS'].lines[0] = (1, 'H O 4.0088096730e+03 1.0238240000e+00')
+    assert key != get_ff_cache_key(system, parameters, {})
+    with tmpdir(__name__, 'test_ffcache_key_parameters') as dn:
+        fn_cache = os.path.join(dn, 'ff.h5')
+        ff0 = ForceField.generate(get_system_water32(), parameters, cache=fn_cache)
+        ff1 = ForceField.generate(get_system_water32(), parameters, cache=fn_cache)
+        check_ff_equal(ff0, ff1)
+
+
+def test_ffcache_update_parameters():
+    with tmpdir(__name__, 'test_ffcache_update_parameters') as dn:
+        fn_pars = os.path.join(dn, 'parameters.txt')
+        fn_cache = os.path.join(dn, 'ff.h5')
+        write_parameters_water(fn_pars, ('bondharm', 'bendaharm', 'cross', 'fixq', 'mm3'))
+        ForceField.generate(get_system_water32(), fn_pars, rcut=9*angstrom, cache=fn_cache)
+        ff = ForceField.generate(get_system_water32(), fn_pars, rcut=9*angstrom, cache=fn_cache)
+        parameters = Parameters.from_file(fn_pars)
+    assert sorted(ff.generator_records) == ['BENDAHARM', 'BONDHARM', 'CROSS', 'FIXQ', 'MM3']
+    scale_parameter(parameters, 'BONDHARM', 'PARS', 2, 1.1)
+    scale_parameter(parameters, 'MM3', 'PARS', 2, 1.5)
+    energy = ff.compute()
+    ff.update_parameters(parameters)
+    assert ff.compute() != energy
+    check_ff_equal(ff, ForceField.generate(get_system_water32(), parameters, rcut=9*angstrom))
+
+
+def test_ffcache_unsupported():
+    system = get_system_water32()
+    ff = ForceField(system, [ForcePartPressure(system, 1e-3)])
+    with tmpdir(__name__, 'test_ffcache_unsupported') as dn:
+        fn_cache = os.path.join(dn, 'ff.h5')
+        assert not dump_ff_cache(fn_cache, ff, 'foo')
+        assert not os.path.isfile(fn_cache)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# YAFF is yet another force-field code.
+# Copyright (C) 2011 Toon Verstraelen <Toon.Verstraelen@UGent.be>,
+# Louis Vanduyfhuys <Louis.Vanduyfhuys@UGent.be>, Center for Molecular Modeling
+# (CMM), Ghent University, Ghent, Belgium; all rights reserved unless otherwise
+# stated.
+#
+# This file is part of YAFF.
+#
+# YAFF is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# YAFF is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+# --
+
+
+from __future__ import division
+
+import os
+
+import numpy as np
+import pkg_resources
+from nose.tools import assert_raises
+
+from molmod import angstrom
+from molmod.test.common import tmpdir
+
+from yaff import *
+from yaff.test.common import get_system_water32, get_system_polyethylene4
+from yaff.pes.test.common import write_parameters_water
+
+
+def check_ff_supercell(system, fn_pars, reps, **kwargs):
+    ff = ForceField.generate(system, fn_pars, **kwargs)
+    ff_super = ff.supercell(*reps)
+    ff_ref = ForceField.generate(system.supercell(*reps), fn_pars, **kwargs)
+    assert ff_super.system.natom == system.natom*np.prod(reps)
+    assert (ff_super.system.bonds == ff_ref.system.bonds).all()
+    assert [part.name for part in ff_super.parts] == [part.name for part in ff_ref.parts]
+    assert abs(ff_super.compute() - np.prod(reps)*ff.compute()) < 1e-8
+    # Break the periodicity of the supercell
+    np.random.seed(1)
+    pos = ff_ref.system.pos + np.random.normal(0, 0.1*angstrom, ff_ref.system.pos.shape)
+    for ff in ff_super, ff_ref:
+        ff.update_pos(pos.copy())
+        ff.compute(np.zeros(pos.shape), np.zeros((3, 3)))
+    for part_super, part_ref in zip(ff_super.parts, ff_ref.parts):
+        assert abs(part_super.energy - part_ref.energy) < 1e-10
+        assert abs(part_super.gpos - part_ref.gpos).max() < 1e-10
+        assert abs(part_super.vtens - part_ref.vtens).max() < 1e-10
+
+
+def test_ff_supercell_water32():
+    with tmpdir(__name__, 'test_ff_supercell_water32') as dn:
+        fn_pars = os.path.join(dn, 'parameters.txt')
+        write_parameters_water(fn_pars, ('bondharm', 'bendaharm', 'cross', 'fixq', 'mm3'))
+        check_ff_supercell(get_system_water32(), fn_pars, (2, 1, 2), rcut=9*angstrom, tailcorrections=True)
+
+
+def test_ff_supercell_polyethylene4():
+    fn_pars = pkg_resources.resource_filename(__name__, '../../data/test/parameters_alkane.txt')
+    check_ff_supercell(get_system_polyethylene4(), fn_pars, (3,))
+
+
+def test_ff_supercell_unsupported():
+    system = get_system_water32()
+    ff = ForceField(system, [ForcePartBias(system)])
+    with assert_raises(NotImplementedError):
+        ff.supercell(2, 2, 2)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# YAFF is yet another force-field code.
+# Copyright (C) 2011 Toon Verstraelen <Toon.Verstraelen@UGent.be>,
+# Louis Vanduyfhuys <Louis.Vanduyfhuys@UGent.be>, Center for Molecular Modeling
+# (CMM), Ghent University, Ghent, Belgium; all rights reserved unless otherwise
+# stated.
+#
+# This file is part of YAFF.
+#
+# YAFF is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# YAFF is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+# --
+
+
+from __future__ import division
+
+import os
+
+import numpy as np
+from nose.tools import assert_raises
+
+from molmod import angstrom, kcalmol
+from molmod.test.common import tmpdir
+
+from yaff import *
+from yaff.test.common import get_system_water32
+from yaff.pes.test.common import get_ff_water32_lj, write_parameters_water
+
+
+def get_frames(system, nframe=4):
+    np.random.seed(2)
+    return system.pos + np.random.normal(0, 0.05*angstrom, (nframe,) + system.pos.shape)
+
+
+def check_variants(variants, references, pos_frames):
+    pos0 = variants.ffs[0].system.pos.copy()
+    energies = variants.compute_frames(pos_frames)
+    assert energies.shape == (len(pos_frames), len(references))
+    assert (variants.ffs[0].system.pos == pos0).all()
+    for ivariant, ff in enumerate(references):
+        for iframe, pos in enumerate(pos_frames):
+            ff.update_pos(pos)
+            assert abs(energies[iframe, ivariant] - ff.compute()) < 1e-10
+        ff.update_pos(pos0)
+    # Each force field can still be used on its own.
+    for ff_variant, ff in zip(variants.ffs, references):
+        gpos_variant = np.zeros(ff.system.pos.shape)
+        energy_variant = ff_variant.compute(gpos_variant)
+        gpos = np.zeros(ff.system.pos.shape)
+        energy = ff.compute(gpos)
+        assert abs(energy_variant - energy) < 1e-10
+        assert abs(gpos_variant - gpos).max() < 1e-10
+
+
+def get_ff_water32_lj_variant(scale, extra_terms):
+    ff = get_ff_water32_lj()
+    ff.part_valence.vlist.vtab['par0'] *= scale
+    ff.part_pair_lj.pair_pot.epsilons[:] *= scale
+    if extra_terms:
+        system = ff.system
+        for i1 in range(system.natom):
+            for i0 in system.neighs1[i1]:
+                for i2 in system.neighs1[i1]:
+                    if i0 > i2:
+                        ff.part_valence.add_term(Harmonic(10*kcalmol/angstrom**2, 1.5*angstrom, UreyBradley(i0, i1, i2)))
+    return ff
+
+
+def test_ffvariants_water32():
+    variants = ForceFieldVariants([
+        get_ff_water32_lj_variant(1.0, False),
+        get_ff_water32_lj_variant(1.1, True),
+        get_ff_water32_lj_variant(0.9, False),
+    ])
+    assert len(variants) == 3
+    assert variants.ffs[1].part_valence.iclist is variants.ffs[0].part_valence.iclist
+    assert variants.ffs[2].nlist is variants.ffs[0].nlist
+    # Only the extra Urey-Bradley distances are added to the shared tables.
+    ff = get_ff_water32_lj()
+    assert variants.part_valence.iclist.nic == ff.part_valence.iclist.nic + 32
+    references = [
+        get_ff_water32_lj_variant(1.0, False),
+        get_ff_water32_lj_variant(1.1, True),
+        get_ff_water32_lj_variant(0.9, False),
+    ]
+    check_variants(variants, references, get_frames(ff.system))
+
+
+def test_ffvariants_generate():
+    with tmpdir(__name__, 'test_ffvariants_generate') as dn:
+        fns_pars = []
+        for suffixes in ('bondharm', 'bendaharm', 'fixq', 'mm3'), ('bondfues', 'bendcharm', 'fixq'):
+            fns_pars.append(os.path.join(dn, 'parameters_%s.txt' % suffixes[0]))
+            write_parameters_water(fns_pars[-1], suffixes)
+        variants = ForceFieldVariants.generate(get_system_water32(), fns_pars, rcut=9*angstrom)
+        assert variants.ffs[0].system is not variants.ffs[1].system
+        assert variants.ffs[0].system.pos is variants.ffs[1].system.pos
+        references = [ForceField.generate(get_system_water32(), fn_pars, rcut=9*angstrom) for fn_pars in fns_pars]
+        check_variants(variants, references, get_frames(references[0].system))
+
+
+def test_ffvariants_natom():
+    ff = get_ff_water32_lj()
+    system = ff.system.subsystem(np.arange(30))
+    with assert_raises(TypeError):
+        ForceFieldVariants([ff, ForceField(system, [ForcePartValence(system)])])
@@ -26,12 +26,16 @@
 from __future__ import division
 from __future__ import print_function
 
+import os
 import pkg_resources
 from nose.tools import assert_raises
 import numpy as np
 
+from molmod.test.common import tmpdir
+
 from yaff import *
 from yaff.log import log
+from yaff.pes.test.common import write_parameters_water, scale_parameter
 
 from yaff.test.common import get_system_water32, get_system_glycine, get_system_formaldehyde
 
@@ -824,3 +828,87 @@ def test_generator_formaldehyde_oopangle():
     assert (part_valence.vlist.vtab['kind'][0:3] == 5).all()
     assert abs(part_valence.vlist.vtab['par0'] - 1.0*kjmol).all() < 1e-10
     assert part_valence.vlist.nv == 3
+
+
+def test_update_parameters_water32():
+    with tmpdir(__name__, 'test_update_parameters_water32') as dn:
+        fn_pars = os.path.join(dn, 'parameters.txt')
+        write_parameters_water(fn_pars, ('bondharm', 'bendaharm', 'cross', 'fixq', 'mm3'))
+        parameters = Parameters.from_file(fn_pars)
+    ff = ForceField.generate(get_system_water32(), parameters, rcut=9*angstrom)
+    ff.compute()
+    parameters = parameters.copy()
+    scale_parameter(parameters, 'BONDHARM', 'PARS', 2, 1.1)
+    scale_parameter(parameters, 'BENDAHARM', 'PARS', 4, 0.9)
+    scale_parameter(parameters, 'CROSS', 'PARS', 3, 1.2)
+    scale_parameter(parameters, 'FIXQ', 'BOND', 2, 0.8)
+    scale_parameter(parameters, 'MM3', 'PARS', 2, 1.5)
+    ff.update_parameters(parameters)
+    ff_ref = ForceField.generate(get_system_water32(), parameters, rcut=9*angstrom)
+    nv = ff_ref.part_valence.vlist.nv
+    assert ff.part_valence.vlist.nv == nv
+    for name in 'kind', 'par0', 'par1', 'par2', 'ic0', 'ic1':
+        assert (ff.part_valence.vlist.vtab[name][:nv] == ff_ref.part_valence.vlist.vtab[name][:nv]).all()
+    assert (ff.system.charges == ff_ref.system.charges).all()
+    assert (ff.part_pair_mm3.pair_pot.epsilons == ff_ref.part_pair_mm3.pair_pot.epsilons).all()
+    gpos = np.zeros(ff.system.pos.shape)
+    vtens = np.zeros((3, 3))
+    energy = ff.compute(gpos, vtens)
+    gpos_ref = np.zeros(ff.system.pos.shape)
+    vtens_ref = np.zeros((3, 3))
+    energy_ref = ff_ref.compute(gpos_ref, vtens_ref)
+    assert abs(energy - energy_ref) < 1e-10
+    assert abs(gpos - gpos_ref).max() < 1e-10
+    assert abs(vtens - vtens_ref).max() < 1e-10
+
+
+def test_update_parameters_errors():
+    fn_pars = pkg_resources.resource_filename(__name__, '../../data/test/parameters_water_mm3.txt')
+    parameters = Parameters.from_file(fn_pars)
+    ff = ForceField.generate(get_system_water32(), parameters)
+    # The scalings are not updated.
+    parameters_scale = parameters.copy()
+    scale_parameter(parameters_scale, 'MM3', 'SCALE', 1, 0.5)
+    with assert_raises(ValueError):
+        ff.update_parameters(parameters_scale)
+    # Sections can not be added.
+    fn_bondharm = pkg_resources.resource_filename(__name__, '../../data/test/parameters_water_bondharm.txt')
+    with assert_raises(ValueError):
+        ff.update_parameters([fn_pars, fn_bondharm])
+    # Only generated force fields can be updated.
+    ff = ForceField(ff.system, ff.parts, ff.nlist)
+    with assert_raises(ValueError):
+        ff.update_parameters(parameters)
+
+
+def test_update_parameters_unsupported():
+    with tmpdir(__name__, 'test_update_parameters_unsupported') as dn:
+        fn_pars = os.path.join(dn, 'parameters.txt')
+        write_parameters_water(fn_pars, ('bondharm', 'bendaharm', 'fixq', 'lj'))
+        parameters = Parameters.from_file(fn_pars)
+    ff = ForceField.generate(get_system_water32(), parameters, rcut=9*angstrom)
+    energy = ff.compute()
+    vtab = ff.part_valence.vlist.vtab.copy()
+    charges = ff.system.charges.copy()
+    parameters = parameters.copy()
+    scale_parameter(parameters, 'BONDHARM', 'PARS', 2, 1.1)
+    scale_parameter(parameters, 'FIXQ', 'BOND', 2, 0.8)
+    scale_parameter(parameters, 'LJ', 'PARS', 1, 1.1)
+    # The LJ generator can not update its terms, so nothing may be changed.
+    with assert_raises(NotImplementedError):
+        ff.update_parameters(parameters)
+    nv = ff.part_valence.vlist.nv
+    assert (ff.part_valence.vlist.vtab['par0'][:nv] == vtab['par0'][:nv]).all()
+    assert (ff.system.charges == charges).all()
+    assert ff.compute() == energy
+
+
+def test_update_parameters_torsion():
+    system = get_system_glycine()
+    fn_pars = pkg_resources.resource_filename(__name__, '../../data/test/parameters_glycine_torsion.txt')
+    parameters = Parameters.from_file(fn_pars)
+    ff = ForceField.generate(system, parameters)
+    # A rest angle that is not a multiple of pi/m changes the kind of term.
+    scale_parameter(parameters, 'TORSION', 'PARS', 6, 0.5)
+    with assert_raises(ValueError):
+        ff.update_parameters(parameters)
@@ -317,3 +317,68 @@ def test_nlist_water32_6A_skin3A():
 def test_nlist_water32_10A_skin2A():
     system = get_system_water32()
     check_nlist_skin(system, 10*angstrom, 2*angstrom)
+
+
+def check_nlist_strain(system, rcut, skin):
+    nlist1 = NeighborList(system, skin)
+    nlist1.request_rcut(rcut)
+    nlist1.update()
+    # Deform the cell and displace the atoms such that the skin is still
+    # sufficient.
+    strain = np.random.uniform(-1, 1, (3, 3))
+    strain = 0.5*(strain + strain.T)
+    strain *= 0.2*skin/(rcut + skin)/np.linalg.norm(strain, 2)
+    deformation = np.identity(3) + strain
+    system.cell.update_rvecs(np.dot(system.cell.rvecs, deformation))
+    system.pos[:] = np.dot(system.pos, deformation)
+    for i in range(system.natom):
+        vec = np.random.normal(-1, 1, 3)
+        vec *= 0.3/(nlist1.rmax.max()+1)*skin/np.linalg.norm(vec)
+        system.pos[i] += vec
+    nlist1.update_rmax()
+    assert not nlist1._need_rebuild()
+    nlist1.update()
+
+    nlist2 = NeighborList(system)
+    nlist2.request_rcut(rcut)
+    nlist2.update()
+
+    # Check if all pairs within rcut are present in nlist1, with the correct
+    # relative vectors. The image labels may differ because they are defined
+    # with respect to the positions at the last rebuild.
+    lookup = {}
+    for row in nlist1.neighs[:nlist1.nneigh]:
+        delta = np.array([row['dx'], row['dy'], row['dz']])
+        lookup.setdefault((row['a'], row['b']), []).append(delta)
+        lookup.setdefault((row['b'], row['a']), []).append(-delta)
+    for row in nlist2.neighs[:nlist2.nneigh]:
+        if row['d'] >= rcut:
+            continue
+        delta = np.array([row['dx'], row['dy'], row['dz']])
+        deltas = np.array(lookup[(row['a'], row['b'])])
+        assert abs(deltas - delta).max(axis=1).min() < 1e-8
+
+    # A larger cutoff within the remaining margin does not need a rebuild.
+    nlist1.request_rcut(rcut + 0.1*skin)
+    assert not nlist1._need_rebuild()
+    nlist1.request_rcut(rcut + skin)
+    assert nlist1._need_rebuild()
+    nlist1.update()
+    assert not nlist1._need_rebuild()
+
+    # A large compression of the cell triggers a rebuild.
+    deformation = np.identity(3)*(1 - skin/(rcut + skin))
+    system.cell.update_rvecs(np.dot(system.cell.rvecs, deformation))
+    system.pos[:] = np.dot(system.pos, deformation)
+    nlist1.update_rmax()
+    assert nlist1._need_rebuild()
+
+
+def test_nlist_quartz_6A_skin3A_strain():
+    system = get_system_quartz()
+    check_nlist_strain(system, 6*angstrom, 3*angstrom)
+
+
+def test_nlist_water32_6A_skin2A_strain():
+    system = get_system_water32()
+    check_nlist_strain(system, 6*angstrom, 2*angstrom)
@@ -31,10 +31,12 @@ from molmod import bend_angle, bend_cos, dihed_angle, dihed_cos
 from nose.plugins.skip import SkipTest
 
 from yaff import *
+from yaff.pes.iclist import SqOopDist
 
 from yaff.test.common import get_system_quartz, get_system_water32, \
     get_system_2T, get_system_peroxide, get_system_mil53, get_system_formaldehyde
-from yaff.pes.test.common import check_gpos_part, check_vtens_part
+from yaff.pes.test.common import check_gpos_part, check_vtens_part, \
+    check_hessian_part
 
 
 def test_vlist_quartz_bonds():
@@ -64,6 +66,31 @@ def test_vlist_quartz_bonds():
     assert abs(energy - check_energy) < 1e-8
 
 
+def test_vlist_peroxide_kind_energies():
+    system = get_system_peroxide()
+    dlist = DeltaList(system)
+    iclist = InternalCoordinateList(dlist)
+    vlist = ValenceList(iclist)
+    vlist.add_term(Harmonic(2.3, 2.5, Bond(0, 1)))
+    vlist.add_term(Harmonic(2.1, 1.9, Bond(1, 2)))
+    vlist.add_term(Harmonic(1.5, 1.6, BendAngle(0, 1, 2)))
+    vlist.add_term(Harmonic(1.4, 0.4, BendCos(1, 2, 3)))
+    vlist.add_term(Harmonic(1.1, -0.2, DihedCos(0, 1, 2, 3)))
+    vlist.add_term(Cross(0.3, 1.7, 1.8, Bond(0, 1), BendAngle(0, 1, 2)))
+    dlist.forward()
+    iclist.forward()
+    energy = vlist.forward()
+    energies = vlist.vtab['energy']
+    assert vlist.kind_energies.shape == (16,)
+    assert abs(vlist.kind_energies[0] - energies[:2].sum()) < 1e-10
+    assert abs(vlist.kind_energies[1] - energies[3]) < 1e-10
+    assert abs(vlist.kind_energies[2] - energies[2]) < 1e-10
+    assert abs(vlist.kind_energies[3] - energies[4]) < 1e-10
+    assert (vlist.kind_energies[4:] == 0.0).all()
+    # Only the cross term is missing.
+    assert abs(vlist.kind_energies.sum() + energies[5] - energy) < 1e-10
+
+
 def test_vlist_quartz_bonds_fues():
     system = get_system_quartz()
     dlist = DeltaList(system)
@@ -954,3 +981,56 @@ def test_gpos_vtens_oopdist_formaldehyde():
     part.add_term(Harmonic(0.0,0.0*angstrom,OopDist(2,3,1,0)))
     check_gpos_part(system, part)
     check_vtens_part(system, part)
+
+
+def test_hessian_bonds_bends_water32():
+    system = get_system_water32()
+    system.pos += np.random.RandomState(1).normal(0, 0.05, system.pos.shape)
+    part = ForcePartValence(system)
+    for i, j in system.bonds[:12]:
+        part.add_term(Harmonic(0.3, 1.7, Bond(i, j)))
+        part.add_term(Fues(0.3, 1.7, Bond(i, j)))
+        part.add_term(MM3Quartic(0.3, 1.7, Bond(i, j)))
+        part.add_term(Morse(0.3, 1.1, 1.7, Bond(i, j)))
+        part.add_term(BondDoubleWell(0.3, 1.7, 2.1, Bond(i, j)))
+        part.add_term(PolySix([0.1, -0.2, 0.3, -0.1, 0.05, 0.01], Bond(i, j)))
+    for i1 in range(0, 24, 3):
+        i0, i2 = sorted(system.neighs1[i1])
+        part.add_term(Harmonic(0.3, 1.8, BendAngle(i0, i1, i2)))
+        part.add_term(MM3Bend(0.3, 1.8, BendAngle(i0, i1, i2)))
+        part.add_term(Chebychev2(0.3, BendCos(i0, i1, i2)))
+        part.add_term(Harmonic(0.3, 3.0, UreyBradley(i0, i1, i2)))
+        part.add_term(Cross(0.3, 1.7, 1.8, Bond(i0, i1), BendAngle(i0, i1, i2)))
+        part.add_term(Cross(0.3, 1.7, 1.7, Bond(i0, i1), Bond(i1, i2)))
+    check_hessian_part(system, part)
+
+
+def test_hessian_diheds_peroxide():
+    system = get_system_peroxide()
+    system.pos += np.random.RandomState(2).normal(0, 0.05, system.pos.shape)
+    part = ForcePartValence(system)
+    part.add_term(Cosine(3, 0.1, 0.2, DihedAngle(2, 0, 1, 3)))
+    part.add_term(Harmonic(0.1, 0.2, DihedCos(2, 0, 1, 3)))
+    part.add_term(PolyFour([0.1, -0.2, 0.3, -0.1], DihedCos(2, 0, 1, 3)))
+    part.add_term(Chebychev1(0.1, DihedCos(2, 0, 1, 3)))
+    part.add_term(Chebychev3(0.1, DihedCos(2, 0, 1, 3)))
+    part.add_term(Chebychev4(0.1, DihedCos(2, 0, 1, 3)))
+    part.add_term(Chebychev6(0.1, DihedCos(2, 0, 1, 3)))
+    part.add_term(Harmonic(0.1, 0.2, DihedCos2(2, 0, 1, 3)))
+    part.add_term(Harmonic(0.1, 0.2, DihedCos3(2, 0, 1, 3)))
+    part.add_term(Harmonic(0.1, 0.2, DihedCos4(2, 0, 1, 3)))
+    part.add_term(Harmonic(0.1, 0.2, DihedCos6(2, 0, 1, 3)))
+    check_hessian_part(system, part)
+
+
+def test_hessian_oops_formaldehyde():
+    system = get_system_formaldehyde()
+    system.pos += np.random.RandomState(3).normal(0, 0.1, system.pos.shape)
+    part = ForcePartValence(system)
+    part.add_term(Harmonic(0.1, 0.0, OopAngle(2, 3, 1, 0)))
+    part.add_term(Harmonic(0.1, 0.0, OopMeanAngle(2, 3, 1, 0)))
+    part.add_term(Harmonic(0.1, 1.0, OopCos(2, 3, 1, 0)))
+    part.add_term(Harmonic(0.1, 1.0, OopMeanCos(2, 3, 1, 0)))
+    part.add_term(Harmonic(0.1, 0.0, OopDist(2, 3, 1, 0)))
+    part.add_term(Harmonic(0.1, 0.0, SqOopDist(2, 3, 1, 0)))
+    check_hessian_part(system, part)
@@ -145,13 +145,20 @@ v_forward_type v_forward_fns[16] = {
   forward_morse, forward_gauss
 };
 
-double vlist_forward(iclist_row_type* ictab, vlist_row_type* vtab, long nv) {
-  long i;
+double vlist_forward(iclist_row_type* ictab, vlist_row_type* vtab, long nv, double* kind_energies, long nkind) {
+  long i, kind;
   double energy;
   energy = 0.0;
+  for (i=0; i<nkind; i++) kind_energies[i] = 0.0;
   for (i=0; i<nv; i++) {
     vtab[i].energy = v_forward_fns[vtab[i].kind](vtab + i, ictab);
     energy += vtab[i].energy;
+    // Sum of the energies per kind of internal coordinate, excluding cross
+    // terms (kind 3) that involve two internal coordinates.
+    if (vtab[i].kind != 3) {
+      kind = ictab[vtab[i].ic0].kind;
+      if (kind < nkind) kind_energies[kind] += vtab[i].energy;
+    }
   }
   return energy;
 }
@@ -268,97 +275,117 @@ void vlist_back(iclist_row_type* ictab, vlist_row_type* vtab, long nv) {
   }
 }
 
-typedef void (*v_hessian_type)(vlist_row_type*, iclist_row_type*, long nic, double* hessian);
+typedef void (*v_hessian_type)(vlist_row_type*, iclist_row_type*, double*);
+
+// The second derivatives of each term are stored in three consecutive
+// elements: d2E/dq0^2, d2E/dq0dq1 and d2E/dq1^2, where q0 and q1 are the
+// internal coordinates ic0 and ic1. Only cross terms depend on ic1.
 
-void hessian_harmonic(vlist_row_type* term, iclist_row_type* ictab, long nic, double* hessian) {
-  long index = (*term).ic0*(nic+1);
-  hessian[index] += (*term).par0;
+void hessian_harmonic(vlist_row_type* term, iclist_row_type* ictab, double* hessian) {
+  hessian[0] += (*term).par0;
 }
 
-void hessian_polyfour(vlist_row_type* term, iclist_row_type* ictab, long nic, double* hessian) {
-  long index = (*term).ic0*(nic+1);
+void hessian_polyfour(vlist_row_type* term, iclist_row_type* ictab, double* hessian) {
   double q = ictab[(*term).ic0].value;
-  hessian[index] += 2.0*(*term).par1 + 6.0*(*term).par2*q + 12.0*(*term).par3*q*q;
+  hessian[0] += 2.0*(*term).par1 + 6.0*(*term).par2*q + 12.0*(*term).par3*q*q;
 }
 
-void hessian_fues(vlist_row_type* term, iclist_row_type* ictab, long nic, double* hessian) {
-  long index = (*term).ic0*(nic+1);
+void hessian_fues(vlist_row_type* term, iclist_row_type* ictab, double* hessian) {
   double x = (*term).par1/ictab[(*term).ic0].value;
-  hessian[index] += (*term).par0*x*x*x*(3.0*x-2.0);
+  hessian[0] += (*term).par0*x*x*x*(3.0*x-2.0);
 }
 
-void hessian_cross(vlist_row_type* term, iclist_row_type* ictab, long nic, double* hessian) {
-  long index = (*term).ic0*nic+(*term).ic1;
-  hessian[index] += (*term).par0;
-  index = (*term).ic1*nic+(*term).ic0;
-  hessian[index] += (*term).par0;
+void hessian_cross(vlist_row_type* term, iclist_row_type* ictab, double* hessian) {
+  hessian[1] += (*term).par0;
 }
 
-void hessian_cosine(vlist_row_type* term, iclist_row_type* ictab, long nic, double* hessian) {
-  long index = (*term).ic0*(nic+1);
-  hessian[index] += 0.5*(*term).par1*(*term).par0*(*term).par0*cos(
+void hessian_cosine(vlist_row_type* term, iclist_row_type* ictab, double* hessian) {
+  hessian[0] += 0.5*(*term).par1*(*term).par0*(*term).par0*cos(
     (*term).par0*(ictab[(*term).ic0].value - (*term).par2)
   );
 }
 
-void hessian_chebychev1(vlist_row_type* term, iclist_row_type* ictab, long nic, double* hessian) {
+void hessian_chebychev1(vlist_row_type* term, iclist_row_type* ictab, double* hessian) {
   //Nothing to do here...
 }
 
-void hessian_chebychev2(vlist_row_type* term, iclist_row_type* ictab, long nic, double* hessian) {
-  long index = (*term).ic0*(nic+1);
-  hessian[index] += (*term).par1*2.0*(*term).par0;
+void hessian_chebychev2(vlist_row_type* term, iclist_row_type* ictab, double* hessian) {
+  hessian[0] += (*term).par1*2.0*(*term).par0;
 }
 
-void hessian_chebychev3(vlist_row_type* term, iclist_row_type* ictab, long nic, double* hessian) {
-  long index = (*term).ic0*(nic+1);
+void hessian_chebychev3(vlist_row_type* term, iclist_row_type* ictab, double* hessian) {
   double c;
   c = ictab[(*term).ic0].value;
-  hessian[index] += (*term).par1*12*(*term).par0*c;
+  hessian[0] += (*term).par1*12*(*term).par0*c;
 }
 
-void hessian_chebychev4(vlist_row_type* term, iclist_row_type* ictab, long nic, double* hessian) {
-  long index = (*term).ic0*(nic+1);
+void hessian_chebychev4(vlist_row_type* term, iclist_row_type* ictab, double* hessian) {
   double c;
   c = ictab[(*term).ic0].value;
-  hessian[index] += (*term).par1*8*(*term).par0*(6*c*c-1);
+  hessian[0] += (*term).par1*8*(*term).par0*(6*c*c-1);
 }
 
-void hessian_chebychev6(vlist_row_type* term, iclist_row_type* ictab, long nic, double* hessian) {
-  long index = (*term).ic0*(nic+1);
+void hessian_chebychev6(vlist_row_type* term, iclist_row_type* ictab, double* hessian) {
   double c;
   c = ictab[(*term).ic0].value;
-  hessian[index] += (*term).par1*6*(*term).par0*(80*c*c*c*c-48*c*c+3);
+  hessian[0] += (*term).par1*6*(*term).par0*(80*c*c*c*c-48*c*c+3);
 }
 
-void hessian_polysix(vlist_row_type* term, iclist_row_type* ictab, long nic, double* hessian) {
-  long index = (*term).ic0*(nic+1);
+void hessian_polysix(vlist_row_type* term, iclist_row_type* ictab, double* hessian) {
   double q = ictab[(*term).ic0].value;
-  hessian[index] += 2.0*(*term).par1 + 6.0*(*term).par2*q + 12.0*(*term).par3*q*q + 20.0*(*term).par4*q*q*q + 30.0*(*term).par5*q*q*q*q;
+  hessian[0] += 2.0*(*term).par1 + 6.0*(*term).par2*q + 12.0*(*term).par3*q*q + 20.0*(*term).par4*q*q*q + 30.0*(*term).par5*q*q*q*q;
+}
+
+void hessian_mm3quartic(vlist_row_type* term, iclist_row_type* ictab, double* hessian) {
+  //see comments in forward_mm3quartic
+  double q = (ictab[(*term).ic0].value - (*term).par1);
+  hessian[0] += ((*term).par0)*(1.0-4.048206*q+6.373098*q*q);
+}
+
+void hessian_mm3bend(vlist_row_type* term, iclist_row_type* ictab, double* hessian) {
+  //see comments in forward_mm3bend
+  double q = (ictab[(*term).ic0].value - (*term).par1);
+  double q2 = q*q;
+  hessian[0] += ((*term).par0)*(1.0-2.406422*q+1.103022*q2-1.316636*q2*q+3.556350*q2*q2);
 }
 
-void hessian_morse(vlist_row_type* term, iclist_row_type* ictab, long nic, double* hessian) {
-  long index = (*term).ic0*(nic+1);
+void hessian_bonddoublewell(vlist_row_type* term, iclist_row_type* ictab, double* hessian) {
+  double K, temp;
+  double x, z;
+  temp = ((*term).par1-(*term).par2)*((*term).par1-(*term).par2);
+  temp *= temp;
+  K = (*term).par0/(temp);
+  x = ictab[(*term).ic0].value - (*term).par1;
+  z = ictab[(*term).ic0].value - (*term).par2;
+  hessian[0] += K*z*z*(z*z+8*x*z+6*x*x);
+}
+
+void hessian_morse(vlist_row_type* term, iclist_row_type* ictab, double* hessian) {
   double a;
   a = (*term).par1*(ictab[(*term).ic0].value-(*term).par2);
-  hessian[index] += 2.0*(*term).par1*(*term).par0*(*term).par0*(2.0*exp(-2.0*a)-exp(-a));
+  hessian[0] += 2.0*(*term).par1*(*term).par1*(*term).par0*(2.0*exp(-2.0*a)-exp(-a));
 }
 
-void hessian_nan(vlist_row_type* term, iclist_row_type* ictab, long nic, double* hessian) {
-  // Stub function for when people code new terms without implementing the hessian!
-  long index = (*term).ic0*(nic+1);
-  hessian[index] += NAN;
+void hessian_gauss(vlist_row_type* term, iclist_row_type* ictab, double* hessian) {
+  double a, b;
+  a = ictab[(*term).ic0].value - (*term).par1;
+  b = (*term).par2*(*term).par2;
+  hessian[0] += (*term).par0*exp(-a*a/(2*b))*(a*a/b-1)/b;
 }
 
-v_hessian_type v_hessian_fns[15] = {
+v_hessian_type v_hessian_fns[16] = {
   hessian_harmonic, hessian_polyfour, hessian_fues, hessian_cross, hessian_cosine,
   hessian_chebychev1, hessian_chebychev2, hessian_chebychev3, hessian_chebychev4,
-  hessian_chebychev6, hessian_polysix, hessian_nan, hessian_nan, hessian_nan, hessian_morse
+  hessian_chebychev6, hessian_polysix, hessian_mm3quartic,
+  hessian_mm3bend, hessian_bonddoublewell, hessian_morse, hessian_gauss
 };
 
-void vlist_hessian(iclist_row_type* ictab, vlist_row_type* vtab, long nv, long nic, double* hessian) {
+void vlist_hessian(iclist_row_type* ictab, vlist_row_type* vtab, long nv, double* hessian) {
   long i;
   for (i=0; i<nv; i++) {
-    v_hessian_fns[vtab[i].kind](vtab + i, ictab, nic, hessian);
+    hessian[3*i] = 0.0;
+    hessian[3*i+1] = 0.0;
+    hessian[3*i+2] = 0.0;
+    v_hessian_fns[vtab[i].kind](vtab + i, ictab, hessian + 3*i);
   }
 }
@@ -36,7 +36,8 @@ typedef struct {
   double energy;           // The computed value of the energy, output of forward method.
 } vlist_row_type;
 
-double vlist_forward(iclist_row_type* ictab, vlist_row_type* vtab, long nv);
+double vlist_forward(iclist_row_type* ictab, vlist_row_type* vtab, long nv, double* kind_energies, long nkind);
 void vlist_back(iclist_row_type* ictab, vlist_row_type* vtab, long nv);
+void vlist_hessian(iclist_row_type* ictab, vlist_row_type* vtab, long nv, double* hessian);
 
 #endif
@@ -25,12 +25,13 @@
 
 cimport iclist
 
-cdef extern from "vlist.h":
+cdef extern from "vlist.h" nogil:
     ctypedef struct vlist_row_type:
         long kind
         double par0, par1, par2, par3, par4, par5
         long ic0, ic1
         double energy
 
-    double vlist_forward(iclist.iclist_row_type* ictab, vlist_row_type* vtab, long nv)
+    double vlist_forward(iclist.iclist_row_type* ictab, vlist_row_type* vtab, long nv, double* kind_energies, long nkind)
     void vlist_back(iclist.iclist_row_type* ictab, vlist_row_type* vtab, long nv)
+    void vlist_hessian(iclist.iclist_row_type* ictab, vlist_row_type* vtab, long nv, double* hessian)
@@ -60,7 +60,8 @@ from __future__ import division
 import numpy as np
 
 from yaff.log import log
-from yaff.pes.ext import vlist_dtype, vlist_forward, vlist_back
+from yaff.pes.ext import vlist_dtype, vlist_forward, vlist_back, \
+    vlist_hessian
 
 
 __all__ = [
@@ -85,6 +86,9 @@ class ValenceList(object):
         self.iclist = iclist
         self.vtab = np.zeros(10, vlist_dtype)
         self.nv = 0
+        # The energy of all (non-cross) terms for each kind of internal
+        # coordinate, updated by the forward method.
+        self.kind_energies = np.zeros(16, float)
 
     def add_term(self, term):
         '''Register a new covalent energy term
@@ -113,11 +117,12 @@ class ValenceList(object):
     def forward(self):
         """Compute the values of the energy terms, based on the values of the
            internal coordinates list, and store the result in the ``self.vtab``
-           table.
+           table. The energies are also summed per kind of internal coordinate
+           in ``self.kind_energies``.
 
            The actual computation is carried out by a low-level C routine.
         """
-        return vlist_forward(self.iclist.ictab, self.vtab, self.nv)
+        return vlist_forward(self.iclist.ictab, self.vtab, self.nv, self.kind_energies)
 
     def back(self):
         """Compute the derivatives of the energy terms towards the internal
@@ -127,6 +132,33 @@ class ValenceList(object):
         """
         vlist_back(self.iclist.ictab, self.vtab, self.nv)
 
+    def hessian(self):
+        """Compute the second derivatives of the energy towards the internal
+           coordinates.
+
+           **Returns:** a ``scipy.sparse.csr_matrix`` with shape (nic, nic).
+
+           The actual computation is carried out by a low-level C routine.
+        """
+        import scipy.sparse
+        vtab = self.vtab[:self.nv]
+        terms = np.zeros((self.nv, 3), float)
+        vlist_hessian(self.iclist.ictab, self.vtab, self.nv, terms)
+        ic0 = vtab['ic0']
+        ic1 = vtab['ic1']
+        cross = ic1 >= 0
+        nic = self.iclist.nic
+        return scipy.sparse.csr_matrix(
+            (
+                np.concatenate([terms[:,0], terms[cross,1], terms[cross,1], terms[cross,2]]),
+                (
+                    np.concatenate([ic0, ic0[cross], ic1[cross], ic1[cross]]),
+                    np.concatenate([ic0, ic1[cross], ic0[cross], ic1[cross]]),
+                ),
+            ),
+            shape=(nic, nic)
+        )
+
     def lookup_atoms(self, row):
         """Look up the atom for a given row index."""
         result = []
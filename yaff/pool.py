@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# YAFF is yet another force-field code.
+# Copyright (C) 2011 Toon Verstraelen <Toon.Verstraelen@UGent.be>,
+# Louis Vanduyfhuys <Louis.Vanduyfhuys@UGent.be>, Center for Molecular Modeling
+# (CMM), Ghent University, Ghent, Belgium; all rights reserved unless otherwise
+# stated.
+#
+# This file is part of YAFF.
+#
+# YAFF is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# YAFF is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+# --
+"""Pools of forked worker processes
+
+   The force field, the cost function of the tuning module and the batch
+   optimizations distribute their work over worker processes that are created
+   with ``fork``. The workers inherit the objects they need from the parent
+   process, such that force fields and parameters need not be pickled.
+"""
+
+
+from __future__ import division
+
+import multiprocessing
+
+from yaff.log import log
+
+
+__all__ = ['get_fork_pool', 'get_worker_args']
+
+
+# The objects passed to get_fork_pool, inherited by the forked workers.
+_worker_args = None
+
+
+def get_fork_pool(nproc, args):
+    '''Return a pool of worker processes created with ``fork``
+
+       **Arguments:**
+
+       nproc
+            The number of worker processes.
+
+       args
+            An arbitrary object that is made available in the workers through
+            ``get_worker_args``. It is inherited from the parent process and
+            not pickled.
+
+       The screen output of the workers is disabled. A NotImplementedError is
+       raised on platforms that do not support the ``fork`` start method. The
+       caller must close the pool.
+    '''
+    try:
+        context = multiprocessing.get_context('fork')
+    except AttributeError:
+        # Python 2 always forks on POSIX systems.
+        context = multiprocessing
+    except ValueError:
+        raise NotImplementedError('Worker processes require the fork start method.')
+    return context.Pool(nproc, _init_worker, (args,))
+
+
+def get_worker_args():
+    '''Return the args of the pool to which the current worker belongs'''
+    return _worker_args
+
+
+def _init_worker(args):
+    '''Initialize a worker process of a pool made by get_fork_pool'''
+    global _worker_args
+    _worker_args = args
+    # Output of concurrent workers would be interleaved.
+    log.set_level(log.silent)
@@ -24,6 +24,8 @@
 '''Phase-space sampling'''
 
 
+from yaff.sampling.batch import *
+from yaff.sampling.constraints import *
 from yaff.sampling.dof import *
 from yaff.sampling.harmonic import *
 from yaff.sampling.io import *
@@ -32,5 +34,6 @@ from yaff.sampling.npt import *
 from yaff.sampling.opt import *
 from yaff.sampling.utils import *
 from yaff.sampling.verlet import *
+from yaff.sampling.respa import *
 from yaff.sampling.nvt import *
 from yaff.sampling.trajectory import *
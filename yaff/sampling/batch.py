@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+# YAFF is yet another force-field code.
+# Copyright (C) 2011 Toon Verstraelen <Toon.Verstraelen@UGent.be>,
+# Louis Vanduyfhuys <Louis.Vanduyfhuys@UGent.be>, Center for Molecular Modeling
+# (CMM), Ghent University, Ghent, Belgium; all rights reserved unless otherwise
+# stated.
+#
+# This file is part of YAFF.
+#
+# YAFF is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# YAFF is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+# --
+'''Geometry optimization of many structures with the same parameters
+
+   The ``batch_optimize`` function relaxes a list of structures, optionally
+   in a pool of worker processes. The results are written to a single HDF5
+   file as soon as they become available. When the file already contains
+   results for the same list of structures, only the missing structures are
+   optimized, such that an interrupted screening can be resumed.
+
+   The HDF5 file contains a group ``batch`` with the following datasets, each
+   with one row per structure:
+
+   filenames
+        The input files.
+
+   done
+        Whether the structure has been processed.
+
+   converged
+        Whether the optimization converged.
+
+   niter
+        The number of optimization steps.
+
+   energy
+        The potential energy of the final structure.
+
+   rvecs
+        The final cell vectors, padded with nan values to a (3, 3) array.
+
+   error
+        The error message when the optimization failed, an empty string
+        otherwise.
+
+   The final positions of structure ``i`` are stored in ``batch/pos/i``.
+'''
+
+
+from __future__ import division
+
+import numpy as np
+
+from yaff.log import log, timer
+from yaff.pes.ff import ForceField
+from yaff.pool import get_fork_pool, get_worker_args
+from yaff.sampling.dof import CartesianDOF
+from yaff.sampling.opt import QNOptimizer
+from yaff.system import System
+
+
+__all__ = ['batch_optimize']
+
+
+def batch_optimize(fns, parameters, fn_h5, nproc=None, nstep=1000,
+                   DOFClass=CartesianDOF, dof_kwargs=None,
+                   OptimizerClass=QNOptimizer, ff_kwargs=None):
+    '''Optimize the geometry of many structures
+
+       **Arguments:**
+
+       fns
+            A list of filenames that can be loaded with ``System.from_file``.
+            The files must contain the atom types. Bonds are detected when
+            they are not present.
+
+       parameters
+            The force field parameters, in any format accepted by
+            ``ForceField.generate``.
+
+       fn_h5
+            The HDF5 file in which the results are stored. See
+            :mod:`yaff.sampling.batch` for its layout.
+
+       **Optional arguments:**
+
+       nproc
+            The number of worker processes. By default, all structures are
+            optimized in the current process.
+
+       nstep
+            The maximum number of optimization steps per structure.
+
+       DOFClass, dof_kwargs
+            The class and the optional arguments of the degrees of freedom,
+            e.g. ``StrainCellDOF`` and ``{'gpos_rms': 1e-6}`` to optimize the
+            cell as well.
+
+       OptimizerClass
+            The class of the optimizer.
+
+       ff_kwargs
+            Optional arguments for ``ForceField.generate``.
+
+       **Returns:** a tuple ``(energies, converged)`` with the final energy
+       and the convergence flag of each structure.
+
+       The parameters are parsed once, before the worker processes are forked,
+       such that the workers only need to generate a force field for each
+       structure. A failed optimization is recorded in the ``error`` dataset
+       and does not interrupt the other optimizations.
+    '''
+    import h5py as h5
+    from yaff.pes.generator import load_parameters
+    fns = [str(fn) for fn in fns]
+    settings = (
+        load_parameters(parameters), ff_kwargs or {}, DOFClass,
+        dof_kwargs or {}, OptimizerClass, nstep,
+    )
+    with log.section('BATCH'), timer.section('Batch optimization'), h5.File(fn_h5, 'a') as f:
+        grp = _init_batch_group(f, fns)
+        todo = [(i, fn) for i, fn in enumerate(fns) if not grp['done'][i]]
+        if log.do_medium:
+            log('Optimizing %i of %i structures with %i process(es).' % (len(todo), len(fns), max(1, nproc or 1)))
+        if nproc is None or nproc <= 1 or len(todo) < 2:
+            for task in todo:
+                _write_result(grp, _optimize_structure(task, settings))
+        else:
+            pool = get_fork_pool(min(nproc, len(todo)), settings)
+            try:
+                for result in pool.imap_unordered(_optimize_structure, todo):
+                    _write_result(grp, result)
+            finally:
+                pool.terminate()
+                pool.join()
+        if log.do_medium:
+            log('Converged: %i of %i structures.' % (grp['converged'][:].sum(), len(fns)))
+        return grp['energy'][:], grp['converged'][:]
+
+
+def _init_batch_group(f, fns):
+    '''Create the batch group or check that it matches the list of files'''
+    import h5py as h5
+    if 'batch' in f:
+        grp = f['batch']
+        old_fns = [fn.decode() if isinstance(fn, bytes) else fn for fn in grp['filenames'][:]]
+        if old_fns != fns:
+            raise ValueError('The file %s contains results for other structures.' % f.filename)
+        return grp
+    nstruct = len(fns)
+    str_dtype = h5.special_dtype(vlen=str)
+    grp = f.create_group('batch')
+    grp.create_dataset('filenames', data=np.array(fns, dtype=object), dtype=str_dtype)
+    grp.create_dataset('done', data=np.zeros(nstruct, bool))
+    grp.create_dataset('converged', data=np.zeros(nstruct, bool))
+    grp.create_dataset('niter', data=np.zeros(nstruct, int))
+    grp.create_dataset('energy', data=np.full(nstruct, np.nan))
+    grp.create_dataset('rvecs', data=np.full((nstruct, 3, 3), np.nan))
+    grp.create_dataset('error', shape=(nstruct,), dtype=str_dtype)
+    grp.create_group('pos')
+    return grp
+
+
+def _write_result(grp, result):
+    '''Store the result of one structure and flush the file'''
+    i, values = result
+    if 'error' in values:
+        grp['error'][i] = values['error']
+        if log.do_warning:
+            log.warn('Optimization of structure %i failed: %s' % (i, values['error']))
+    else:
+        grp['energy'][i] = values['energy']
+        grp['converged'][i] = values['converged']
+        grp['niter'][i] = values['niter']
+        rvecs = np.full((3, 3), np.nan)
+        rvecs[:len(values['rvecs'])] = values['rvecs']
+        grp['rvecs'][i] = rvecs
+        name = str(i)
+        if name in grp['pos']:
+            del grp['pos'][name]
+        grp['pos'].create_dataset(name, data=values['pos'])
+        grp['error'][i] = ''
+    grp['done'][i] = True
+    grp.file.flush()
+
+
+def _optimize_structure(task, settings=None):
+    '''Optimize one structure, in the current or in a worker process
+
+       In a worker process, the settings are those passed to the pool.
+    '''
+    i, fn = task
+    if settings is None:
+        settings = get_worker_args()
+    parameters, ff_kwargs, DOFClass, dof_kwargs, OptimizerClass, nstep = settings
+    try:
+        system = System.from_file(fn)
+        if system.bonds is None:
+            system.detect_bonds()
+        ff = ForceField.generate(system, parameters, **ff_kwargs)
+        dof = DOFClass(ff, **dof_kwargs)
+        opt = OptimizerClass(dof)
+        opt.run(nstep)
+        energy = ff.compute()
+    except Exception as e:
+        return i, {'error': '%s: %s' % (e.__class__.__name__, e)}
+    return i, {
+        'energy': energy,
+        'converged': bool(dof.converged),
+        'niter': opt.counter,
+        'rvecs': ff.system.cell.rvecs.copy(),
+        'pos': ff.system.pos.copy(),
+    }
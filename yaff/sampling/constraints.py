@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+# YAFF is yet another force-field code.
+# Copyright (C) 2011 Toon Verstraelen <Toon.Verstraelen@UGent.be>,
+# Louis Vanduyfhuys <Louis.Vanduyfhuys@UGent.be>, Center for Molecular Modeling
+# (CMM), Ghent University, Ghent, Belgium; all rights reserved unless otherwise
+# stated.
+#
+# This file is part of YAFF.
+#
+# YAFF is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# YAFF is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+# --
+'''Holonomic bond length constraints (SHAKE/RATTLE)'''
+
+
+from __future__ import division
+
+import numpy as np
+
+from yaff.log import log, timer
+
+
+__all__ = ['BondConstraints']
+
+
+class BondConstraints(object):
+    '''Fixed bond lengths, imposed with the SHAKE and RATTLE algorithms.
+
+       An instance of this class is passed to the ``constraints`` argument of
+       the ``VerletIntegrator``. After the position update, SHAKE corrects
+       the positions (and velocities) such that all bond lengths are restored.
+       After the second velocity update, RATTLE removes the velocity
+       components along the constrained bonds.
+
+       Andersen, H. C. J. Comput. Phys. 1983, 52, 24-34.
+
+       The constraints are divided in groups without common atoms, such that
+       all constraints in one group can be updated simultaneously. Iterating
+       over the groups is equivalent to the sequential updates in the original
+       SHAKE algorithm.
+    '''
+    def __init__(self, system, pairs=None, lengths=None, tol=1e-10, maxiter=1000):
+        '''
+           **Arguments:**
+
+           system
+                A System instance.
+
+           **Optional arguments:**
+
+           pairs
+                An array with shape (nconstraint, 2) with the atom indexes of
+                the constrained bonds. When not given, all bonds that involve
+                a hydrogen atom are constrained.
+
+           lengths
+                An array with the constrained bond lengths. When not given, the
+                bond lengths in the current geometry are used.
+
+           tol
+                The relative tolerance on the bond lengths and the velocity
+                constraints.
+
+           maxiter
+                The maximum number of SHAKE or RATTLE iterations.
+        '''
+        if pairs is None:
+            if system.bonds is None:
+                raise ValueError('Bonds must be defined in the system to constrain X-H bonds.')
+            mask = (system.numbers[system.bonds] == 1).any(axis=1)
+            pairs = system.bonds[mask]
+        self.pairs = np.array(pairs, dtype=int).reshape(-1, 2)
+        if len(self.pairs) == 0:
+            raise ValueError('At least one constraint is required.')
+        self.tol = tol
+        self.maxiter = maxiter
+        self.cell = system.cell
+        # Determine the periodic images of the constrained bonds once. Yaff
+        # does not wrap atoms back in the cell during MD, so the images do
+        # not change.
+        deltas = system.pos[self.pairs[:,0]] - system.pos[self.pairs[:,1]]
+        if self.cell.nvec > 0:
+            self.images = -np.round(np.dot(deltas, self.cell.gvecs.T))
+        else:
+            self.images = np.zeros((len(self.pairs), 0))
+        if lengths is None:
+            lengths = np.linalg.norm(self._get_deltas(system.pos), axis=1)
+        self.lengths = np.array(lengths, dtype=float)
+        if self.lengths.shape != (len(self.pairs),):
+            raise TypeError('The number of lengths must match the number of pairs.')
+        self.groups = self._get_groups()
+        # The virial tensor of the constraint forces in the last RATTLE step.
+        self.vtens = np.zeros((3, 3), float)
+        if log.do_medium:
+            with log.section('CONSTR'):
+                log('Number of bond constraints: %i' % len(self.pairs))
+                log('Number of independent groups: %i' % len(self.groups))
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def _get_groups(self):
+        '''Greedy partitioning of the constraints in groups without shared atoms'''
+        groups = []
+        used = []
+        for iconstraint, (i0, i1) in enumerate(self.pairs):
+            for group, atoms in zip(groups, used):
+                if i0 not in atoms and i1 not in atoms:
+                    break
+            else:
+                group = []
+                atoms = set()
+                groups.append(group)
+                used.append(atoms)
+            group.append(iconstraint)
+            atoms.update([i0, i1])
+        return [np.array(group) for group in groups]
+
+    def _get_deltas(self, pos, group=None):
+        '''Relative vectors of the constrained bonds, including periodic images'''
+        pairs = self.pairs if group is None else self.pairs[group]
+        images = self.images if group is None else self.images[group]
+        deltas = pos[pairs[:,0]] - pos[pairs[:,1]]
+        if self.cell.nvec > 0:
+            deltas += np.dot(images, self.cell.rvecs)
+        return deltas
+
+    def shake(self, pos, pos_old, vel, masses, timestep):
+        '''Restore the bond lengths after an unconstrained position update
+
+           **Arguments:**
+
+           pos
+                The new atomic positions, modified in-place.
+
+           pos_old
+                The atomic positions before the update, which satisfy the
+                constraints.
+
+           vel
+                The atomic velocities, modified in-place such that they are
+                consistent with the corrected positions.
+
+           masses
+                The atomic masses.
+
+           timestep
+                The time step of the position update.
+        '''
+        with timer.section('SHAKE'):
+            invmasses = 1.0/masses
+            pos_ref = pos.copy()
+            deltas_old = self._get_deltas(pos_old)
+            lengths_sq = self.lengths**2
+            for counter in range(self.maxiter):
+                converged = True
+                for group in self.groups:
+                    i0, i1 = self.pairs[group].T
+                    deltas = self._get_deltas(pos, group)
+                    diff = lengths_sq[group] - (deltas**2).sum(axis=1)
+                    if abs(diff).max() <= 2*self.tol*lengths_sq[group].max():
+                        continue
+                    converged = False
+                    dold = deltas_old[group]
+                    g = diff/(2*(deltas*dold).sum(axis=1)*(invmasses[i0] + invmasses[i1]))
+                    pos[i0] += (g*invmasses[i0]).reshape(-1,1)*dold
+                    pos[i1] -= (g*invmasses[i1]).reshape(-1,1)*dold
+                if converged:
+                    break
+            else:
+                raise RuntimeError('SHAKE did not converge in %i iterations.' % self.maxiter)
+            vel += (pos - pos_ref)/timestep
+
+    def rattle(self, pos, vel, masses, timestep):
+        '''Remove the velocity components along the constrained bonds
+
+           **Arguments:**
+
+           pos
+                The atomic positions, which satisfy the constraints.
+
+           vel
+                The atomic velocities, modified in-place.
+
+           masses
+                The atomic masses.
+
+           timestep
+                The time step of the last velocity update. This is used to
+                derive the constraint forces and their virial tensor, which is
+                stored in the ``vtens`` attribute.
+        '''
+        with timer.section('RATTLE'):
+            invmasses = 1.0/masses
+            deltas = self._get_deltas(pos)
+            lengths_sq = self.lengths**2
+            ks = np.zeros(len(self.pairs))
+            for counter in range(self.maxiter):
+                converged = True
+                for group in self.groups:
+                    i0, i1 = self.pairs[group].T
+                    d = deltas[group]
+                    proj = (d*(vel[i0] - vel[i1])).sum(axis=1)
+                    if abs(proj).max() <= self.tol*lengths_sq[group].max()/timestep:
+                        continue
+                    converged = False
+                    k = proj/(lengths_sq[group]*(invmasses[i0] + invmasses[i1]))
+                    vel[i0] -= (k*invmasses[i0]).reshape(-1,1)*d
+                    vel[i1] += (k*invmasses[i1]).reshape(-1,1)*d
+                    ks[group] += k
+                if converged:
+                    break
+            else:
+                raise RuntimeError('RATTLE did not converge in %i iterations.' % self.maxiter)
+            # The velocity correction corresponds to half a kick with the
+            # constraint forces.
+            self.vtens[:] = np.dot(deltas.T*(2*ks/timestep), deltas)
@@ -33,7 +33,11 @@ from yaff.log import timer
 from yaff.sampling.dof import CartesianDOF, StrainCellDOF
 
 
-__all__ = ['estimate_hessian', 'estimate_cart_hessian', 'estimate_elastic']
+__all__ = [
+    'estimate_hessian', 'estimate_cart_hessian', 'estimate_elastic',
+    'get_hessian_coloring', 'estimate_sparse_cart_hessian',
+    'get_hessian_operator', 'estimate_normal_modes',
+]
 
 
 def estimate_hessian(dof, eps=1e-4):
@@ -97,6 +101,329 @@ def estimate_cart_hessian(ff, eps=1e-4, select=None):
     return estimate_hessian(dof, eps)
 
 
+def _get_interaction_graph(ff, rcut=None, nbond=3):
+    """Return the sparsity pattern of the Cartesian Hessian as an atom graph.
+
+       **Arguments:**
+
+       ff
+            A force field object
+
+       **Optional arguments:**
+
+       rcut
+            Pairs closer than this distance are considered as coupled. When
+            not given, the cutoff of the neighbor list of the force field is
+            used (if any).
+
+       nbond
+            Atoms separated by at most this number of bonds are considered as
+            coupled. The default (3) covers all common valence terms.
+
+       **Returns:** a symmetric ``scipy.sparse.csr_matrix`` with boolean
+       entries, including the diagonal.
+    """
+    import scipy.sparse
+    system = ff.system
+    rows = [np.arange(system.natom)]
+    cols = [np.arange(system.natom)]
+    # Bonded couplings
+    if system.bonds is not None and nbond > 0:
+        for depth in range(1, min(nbond, 4)+1):
+            neighs = getattr(system, 'neighs%i' % depth)
+            for i0, others in neighs.items():
+                if len(others) > 0:
+                    rows.append(np.repeat(i0, len(others)))
+                    cols.append(np.array(sorted(others)))
+    # Non-bonding couplings
+    if rcut is None and ff.nlist is not None:
+        rcut = ff.nlist.rcut
+    if rcut is not None and rcut > 0:
+        if ff.nlist is not None:
+            ff.nlist.update()
+            neighs = ff.nlist.neighs[:ff.nlist.nneigh]
+            mask = neighs['d'] <= rcut
+            rows.append(neighs['a'][mask])
+            cols.append(neighs['b'][mask])
+        else:
+            for i0 in range(system.natom):
+                deltas = system.pos - system.pos[i0]
+                system.cell.mic(deltas)
+                others = (np.linalg.norm(deltas, axis=1) <= rcut).nonzero()[0]
+                rows.append(np.repeat(i0, len(others)))
+                cols.append(others)
+    rows = np.concatenate(rows).astype(int)
+    cols = np.concatenate(cols).astype(int)
+    graph = scipy.sparse.csr_matrix(
+        (np.ones(len(rows), bool), (rows, cols)),
+        shape=(system.natom, system.natom)
+    )
+    return (graph + graph.T).tocsr()
+
+
+def get_hessian_coloring(graph):
+    """Greedy distance-2 coloring of an interaction graph.
+
+       **Arguments:**
+
+       graph
+            A symmetric sparse boolean matrix with the couplings between
+            atoms, including the diagonal.
+
+       **Returns:** an integer array with a color for each atom. Two atoms
+       with the same color never couple to a common atom, such that they can
+       be displaced simultaneously in a finite difference Hessian.
+    """
+    graph = graph.tocsr().astype(int)
+    conflicts = (graph*graph).tocsr()
+    natom = graph.shape[0]
+    colors = np.zeros(natom, int) - 1
+    # Atoms with many conflicts are colored first (Welsh-Powell order).
+    degrees = np.diff(conflicts.indptr)
+    for i in np.argsort(-degrees, kind='mergesort'):
+        others = conflicts.indices[conflicts.indptr[i]:conflicts.indptr[i+1]]
+        used = colors[others]
+        used = used[used >= 0]
+        taken = np.zeros(len(used)+1, bool)
+        taken[used[used <= len(used)]] = True
+        colors[i] = taken.argmin()
+    return colors
+
+
+def estimate_sparse_cart_hessian(ff, eps=1e-4, rcut=None, nbond=3):
+    """Estimate a sparse Cartesian Hessian with simultaneous displacements.
+
+       **Arguments:**
+
+       ff
+            A force field object
+
+       **Optional arguments:**
+
+       eps
+            The magnitude of the Cartesian displacements
+
+       rcut
+            Atoms closer than this distance are assumed to couple. When not
+            given, the cutoff of the neighbor list of the force field is used.
+
+       nbond
+            Atoms separated by at most this number of bonds are assumed to
+            couple.
+
+       The atoms are colored such that no two atoms of the same color couple
+       to a common atom. All atoms of one color are then displaced together,
+       such that the number of gradient computations is ``6*ncolor`` instead
+       of ``6*natom``. The result is only correct for force fields without
+       couplings beyond ``rcut`` or ``nbond`` bonds, e.g. it is not suitable
+       for the reciprocal part of an Ewald summation.
+
+       **Returns:** a symmetric ``scipy.sparse.csr_matrix`` of shape
+       ``(3*natom, 3*natom)``.
+    """
+    import scipy.sparse
+    with log.section('HESS'), timer.section('Hessian'):
+        system = ff.system
+        natom = system.natom
+        graph = _get_interaction_graph(ff, rcut, nbond)
+        colors = get_hessian_coloring(graph)
+        ncolor = colors.max()+1
+        if log.do_medium:
+            log('Displacing %i atoms with %i colors (%i gradients)' % (natom, ncolor, 6*ncolor))
+            log('The following displacements are computed:')
+            log('Color   Dir Energy')
+            log.hline()
+        pos0 = system.pos.copy()
+        gpos = np.zeros((natom, 3), float)
+        rows = []
+        cols = []
+        data = []
+        for color in range(ncolor):
+            atoms = (colors == color).nonzero()[0]
+            # For each displaced atom, the atoms whose gradient is affected.
+            sub = graph[atoms].tocoo()
+            for alpha in range(3):
+                diff = 0.0
+                for sign, label in (1, 'pos'), (-1, 'neg'):
+                    pos1 = pos0.copy()
+                    pos1[atoms, alpha] += sign*eps
+                    ff.update_pos(pos1)
+                    gpos[:] = 0.0
+                    epot = ff.compute(gpos)
+                    if log.do_medium:
+                        log('% 7i %s %s' % (color, label, log.energy(epot)))
+                    diff = diff + sign*gpos
+                diff /= 2*eps
+                # the row (affected atom) and column (displaced atom) indexes
+                for beta in range(3):
+                    rows.append(3*sub.col + beta)
+                    cols.append(3*atoms[sub.row] + alpha)
+                    data.append(diff[sub.col, beta])
+        ff.update_pos(pos0)
+        if log.do_medium:
+            log.hline()
+        hessian = scipy.sparse.csr_matrix(
+            (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(3*natom, 3*natom)
+        )
+        # Enforce symmetry and return
+        return (0.5*(hessian + hessian.T)).tocsr()
+
+
+def get_hessian_operator(ff, eps=1e-4, mass_weighted=False):
+    """Return the Cartesian Hessian as a matrix-free linear operator.
+
+       **Arguments:**
+
+       ff
+            A force field object
+
+       **Optional arguments:**
+
+       eps
+            The magnitude of the Cartesian displacements along the trial
+            vector.
+
+       mass_weighted
+            When True, the operator represents M^(-1/2) H M^(-1/2), where M
+            contains the atomic masses. When the system has no masses, the
+            standard masses of the elements are used.
+
+       Each Hessian-vector product is computed with a symmetric finite
+       difference of the gradient along the trial vector, i.e. with two calls
+       to ``ff.compute``. The Hessian itself is never constructed. Each
+       product is evaluated at the current positions of ``ff``, which are
+       restored afterwards.
+
+       **Returns:** a ``scipy.sparse.linalg.LinearOperator``.
+    """
+    from scipy.sparse.linalg import LinearOperator
+    system = ff.system
+    size = 3*system.natom
+    if mass_weighted:
+        masses = system.masses
+        if masses is None:
+            from molmod.periodic import periodic
+            masses = np.array([periodic[number].mass for number in system.numbers])
+        scale = 1.0/np.sqrt(np.repeat(masses, 3))
+    else:
+        scale = np.ones(size)
+    gpos = np.zeros((system.natom, 3), float)
+
+    def matvec(x):
+        x = np.asarray(x).ravel()*scale
+        norm = np.linalg.norm(x)
+        if norm == 0:
+            return np.zeros(size)
+        step = eps/norm
+        pos0 = system.pos.copy()
+        grads = []
+        for sign in 1, -1:
+            ff.update_pos(pos0 + (sign*step)*x.reshape(-1, 3))
+            gpos[:] = 0.0
+            ff.compute(gpos)
+            grads.append(gpos.ravel().copy())
+        ff.update_pos(pos0)
+        return (grads[0] - grads[1])/(2*step)*scale
+
+    return LinearOperator((size, size), matvec=matvec, dtype=float)
+
+
+def _solve_shifted(op, b, shift, tol):
+    """Solve (op - shift) x = b with MINRES."""
+    from scipy.sparse.linalg import minres
+    try:
+        x, info = minres(op, b, shift=shift, rtol=tol)
+    except TypeError:
+        # Older versions of SciPy
+        x, info = minres(op, b, shift=shift, tol=tol)
+    return x
+
+
+def estimate_normal_modes(ff, nmode=10, eps=1e-4, target=None, tol=1e-8, inner_tol=1e-10, maxiter=None):
+    """Compute a few mass-weighted normal modes with the Lanczos method.
+
+       **Arguments:**
+
+       ff
+            A force field object
+
+       **Optional arguments:**
+
+       nmode
+            The number of normal modes to compute.
+
+       eps
+            The magnitude of the displacements in the Hessian-vector products.
+            (See ``get_hessian_operator``.)
+
+       target
+            When not given, the modes with the lowest eigenvalues are computed.
+            Otherwise, the modes with eigenvalues closest to target are
+            computed in shift-invert mode. The linear systems are solved
+            iteratively with MINRES, such that still only Hessian-vector
+            products are needed. Note that the eigenvalues are the squares of
+            the angular frequencies.
+
+       tol
+            Relative convergence threshold of the eigensolver.
+
+       inner_tol
+            Relative convergence threshold of the MINRES solver, only used
+            when target is given.
+
+       maxiter
+            Maximum number of Lanczos iterations.
+
+       This routine only needs Hessian-vector products and is therefore
+       suitable for systems that are too large for ``estimate_cart_hessian``
+       followed by a dense diagonalization.
+
+       **Returns:** ``evals, evecs``: the eigenvalues of the mass-weighted
+       Hessian in increasing order and the corresponding eigenvectors as
+       columns of an array with shape (3*natom, nmode).
+    """
+    from scipy.sparse.linalg import LinearOperator, eigsh
+    with log.section('NMA'), timer.section('Normal modes'):
+        hessian = get_hessian_operator(ff, eps, mass_weighted=True)
+        size = hessian.shape[0]
+        if nmode >= size:
+            raise ValueError('The number of modes must be lower than the number of Cartesian coordinates.')
+        counter = [0]
+        def matvec(x):
+            counter[0] += 1
+            return hessian.matvec(x)
+        op = LinearOperator((size, size), matvec=matvec, dtype=float)
+        if target is None:
+            # ARPACK uses a convergence criterion relative to the eigenvalue,
+            # which is problematic for the (nearly) zero eigenvalues of the
+            # external degrees of freedom. Therefore, the lowest eigenvalues
+            # are computed as the highest eigenvalues of shift - H, with shift
+            # an upper bound for the spectrum of H.
+            shift = 1.1*eigsh(op, 1, which='LA', tol=1e-2)[0][0]
+            flipped = LinearOperator((size, size), matvec=lambda x: shift*x - matvec(x), dtype=float)
+            evals, evecs = eigsh(flipped, nmode, which='LA', tol=tol, maxiter=maxiter)
+            evals = shift - evals
+        else:
+            opinv = LinearOperator(
+                (size, size), matvec=lambda b: _solve_shifted(op, b, target, inner_tol),
+                dtype=float
+            )
+            evals, evecs = eigsh(op, nmode, sigma=target, OPinv=opinv, which='LM', tol=tol, maxiter=maxiter)
+        order = evals.argsort()
+        evals = evals[order]
+        evecs = evecs[:,order]
+        if log.do_medium:
+            log('Computed %i modes with %i Hessian-vector products.' % (nmode, counter[0]))
+            log.hline()
+            log('Mode     Eigenvalue')
+            log.hline()
+            for i, evalue in enumerate(evals):
+                log('% 7i % 15.8e' % (i, evalue))
+            log.hline()
+        return evals, evecs
+
+
 def estimate_elastic(ff, eps=1e-4, do_frozen=False, ridge=1e-4):
     """Estimate the elastic constants using the symmetric finite difference
        approximation.
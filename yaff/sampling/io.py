@@ -26,16 +26,70 @@
 
 from __future__ import division
 
+import threading
+import time
+
+import numpy as np
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from yaff.log import timer
+
 from yaff.sampling.iterative import Hook, AttributeStateItem, PosStateItem, CellStateItem, ConsErrStateItem
 from yaff.sampling.nvt import NHCThermostat, NHCAttributeStateItem
 from yaff.sampling.npt import MTKBarostat, MTKAttributeStateItem, TBCombination
 
 
-__all__ = ['HDF5Writer', 'XYZWriter', 'RestartWriter']
+__all__ = ['StoragePolicy', 'HDF5Writer', 'XYZWriter', 'RestartWriter']
+
+
+class StoragePolicy(object):
+    '''Describes how a state item is stored in a trajectory file'''
+    def __init__(self, dtype=None, scale=None, shuffle=False, compression=None,
+                 compression_opts=None, chunk_rows=None):
+        """
+           **Optional arguments:**
+
+           dtype
+                The data type of the dataset, e.g. ``np.float32`` to store
+                positions in single precision. When not given, the data type
+                of the state item is used.
+
+           scale
+                When given, the data are quantized, i.e. they are divided by
+                ``scale``, rounded and stored with an integer ``dtype``. The
+                scale is stored as an attribute of the dataset, such that
+                :func:`yaff.analysis.utils.get_dataset` can convert the data
+                back to floating point numbers.
+
+           shuffle
+                When True, the shuffle filter is applied before compression.
+                This improves the compression ratio of numerical data.
+
+           compression, compression_opts
+                Compression filter and options, see
+                ``h5py.Group.create_dataset``, e.g. ``'gzip'`` or ``'lzf'``.
+
+           chunk_rows
+                The number of frames in one chunk. When not given, chunks
+                of about 64 KiB are used.
+        """
+        if scale is not None and (dtype is None or np.dtype(dtype).kind not in 'iu'):
+            raise TypeError('Quantized data must be stored with an integer dtype.')
+        self.dtype = dtype
+        self.scale = scale
+        self.shuffle = shuffle
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.chunk_rows = chunk_rows
 
 
 class HDF5Writer(Hook):
-    def __init__(self, f, start=0, step=1):
+    def __init__(self, f, start=0, step=1, buffer_size=1, flush_interval=None,
+                 compression=None, compression_opts=None, asynchronous=False,
+                 nblock=2, policies=None):
         """
            **Argument:**
 
@@ -49,47 +103,272 @@ class HDF5Writer(Hook):
 
            step
                 The hook will be called every `step` iterations.
+
+           buffer_size
+                The number of frames that is kept in memory before they are
+                written to the file in one block. The buffer is also written
+                at the end of ``Iterative.run``, but not when the iterative
+                algorithm is driven without ``run`` or when the process is
+                killed. By default, every frame is written immediately.
+
+           flush_interval
+                When given, the buffer is written to the file (and the file
+                is flushed) if the last write is more than ``flush_interval``
+                seconds ago. This limits the amount of data that is lost when
+                the simulation crashes.
+
+           compression, compression_opts
+                Compression filter and options for the trajectory datasets,
+                see ``h5py.Group.create_dataset``, e.g. ``'gzip'`` or
+                ``'lzf'``.
+
+           asynchronous
+                When True, the blocks of frames are written by a background
+                thread, such that the iterative algorithm can continue while
+                the data are written. The file should not be accessed by
+                other code until the end of ``Iterative.run``.
+
+           nblock
+                The number of blocks (each with ``buffer_size`` frames) in the
+                ring buffer of the asynchronous mode. When all other blocks
+                are waiting to be written, the iterative algorithm is blocked
+                until the background thread has written one of them.
+
+           policies
+                A dictionary with a StoragePolicy instance for some of the
+                state items, e.g. to store positions in single precision. The
+                compression arguments of this writer are used for the other
+                state items.
         """
+        if buffer_size < 1:
+            raise ValueError('The buffer size must be at least one.')
+        if nblock < 2:
+            raise ValueError('The number of blocks must be at least two.')
         self.f = f
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.asynchronous = asynchronous
+        self.nblock = nblock
+        if policies is None:
+            policies = {}
+        self.policies = policies
+        self._buffers = None
+        self._nbuffer = 0
+        self._partial = None
+        self._row = None
+        self._last_flush = None
+        self._thread = None
+        self._error = None
         Hook.__init__(self, start, step)
 
+    def get_state(self, iterative):
+        '''Return the dictionary with the state items that are written'''
+        return iterative.state
+
+    def get_state_keys(self, iterative):
+        # All state items are needed to initialize the trajectory group.
+        # Afterwards, only the items with a corresponding dataset are written.
+        if 'trajectory' not in self.f:
+            return None
+        tgrp = self.f['trajectory']
+        return [key for key in iterative.state if key in tgrp]
+
     def __call__(self, iterative):
+        state = self.get_state(iterative)
         if 'system' not in self.f:
             self.dump_system(iterative.ff.system)
         if 'trajectory' not in self.f:
             self.init_trajectory(iterative)
+        if self._buffers is None:
+            self.init_buffers(iterative)
+        # Items without a value are skipped. Such an incomplete frame is
+        # kept in the next slot of the buffer until it is replaced by the
+        # next frame, as if its row is reused.
+        keys = [key for key in self._buffers if state[key].value is not None]
+        for key in keys:
+            self._buffers[key][self._nbuffer] = state[key].value
+        if len(keys) == len(self._buffers):
+            self._nbuffer += 1
+            self._partial = None
+        else:
+            self._partial = keys
+        if self._nbuffer + (self._partial is not None) == self.buffer_size:
+            self.flush()
+        elif self.flush_interval is not None and time.time() - self._last_flush > self.flush_interval:
+            self.flush()
+
+    def finalize(self, iterative):
+        self.flush()
+        if self._thread is not None:
+            # Wait until all blocks are written and stop the thread.
+            with timer.section('HDF5 wait'):
+                self._pending.put(None)
+                self._thread.join()
+            self._thread = None
+            self._check_error()
+
+    def init_buffers(self, iterative):
         tgrp = self.f['trajectory']
-        # determine the row to write the current iteration to. If a previous
+        self._buffers = {}
+        self._scales = {}
+        for key in self.get_state(iterative):
+            if key in tgrp:
+                ds = tgrp[key]
+                if 'scale' in ds.attrs:
+                    # Quantized data are converted when the block is written.
+                    self._scales[key] = ds.attrs['scale']
+                    self._buffers[key] = np.zeros((self.buffer_size,) + ds.shape[1:], float)
+                else:
+                    self._buffers[key] = np.zeros((self.buffer_size,) + ds.shape[1:], ds.dtype)
+        # determine the row to write the first frame to. If a previous
         # iterations was not completely written, then the last row is reused.
-        row = min(tgrp[key].shape[0] for key in iterative.state if key in tgrp.keys())
-        for key, item in iterative.state.items():
-            if item.value is None:
-                continue
-            if len(item.shape) > 0 and min(item.shape) == 0:
-                continue
+        self._row = min(tgrp[key].shape[0] for key in self._buffers)
+        self._last_flush = time.time()
+        if self.asynchronous:
+            # The ring buffer: the blocks that are neither being filled nor
+            # waiting to be written are kept in the queue of free blocks.
+            self._free = queue.Queue()
+            for iblock in range(self.nblock - 1):
+                self._free.put(dict((key, buf.copy()) for key, buf in self._buffers.items()))
+            self._pending = queue.Queue()
+
+    def flush(self):
+        '''Write the buffered frames to the file
+
+           In the asynchronous mode, the frames are passed to the background
+           thread and this method only waits when no free block is available.
+        '''
+        if self._nbuffer > 0 or self._partial is not None:
+            if self.asynchronous:
+                self._check_error()
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._write_loop)
+                    self._thread.daemon = True
+                    self._thread.start()
+                self._pending.put((self._buffers, self._nbuffer, self._row, self._partial))
+                with timer.section('HDF5 wait'):
+                    self._buffers = self._free.get()
+            else:
+                self._write_block(self._buffers, self._nbuffer, self._row, self._partial)
+            # The row of an incomplete frame is reused by the next frame.
+            self._row += self._nbuffer
+            self._nbuffer = 0
+            self._partial = None
+        self._last_flush = time.time()
+
+    def _write_block(self, buffers, nrow, row, partial=None):
+        '''Write a block of frames, starting at the given row
+
+           The slot after the last complete frame is also written for the
+           keys in ``partial``, which is a list of keys with a value in an
+           incomplete frame, or None.
+        '''
+        tgrp = self.f['trajectory']
+        # All data are checked before anything is written, such that a
+        # failure does not leave datasets with different lengths.
+        blocks = []
+        for key, buf in buffers.items():
             ds = tgrp[key]
-            if ds.shape[0] <= row:
-                # do not over-allocate. hdf5 works with chunks internally.
-                ds.resize(row+1, axis=0)
-            ds[row] = item.value
+            end = row + nrow
+            if partial is not None and key in partial:
+                end += 1
+            if end == row:
+                continue
+            data = buf[:end-row]
+            scale = self._scales.get(key)
+            if scale is not None:
+                data = np.round(data/scale)
+                info = np.iinfo(ds.dtype)
+                if data.min() < info.min or data.max() > info.max:
+                    raise ValueError('The data for %s do not fit in the quantized dataset.' % key)
+            blocks.append((ds, data, end))
+        for ds, data, end in blocks:
+            if ds.shape[0] != end:
+                ds.resize(end, axis=0)
+            ds[row:end] = data
+        self.f.flush()
+
+    def _write_loop(self):
+        '''Write blocks from the pending queue until None is received'''
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+            buffers, nrow, row, partial = item
+            if self._error is None:
+                try:
+                    self._write_block(buffers, nrow, row, partial)
+                except Exception as e:
+                    self._error = e
+            self._free.put(buffers)
+
+    def _check_error(self):
+        '''Raise an exception of the background thread in the main thread'''
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise error
 
     def dump_system(self, system):
         system.to_hdf5(self.f)
 
     def init_trajectory(self, iterative):
         tgrp = self.f.create_group('trajectory')
-        for key, item in iterative.state.items():
+        for key, item in self.get_state(iterative).items():
             if len(item.shape) > 0 and min(item.shape) == 0:
                 continue
             if item.value is None:
                 continue
             maxshape = (None,) + item.shape
             shape = (0,) + item.shape
-            dset = tgrp.create_dataset(key, shape, maxshape=maxshape, dtype=item.dtype)
+            policy = self.policies.get(key)
+            if policy is None:
+                policy = StoragePolicy(compression=self.compression, compression_opts=self.compression_opts)
+            dtype = item.dtype if policy.dtype is None else policy.dtype
+            dset = tgrp.create_dataset(
+                key, shape, maxshape=maxshape, dtype=dtype,
+                chunks=get_chunks(item.shape, dtype, policy.chunk_rows),
+                shuffle=policy.shuffle,
+                compression=policy.compression,
+                compression_opts=policy.compression_opts,
+            )
+            if policy.scale is not None:
+                dset.attrs['scale'] = policy.scale
             for name, value in item.iter_attrs(iterative):
                tgrp.attrs[name] = value
 
 
+def get_chunks(shape, dtype, nrow=None, chunk_size=65536, max_rows=1024):
+    """Return the chunk shape for a trajectory dataset
+
+       **Arguments:**
+
+       shape
+            The shape of a single frame.
+
+       dtype
+            The data type of the dataset.
+
+       **Optional arguments:**
+
+       nrow
+            The number of frames in one chunk. When not given, it is derived
+            from ``chunk_size`` and ``max_rows``.
+
+       chunk_size
+            The targeted size of a chunk in bytes.
+
+       max_rows
+            The maximum number of frames in one chunk.
+    """
+    if nrow is None:
+        frame_size = np.dtype(dtype).itemsize*int(np.prod(shape))
+        nrow = max(1, min(max_rows, chunk_size//max(frame_size, 1)))
+    return (nrow,) + tuple(shape)
+
+
 class XYZWriter(Hook):
     def __init__(self, fn_xyz, select=None, start=0, step=1):
         """
@@ -115,6 +394,9 @@ class XYZWriter(Hook):
         self.xyz_writer = None
         Hook.__init__(self, start, step)
 
+    def get_state_keys(self, iterative):
+        return []
+
     def __call__(self, iterative):
         from molmod import angstrom
         if self.xyz_writer is None:
@@ -136,8 +418,9 @@ class XYZWriter(Hook):
         self.xyz_writer.dump(title, pos)
 
 
-class RestartWriter(Hook):
-    def __init__(self, f, start=0, step=1000):
+class RestartWriter(HDF5Writer):
+    def __init__(self, f, start=0, step=1000, buffer_size=1, flush_interval=None,
+                 asynchronous=False):
         """
             **Argument:**
 
@@ -151,11 +434,24 @@ class RestartWriter(Hook):
 
             step
                 The hook will be called every `step` iterations.
+
+            buffer_size, flush_interval, asynchronous
+                See :class:`HDF5Writer`. By default, each restart point is
+                written immediately.
         """
-        self.f = f
         self.state = None
         self.default_state = None
-        Hook.__init__(self, start, step)
+        HDF5Writer.__init__(
+            self, f, start, step, buffer_size, flush_interval,
+            asynchronous=asynchronous
+        )
+
+    def get_state(self, iterative):
+        return self.state
+
+    def get_state_keys(self, iterative):
+        # The restart state items are managed by the hook itself.
+        return []
 
     def init_state(self, iterative):
         # Basic properties needed for the restart
@@ -205,45 +501,6 @@ class RestartWriter(Hook):
         self.state_list = [state_item.copy() for state_item in self.default_state]
         self.state = dict((item.key, item) for item in self.state_list)
 
-
-    def __call__(self, iterative):
-        if 'system' not in self.f:
-            self.dump_system(iterative.ff.system)
-        if 'trajectory' not in self.f:
-            self.init_trajectory(iterative)
-        tgrp = self.f['trajectory']
-        # determine the row to write the current iteration to. If a previous
-        # iterations was not completely written, then the last row is reused.
-        row = min(tgrp[key].shape[0] for key in self.state if key in tgrp.keys())
-        for key, item in self.state.items():
-            if item.value is None:
-                continue
-            if len(item.shape) > 0 and min(item.shape) == 0:
-                continue
-            if item.value is None:
-                continue
-            ds = tgrp[key]
-            if ds.shape[0] <= row:
-                # do not over-allocate. hdf5 works with chunks internally.
-                ds.resize(row+1, axis=0)
-            ds[row] = item.value
-
-    def dump_system(self, system):
-        system.to_hdf5(self.f)
-
-    def init_trajectory(self, iterative):
-        tgrp = self.f.create_group('trajectory')
-        for key, item in self.state.items():
-            if len(item.shape) > 0 and min(item.shape) == 0:
-                continue
-            if item.value is None:
-                continue
-            maxshape = (None,) + item.shape
-            shape = (0,) + item.shape
-            dset = tgrp.create_dataset(key, shape, maxshape=maxshape, dtype=item.dtype)
-            for name, value in item.iter_attrs(iterative):
-               tgrp.attrs[name] = value
-
     def dump_restart(self, hook):
         rgrp = self.f['/restart']
         if hook.method == 'thermostat':
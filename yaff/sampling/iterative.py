@@ -105,30 +105,46 @@ class Iterative(object):
 
     def call_hooks(self):
         with timer.section('%s hooks' % self.log_name):
-            state_updated = False
+            # Only the state items needed by the hooks that are called in this
+            # iteration are updated, each of them at most once.
+            updated = set()
             from yaff.sampling.io import RestartWriter
             for hook in self.hooks:
                 if hook.expects_call(self.counter) and not (isinstance(hook, RestartWriter) and self.counter==self.counter0):
-                    if not state_updated:
-                        for item in self.state_list:
-                            item.update(self)
-                        state_updated = True
+                    keys = hook.get_state_keys(self)
+                    if keys is None:
+                        keys = [item.key for item in self.state_list]
+                    for key in keys:
+                        if key not in updated and key in self.state:
+                            self.state[key].update(self)
+                            updated.add(key)
                     if isinstance(hook, RestartWriter):
                         for item in hook.state_list:
                             item.update(self)
                     hook(self)
 
+    def finalize_hooks(self):
+        """Give all hooks the opportunity to complete pending work, e.g.
+           writing buffered data to a file.
+        """
+        with timer.section('%s hooks' % self.log_name):
+            for hook in self.hooks:
+                hook.finalize(self)
+
     def run(self, nstep=None):
         with log.section(self.log_name), timer.section(self.log_name):
-            if nstep is None:
-                while True:
-                    if self.propagate():
-                        break
-            else:
-                for i in range(nstep):
-                    if self.propagate():
-                        break
-            self.finalize()
+            try:
+                if nstep is None:
+                    while True:
+                        if self.propagate():
+                            break
+                else:
+                    for i in range(nstep):
+                        if self.propagate():
+                            break
+                self.finalize()
+            finally:
+                self.finalize_hooks()
 
     def propagate(self):
         self.counter += 1
@@ -270,41 +286,105 @@ class EPotContribStateItem(StateItem):
         yield 'epot_contrib_names', np.array([part.name for part in iterative.ff.parts], dtype='S')
 
 
-class EpotBondsStateItem(StateItem):
-    """Keeps track of all the Valence Bond contributions to the potential energy."""
-    def __init__(self, do_ei=False):
+class EpotValenceStateItem(StateItem):
+    """Base class for the valence energy of a subset of internal coordinates.
+
+       The energies are summed per kind of internal coordinate by the valence
+       list (see ``ValenceList.kind_energies``), such that the value of this
+       state item does not depend on the number of valence terms.
+    """
+    # The kinds of internal coordinates that are included.
+    ic_kinds = None
+    # The number of relative vectors between the two atoms of the
+    # electrostatic interaction.
+    nvec = None
+
+    def __init__(self, key, do_ei=False):
         """
+           **Arguments:**
+
+           key
+                The key of the state item.
+
            **Optional arguments:**
 
            do_ei
-                If True, the electrostatic contributions of the bonded atom pair
-                will also be tracked.
+                If True, the electrostatic interactions between the outer
+                atoms of the internal coordinates will also be tracked.
         """
         self.do_ei = do_ei
-        StateItem.__init__(self, 'epot_bonds')
+        self._ei_tables = {}
+        StateItem.__init__(self, key)
+
+    def copy(self):
+        return self.__class__(self.do_ei)
+
+    def _get_ei_table(self, part, charges):
+        """Return the relative vectors and charge products of all terms
+
+           The table only depends on the topology, so it is computed once for
+           each valence part.
+        """
+        table = self._ei_tables.get(id(part))
+        if table is None or table[0] != part.vlist.nv:
+            vtab = part.vlist.vtab[:part.vlist.nv]
+            ictab = part.vlist.iclist.ictab
+            deltas = part.vlist.iclist.dlist.deltas
+            ics = ictab[vtab['ic0'][vtab['kind'] != 3]]
+            ics = ics[np.in1d(ics['kind'], self.ic_kinds)]
+            rows = np.array([ics['i%i' % ivec] for ivec in range(self.nvec)])
+            signs = np.array([ics['sign%i' % ivec] for ivec in range(self.nvec)], float)
+            first = deltas[rows[0]]
+            last = deltas[rows[-1]]
+            if self.nvec == 1:
+                iatom0, iatom1 = first['i'], first['j']
+            else:
+                # The outer atoms are the end points of the first and the last
+                # relative vector.
+                iatom0 = np.where(signs[0] > 0, first['j'], first['i'])
+                iatom1 = np.where(signs[-1] > 0, last['j'], last['i'])
+            # Signs to combine the relative vectors into the vector between
+            # the outer atoms.
+            signs[1:] *= -1
+            table = (part.vlist.nv, rows, signs, charges[iatom0]*charges[iatom1])
+            self._ei_tables[id(part)] = table
+        return table
 
     def get_value(self, iterative):
         val = 0.0
         ei = 0.0
         for part in iterative.ff.parts:
             if isinstance(part, ForcePartValence):
-                vtab = part.vlist.vtab
-                ictab = part.vlist.iclist.ictab
-                dtab = part.vlist.iclist.dlist.deltas
-        for term in vtab:
-            if term['kind']!=3 and ictab[term['ic0']]['kind']==0:
-                val += term['energy']
+                val += part.vlist.kind_energies[self.ic_kinds].sum()
                 if self.do_ei:
-                    ic = ictab[term['ic0']]
-                    qi = iterative.ff.system.charges[dtab[ic['i0']]['i']]
-                    qj = iterative.ff.system.charges[dtab[ic['i0']]['j']]
-                    d  = ic['value']
-                    ei += qi*qj/d
+                    nv, rows, signs, qq = self._get_ei_table(part, iterative.ff.system.charges)
+                    deltas = part.vlist.iclist.dlist.deltas
+                    vecs = 0.0
+                    for row, sign in zip(rows, signs):
+                        d = deltas[row]
+                        vecs += sign.reshape(-1,1)*np.array([d['dx'], d['dy'], d['dz']]).T
+                    ei += (qq/np.sqrt((vecs**2).sum(axis=1))).sum()
         if self.do_ei:
             return np.array([val, val+ei])
         else:
             return val
 
+
+class EpotBondsStateItem(EpotValenceStateItem):
+    """Keeps track of all the Valence Bond contributions to the potential energy."""
+    ic_kinds = [0]
+    nvec = 1
+
+    def __init__(self, do_ei=False):
+        """
+           **Optional arguments:**
+
+           do_ei
+                If True, the electrostatic contributions of the bonded atom pair
+                will also be tracked.
+        """
+        EpotValenceStateItem.__init__(self, 'epot_bonds', do_ei)
+
     def iter_atts(self, iterative):
         if self.do_ei:
             yield 'epot_bonds_names', tuple('val', 'val+ei')
@@ -312,8 +392,11 @@ class EpotBondsStateItem(StateItem):
             yield []
 
 
-class EpotBendsStateItem(StateItem):
+class EpotBendsStateItem(EpotValenceStateItem):
     """Keeps track of all the Valence Bend contributions to the potential energy"""
+    ic_kinds = [1, 2]
+    nvec = 2
+
     def __init__(self, do_ei=False):
         """
            **Optional arguments:**
@@ -322,36 +405,7 @@ class EpotBendsStateItem(StateItem):
                 If True, the electrostatic contributions of the 1-3 non-bonded
                 atom pair will also be tracked.
         """
-        self.do_ei = do_ei
-        StateItem.__init__(self, 'epot_bends')
-
-    def get_value(self, iterative):
-        val = 0.0
-        ei = 0.0
-        for part in iterative.ff.parts:
-            if isinstance(part, ForcePartValence):
-                vtab = part.vlist.vtab
-                ictab = part.vlist.iclist.ictab
-                dtab = part.vlist.iclist.dlist.deltas
-        for term in vtab:
-            if term['kind']!=3 and ictab[term['ic0']]['kind'] in [1,2]:
-                val += term['energy']
-                if self.do_ei:
-                    ic = ictab[term['ic0']]
-                    d0 = dtab[ic['i0']]
-                    d1 = dtab[ic['i1']]
-                    rji = np.array([d0['dx'], d0['dy'], d0['dz']])*ic['sign0']
-                    rjk = np.array([d1['dx'], d1['dy'], d1['dz']])*ic['sign1']
-                    ji = np.array([d0['i'], d0['j']])[::ic['sign0']]
-                    jk = np.array([d1['i'], d1['j']])[::ic['sign1']]
-                    qi = iterative.ff.system.charges[ji[1]]
-                    qk = iterative.ff.system.charges[jk[1]]
-                    d  = np.linalg.norm(rji-rjk)
-                    ei += qi*qk/d
-        if self.do_ei:
-            return np.array([val, val+ei])
-        else:
-            return val
+        EpotValenceStateItem.__init__(self, 'epot_bends', do_ei)
 
     def iter_atts(self, iterative):
         if self.do_ei:
@@ -360,8 +414,11 @@ class EpotBendsStateItem(StateItem):
             yield []
 
 
-class EpotDihedsStateItem(StateItem):
+class EpotDihedsStateItem(EpotValenceStateItem):
     """Keeps track of all the Valence Dihedral contributions to the potential energy"""
+    ic_kinds = [3, 4]
+    nvec = 3
+
     def __init__(self, do_ei=False):
         """
            **Optional arguments:**
@@ -370,39 +427,7 @@ class EpotDihedsStateItem(StateItem):
                 If True, the electrostatic contributions of the 1-4 non-bonded
                 atom pair will also be tracked.
         """
-        self.do_ei = do_ei
-        StateItem.__init__(self, 'epot_diheds')
-
-    def get_value(self, iterative):
-        val = 0.0
-        ei = 0.0
-        for part in iterative.ff.parts:
-            if isinstance(part, ForcePartValence):
-                vtab = part.vlist.vtab
-                ictab = part.vlist.iclist.ictab
-                dtab = part.vlist.iclist.dlist.deltas
-        for term in vtab:
-            if term['kind']!=3 and ictab[term['ic0']]['kind'] in [3,4]:
-                val += term['energy']
-                if self.do_ei:
-                    ic = ictab[term['ic0']]
-                    d0 = dtab[ic['i0']]
-                    d1 = dtab[ic['i1']]
-                    d2 = dtab[ic['i2']]
-                    rji = np.array([d0['dx'], d0['dy'], d0['dz']])*ic['sign0']
-                    rjk = np.array([d1['dx'], d1['dy'], d1['dz']])*ic['sign1']
-                    rkl = np.array([d2['dx'], d2['dy'], d2['dz']])*ic['sign2']
-                    ji = np.array([d0['i'], d0['j']])[::ic['sign0']]
-                    jk = np.array([d1['i'], d1['j']])[::ic['sign1']]
-                    kl = np.array([d2['i'], d2['j']])[::ic['sign2']]
-                    qi = iterative.ff.system.charges[ji[1]]
-                    ql = iterative.ff.system.charges[kl[1]]
-                    d  = np.linalg.norm(rji-rjk-rkl)
-                    ei += qi*ql/d
-        if self.do_ei:
-            return np.array([val, val+ei])
-        else:
-            return val
+        EpotValenceStateItem.__init__(self, 'epot_diheds', do_ei)
 
     def iter_atts(self, iterative):
         if self.do_ei:
@@ -431,5 +456,35 @@ class Hook(object):
     def expects_call(self, counter):
         return counter >= self.start and (counter - self.start) % self.step == 0
 
+    def get_state_keys(self, iterative):
+        """Return the keys of the state items that are used by this hook
+
+           **Arguments:**
+
+           iterative
+                The Iterative instance that calls this hook.
+
+           **Returns:** a list of keys of ``iterative.state``, or None when
+           all state items are needed. The Iterative instance only updates
+           the state items that are requested by the hooks that are called
+           in the current iteration. Items that are not requested may hold
+           values of an earlier iteration.
+
+           The default implementation requests all state items. Hooks that do
+           not use the state items should return an empty list.
+        """
+        return None
+
     def __call__(self, iterative):
         raise NotImplementedError
+
+    def finalize(self, iterative):
+        """Called at the end of ``Iterative.run``, also when it is interrupted
+           by an exception.
+
+           **Arguments:**
+
+           iterative
+                The Iterative instance that called this hook.
+        """
+        pass
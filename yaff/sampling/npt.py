@@ -82,7 +82,7 @@ class TBCombination(VerletHook):
         from yaff.sampling.nvt import LangevinThermostat, GLEThermostat
         p_cm_fluct = isinstance(self.thermostat, LangevinThermostat) or isinstance(self.thermostat, GLEThermostat) or isinstance(self.barostat, LangevinBarostat)
         if (not set_ndof) and p_cm_fluct:
-            iterative.ndof = iterative.pos.size
+            iterative.ndof = iterative.pos.size - iterative.nconstraint
         # variables which will determine the coupling between thermostat and barostat
         self.chainvel0 = None
         self.G1_add = None
@@ -197,24 +197,28 @@ class McDonaldBarostat(VerletHook):
         pass
 
     def post(self, iterative, chainvel0 = None):
-        def compute(pos, rvecs):
+        def update(pos, rvecs):
             iterative.pos[:] = pos
-            iterative.gpos[:] = 0.0
+            iterative.rvecs[:] = rvecs
             iterative.ff.update_rvecs(rvecs)
             iterative.ff.update_pos(pos)
-            iterative.epot = iterative.ff.compute(iterative.gpos)
-            iterative.acc = -iterative.gpos/iterative.masses.reshape(-1,1)
 
         natom = iterative.ff.system.natom
         # Change the logarithm of the volume isotropically.
         scale = np.exp(np.random.uniform(-self.amp, self.amp))
-        # Keep track of old state
+        # Keep track of old state, including the results of the last force
+        # field evaluation, such that a rejected move needs no recomputation.
         vol0 = iterative.ff.system.cell.volume
         epot0 = iterative.epot
         rvecs0 = iterative.ff.system.cell.rvecs.copy()
         pos0 = iterative.pos.copy()
+        gpos0 = iterative.gpos.copy()
+        parts0 = [(part.energy, part.gpos.copy(), part.vtens.copy())
+                  for part in [iterative.ff] + iterative.ff.parts]
         # Scale the system and recompute the energy
-        compute(pos0*scale, rvecs0*scale)
+        update(pos0*scale, rvecs0*scale)
+        iterative.gpos[:] = 0.0
+        iterative.epot = iterative.ff.compute(iterative.gpos)
         epot1 = iterative.epot
         vol1 = iterative.ff.system.cell.volume
         # Compute the acceptance ratio
@@ -225,8 +229,17 @@ class McDonaldBarostat(VerletHook):
             # add a correction to the conserved quantity
             self.econs_correction += epot0 - epot1
         else:
-            # revert the cell and the positions in the original state
-            compute(pos0, rvecs0)
+            # revert the cell and the positions in the original state and
+            # restore the corresponding energy and forces. The neighbor list
+            # is updated (without a rebuild) in the next force evaluation.
+            update(pos0, rvecs0)
+            iterative.epot = epot0
+            iterative.gpos[:] = gpos0
+            for part, (energy, gpos, vtens) in zip([iterative.ff] + iterative.ff.parts, parts0):
+                part.energy = energy
+                part.gpos[:] = gpos
+                part.vtens[:] = vtens
+        iterative.acc = -iterative.gpos/iterative.masses.reshape(-1,1)
 
 
 class BerendsenBarostat(VerletHook):
@@ -295,7 +308,7 @@ class BerendsenBarostat(VerletHook):
         iterative.vtens[:] = 0.0
         iterative.epot = iterative.ff.compute(iterative.gpos,iterative.vtens)
         if iterative.ndof is None:
-            iterative.ndof = get_ndof_internal_md(iterative.pos.shape[0], iterative.ff.system.cell.nvec)
+            iterative.ndof = get_ndof_internal_md(iterative.pos.shape[0], iterative.ff.system.cell.nvec) - iterative.nconstraint
         # rescaling of the barostat mass, to be in accordance with Langevin and MTTK
         self.mass_press *= np.sqrt(iterative.ndof)
 
@@ -303,8 +316,6 @@ class BerendsenBarostat(VerletHook):
         pass
 
     def post(self, iterative, chainvel0 = None):
-        # for bookkeeping purposes
-        epot0 = iterative.epot
         # calculation of the internal pressure tensor
         ptens = (np.dot(iterative.vel.T*iterative.masses, iterative.vel) - iterative.vtens)/iterative.ff.system.cell.volume
         # determination of mu
@@ -315,19 +326,11 @@ class BerendsenBarostat(VerletHook):
         mu = 0.5*(mu+mu.T)
         if not self.anisotropic:
             mu = ((np.trace(mu)/3.0)**(1.0/3.0))*np.eye(3)
-        # updating the positions and cell vectors
-        pos_new = np.dot(iterative.pos, mu)
-        rvecs_new = np.dot(iterative.rvecs, mu)
-        iterative.ff.update_pos(pos_new)
-        iterative.pos[:] = pos_new
-        iterative.ff.update_rvecs(rvecs_new)
-        iterative.rvecs[:] = rvecs_new
-        # calculation of the virial tensor
-        iterative.gpos[:] = 0.0
-        iterative.vtens[:] = 0.0
-        iterative.epot = iterative.ff.compute(iterative.gpos,iterative.vtens)
-        epot1 = iterative.epot
-        self.econs_correction += epot0 - epot1
+        # The positions and cell vectors are scaled at the beginning of the
+        # next step, such that the forces need not be recomputed here. The
+        # change in potential energy is added to econs_correction at that
+        # point.
+        iterative.defer_deformation(mu, self)
 
 
 class LangevinBarostat(VerletHook):
@@ -385,7 +388,7 @@ class LangevinBarostat(VerletHook):
         clean_momenta(iterative.pos, iterative.vel, iterative.masses, iterative.ff.system.cell)
         # set the number of internal degrees of freedom (no restriction on p_cm)
         if iterative.ndof is None:
-            iterative.ndof = iterative.pos.size
+            iterative.ndof = iterative.pos.size - iterative.nconstraint
         # define the barostat 'mass'
         self.mass_press = (iterative.ndof+3)/3*boltzmann*self.temp*(self.timecon/(2*np.pi))**2
         # define initial barostat velocity
@@ -476,6 +479,9 @@ class LangevinBarostat(VerletHook):
         iterative.gpos[:] = 0.0
         iterative.vtens[:] = 0.0
         iterative.epot = iterative.ff.compute(iterative.gpos,iterative.vtens)
+        if iterative.constraints is not None:
+            # the constraint forces do not change in the barostat update
+            iterative.vtens += iterative.constraints.vtens
 
         # -iL (v_g + Tr(v_g)/ndof) h/2
         if self.anisotropic:
@@ -586,7 +592,7 @@ class MTKBarostat(VerletHook):
             clean_momenta(iterative.pos, iterative.vel, iterative.masses, iterative.ff.system.cell)
         # determine the internal degrees of freedom
         if iterative.ndof is None:
-            iterative.ndof = get_ndof_internal_md(len(iterative.ff.system.numbers), iterative.ff.system.cell.nvec)
+            iterative.ndof = get_ndof_internal_md(len(iterative.ff.system.numbers), iterative.ff.system.cell.nvec) - iterative.nconstraint
         # determine barostat 'mass'
         angfreq = 2*np.pi/self.timecon_press
         self.mass_press = (iterative.ndof+self.dim**2)*boltzmann*self.temp/angfreq**2
@@ -690,6 +696,9 @@ class MTKBarostat(VerletHook):
         iterative.gpos[:] = 0.0
         iterative.vtens[:] = 0.0
         iterative.epot = iterative.ff.compute(iterative.gpos,iterative.vtens)
+        if iterative.constraints is not None:
+            # the constraint forces do not change in the barostat update
+            iterative.vtens += iterative.constraints.vtens
 
         # -iL (v_g + Tr(v_g)/ndof) h/2
         if self.anisotropic:
@@ -806,7 +815,7 @@ class PRBarostat(VerletHook):
             clean_momenta(iterative.pos, iterative.vel, iterative.masses, iterative.ff.system.cell)
         # determine the internal degrees of freedom
         if iterative.ndof is None:
-            iterative.ndof = get_ndof_internal_md(len(iterative.ff.system.numbers), iterative.ff.system.cell.nvec)
+            iterative.ndof = get_ndof_internal_md(len(iterative.ff.system.numbers), iterative.ff.system.cell.nvec) - iterative.nconstraint
         # determine barostat 'mass' following W = timecon*np.sqrt(n_part) * m_av
         #n_part = len(iterative.masses)
         #self.mass_press = self.timecon_press*np.sum(iterative.masses)/np.sqrt(len(iterative.ff.system.numbers))
@@ -916,6 +925,9 @@ class PRBarostat(VerletHook):
         iterative.gpos[:] = 0.0
         iterative.vtens[:] = 0.0
         iterative.epot = iterative.ff.compute(iterative.gpos,iterative.vtens)
+        if iterative.constraints is not None:
+            # the constraint forces do not change in the barostat update
+            iterative.vtens += iterative.constraints.vtens
         iterative.ekin = iterative._compute_ekin()
 
         # second part of the barostat velocity tensor update
@@ -1012,7 +1024,7 @@ class TadmorBarostat(VerletHook):
             clean_momenta(iterative.pos, iterative.vel, iterative.masses, iterative.ff.system.cell)
         # determine the internal degrees of freedom
         if iterative.ndof is None:
-            iterative.ndof = get_ndof_internal_md(len(iterative.ff.system.numbers), iterative.ff.system.cell.nvec)
+            iterative.ndof = get_ndof_internal_md(len(iterative.ff.system.numbers), iterative.ff.system.cell.nvec) - iterative.nconstraint
         # determine barostat 'mass'
         angfreq = 2*np.pi/self.timecon_press
         self.mass_press = (iterative.ndof+self.dim**2)*boltzmann*self.temp/angfreq**2
@@ -1118,6 +1130,9 @@ class TadmorBarostat(VerletHook):
         iterative.gpos[:] = 0.0
         iterative.vtens[:] = 0.0
         iterative.epot = iterative.ff.compute(iterative.gpos,iterative.vtens)
+        if iterative.constraints is not None:
+            # the constraint forces do not change in the barostat update
+            iterative.vtens += iterative.constraints.vtens
 
         # -iL (Tr(v_g)/ndof) h/2
         if self.anisotropic:
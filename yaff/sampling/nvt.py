@@ -145,7 +145,7 @@ class BerendsenThermostat(VerletHook):
             # It is mandatory to zero the external momenta.
             clean_momenta(iterative.pos, iterative.vel, iterative.masses, iterative.ff.system.cell)
         if iterative.ndof is None:
-            iterative.ndof = get_ndof_internal_md(iterative.pos.shape[0], iterative.ff.system.cell.nvec)
+            iterative.ndof = get_ndof_internal_md(iterative.pos.shape[0], iterative.ff.system.cell.nvec) - iterative.nconstraint
 
     def pre(self, iterative, G1_add = None):
         ekin = iterative.ekin
@@ -249,7 +249,7 @@ class CSVRThermostat(VerletHook):
         # It is mandatory to zero the external momenta.
         clean_momenta(iterative.pos, iterative.vel, iterative.masses, iterative.ff.system.cell)
         if iterative.ndof is None:
-            iterative.ndof = get_ndof_internal_md(iterative.pos.shape[0], iterative.ff.system.cell.nvec)
+            iterative.ndof = get_ndof_internal_md(iterative.pos.shape[0], iterative.ff.system.cell.nvec) - iterative.nconstraint
         self.kin = 0.5*iterative.ndof*boltzmann*self.temp
 
     def pre(self, iterative, G1_add = None):
@@ -483,7 +483,7 @@ class NHCThermostat(VerletHook):
             clean_momenta(iterative.pos, iterative.vel, iterative.masses, iterative.ff.system.cell)
         # If needed, determine the number of _internal_ degrees of freedom
         if iterative.ndof is None:
-            iterative.ndof = get_ndof_internal_md(iterative.pos.shape[0], iterative.ff.system.cell.nvec)
+            iterative.ndof = get_ndof_internal_md(iterative.pos.shape[0], iterative.ff.system.cell.nvec) - iterative.nconstraint
         # Configure the chain
         self.chain.timestep = iterative.timestep
         self.chain.set_ndof(iterative.ndof)
@@ -28,9 +28,6 @@ from __future__ import division
 
 import numpy as np, time
 
-# The implementation in scipy is often more robust
-from scipy.linalg import eigh
-
 from molmod.minimizer import ConjugateGradient, QuasiNewton, NewtonLineSearch, \
     Minimizer
 
@@ -51,6 +48,9 @@ class OptScreenLog(Hook):
         Hook.__init__(self, start, step)
         self.time0 = None
 
+    def get_state_keys(self, iterative):
+        return []
+
     def __call__(self, iterative):
         if log.do_medium:
             if self.time0 is None:
@@ -185,6 +185,8 @@ class HessianModel(object):
                 raise TypeError('Incorrect shape of the initial hessian in quasi-newton method.')
 
     def get_spectrum(self):
+        # The implementation in scipy is often more robust
+        from scipy.linalg import eigh
         return eigh(self.hessian)
 
 
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# YAFF is yet another force-field code.
+# Copyright (C) 2011 Toon Verstraelen <Toon.Verstraelen@UGent.be>,
+# Louis Vanduyfhuys <Louis.Vanduyfhuys@UGent.be>, Center for Molecular Modeling
+# (CMM), Ghent University, Ghent, Belgium; all rights reserved unless otherwise
+# stated.
+#
+# This file is part of YAFF.
+#
+# YAFF is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# YAFF is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+# --
+'''Multiple time step (r-RESPA) Verlet integrator'''
+
+
+from __future__ import division
+
+import numpy as np
+
+from yaff.log import log, timer
+from yaff.sampling.iterative import Iterative
+from yaff.sampling.verlet import VerletIntegrator
+
+
+__all__ = ['RESPAIntegrator']
+
+
+class RESPAIntegrator(VerletIntegrator):
+    '''Reversible RESPA integrator with two levels of force evaluations.
+
+       The parts of the force field are divided in a fast and a slow group.
+       The slow forces are applied as impulses with the (outer) time step,
+       while the fast forces are integrated with a regular velocity Verlet
+       scheme using a time step that is ``nsub`` times smaller. Verlet hooks
+       (thermostats, barostats, ...) act on the outer time step, exactly as
+       in the regular ``VerletIntegrator``.
+
+       Tuckerman, M.; Berne, B. J.; Martyna, G. J. J. Chem. Phys. 1992, 97,
+       1990-2001
+    '''
+    log_name = 'RESPA'
+
+    def __init__(self, ff, timestep=None, fast=None, nsub=1, state=None,
+                 hooks=None, vel0=None, temp0=300, scalevel0=True, time0=None,
+                 ndof=None, counter0=None, restart_h5=None, constraints=None):
+        """
+            **Arguments:**
+
+            ff
+                A ForceField instance
+
+            **Optional arguments:**
+
+            timestep
+                The outer integration time step (in atomic units), i.e. the
+                time step at which the slow parts are evaluated.
+
+            fast
+                A list of ForcePart instances or part names (see
+                ``ForcePart.name``) that are evaluated in the inner loop. The
+                default is ``['valence']``. All other parts of the force field
+                are treated as slow.
+
+            nsub
+                The number of inner steps per outer time step. The inner time
+                step is timestep/nsub.
+
+            All other optional arguments are documented in
+            :class:`yaff.sampling.verlet.VerletIntegrator`.
+        """
+        if fast is None:
+            fast = ['valence']
+        if nsub < 1:
+            raise ValueError('The number of inner steps must be at least one.')
+        self.nsub = int(nsub)
+        self.fast_parts = []
+        for part in fast:
+            if isinstance(part, str):
+                part = getattr(ff, 'part_%s' % part, None)
+            if part is None or not any(part is other for other in ff.parts):
+                raise ValueError('Fast parts must be parts of the force field, got %s.' % part)
+            self.fast_parts.append(part)
+            # The gradient of the fast parts is needed to split the forces.
+            part.set_compute_mode(keep_derivatives=True)
+        self.slow_parts = [part for part in ff.parts if not any(part is other for other in self.fast_parts)]
+        # Working arrays for the fast and slow contributions
+        self.gpos_fast = np.zeros((ff.system.natom, 3), float)
+        self.gpos_slow = np.zeros((ff.system.natom, 3), float)
+        self.vtens_fast = np.zeros((3, 3), float)
+        self.vtens_slow = np.zeros((3, 3), float)
+        VerletIntegrator.__init__(
+            self, ff, timestep, state, hooks, vel0, temp0, scalevel0, time0,
+            ndof, counter0, restart_h5, constraints
+        )
+
+    def initialize(self):
+        if log.do_medium:
+            with log.section(self.log_name):
+                log('Fast parts: %s' % ' '.join(part.name for part in self.fast_parts))
+                log('Slow parts: %s' % ' '.join(part.name for part in self.slow_parts))
+                log('Inner steps per time step: %i' % self.nsub)
+        VerletIntegrator.initialize(self)
+        self._split_gpos()
+
+    def _compute_level(self, parts, gpos, vtens):
+        '''Compute the energy and derivatives of a subset of the force field
+
+           The neighbor list is only updated when one of the parts needs it.
+        '''
+        if self.ff.needs_nlist_update and any(getattr(part, 'nlist', None) is not None for part in parts):
+            self.ff.nlist.update()
+            self.ff.needs_nlist_update = False
+        gpos[:] = 0.0
+        vtens[:] = 0.0
+        return sum([part.compute(gpos, vtens) for part in parts])
+
+    def _split_gpos(self):
+        '''Split the current gradient in its fast and slow contributions
+
+           The per-part results of the last force field evaluation are used,
+           such that no energies need to be recomputed. This also picks up
+           the forces computed by Verlet hooks (e.g. barostats) that call the
+           compute method of the force field.
+        '''
+        self.gpos_fast[:] = 0.0
+        for part in self.fast_parts:
+            self.gpos_fast += part.gpos
+        self.gpos_slow[:] = self.gpos - self.gpos_fast
+
+    def _get_gradients(self):
+        return [self.gpos, self.gpos_fast, self.gpos_slow]
+
+    def propagate(self):
+        # Allow specialized hooks to modify the state before the RESPA step.
+        self.call_verlet_hooks('pre')
+        self._split_gpos()
+        self._apply_deformation()
+
+        # Outer half kick with the slow forces
+        self.vel -= 0.5*self.timestep*self.gpos_slow/self.masses.reshape(-1,1)
+
+        # Inner velocity Verlet steps with the fast forces
+        inner_timestep = self.timestep/self.nsub
+        with timer.section('RESPA inner'):
+            for isub in range(self.nsub):
+                self.vel -= 0.5*inner_timestep*self.gpos_fast/self.masses.reshape(-1,1)
+                if self.constraints is not None:
+                    pos_old = self.pos.copy()
+                self.pos += inner_timestep*self.vel
+                if self.constraints is not None:
+                    self.constraints.shake(self.pos, pos_old, self.vel, self.masses, inner_timestep)
+                self.ff.update_pos(self.pos)
+                epot_fast = self._compute_level(self.fast_parts, self.gpos_fast, self.vtens_fast)
+                self.vel -= 0.5*inner_timestep*self.gpos_fast/self.masses.reshape(-1,1)
+
+        # Outer half kick with the slow forces at the new positions
+        epot_slow = self._compute_level(self.slow_parts, self.gpos_slow, self.vtens_slow)
+        self.vel -= 0.5*self.timestep*self.gpos_slow/self.masses.reshape(-1,1)
+
+        self.gpos[:] = self.gpos_fast + self.gpos_slow
+        self.vtens[:] = self.vtens_fast + self.vtens_slow
+        if self.constraints is not None:
+            self.constraints.rattle(self.pos, self.vel, self.masses, self.timestep)
+            self.vtens += self.constraints.vtens
+        self.epot = epot_fast + epot_slow
+        self.acc = -self.gpos/self.masses.reshape(-1,1)
+        self.ekin = self._compute_ekin()
+
+        # Allow specialized verlet hooks to modify the state after the step
+        self.call_verlet_hooks('post')
+
+        # Calculate the total position change
+        self.posnieuw = self.pos.copy()
+        self.delta[:] = self.posnieuw-self.posoud
+        self.posoud[:] = self.posnieuw
+
+        # Common post-processing of a single step
+        self.time += self.timestep
+        self.compute_properties()
+        Iterative.propagate(self)
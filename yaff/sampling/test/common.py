@@ -36,7 +36,7 @@ from yaff.test.common import get_system_water32, get_system_water, \
 
 __all__ = [
     'get_ff_water32', 'get_ff_water', 'get_ff_bks', 'get_ff_graphene',
-    'get_ff_polyethylene', 'get_ff_nacl',
+    'get_ff_polyethylene', 'get_ff_nacl', 'get_ff_polyethylene_lj',
 ]
 
 
@@ -85,3 +85,23 @@ def get_ff_nacl(**kwargs):
     system = get_system_nacl_cubic()
     fn_pars = pkg_resources.resource_filename(__name__, '../../data/test/parameters_nacl.txt')
     return ForceField.generate(system, fn_pars, **kwargs)
+
+
+def get_ff_polyethylene_lj(skin=0):
+    # Stack the polyethylene chains in a 3D periodic box.
+    system = get_system_polyethylene4().supercell(4)
+    rvecs = np.array([system.cell.rvecs[0], [0, 8*angstrom, 0], [0, 0, 8*angstrom]])
+    system = System(
+        system.numbers, system.pos, ffatypes=system.ffatypes,
+        ffatype_ids=system.ffatype_ids, bonds=system.bonds, rvecs=rvecs
+    )
+    fn_pars = pkg_resources.resource_filename(__name__, '../../data/test/parameters_alkane.txt')
+    ff = ForceField.generate(system, fn_pars)
+    nlist = NeighborList(system, skin)
+    scalings = Scalings(system, 0.0, 0.0, 1.0)
+    sigmas = np.where(system.numbers == 1, 2.5, 3.4)*angstrom
+    epsilons = np.where(system.numbers == 1, 0.1, 0.3)*kjmol
+    pair_pot = PairPotLJ(sigmas, epsilons, 5*angstrom, Switch3(1*angstrom))
+    ff = ForceField(system, ff.parts, nlist)
+    ff.add_part(ForcePartPair(system, nlist, scalings, pair_pot))
+    return ff
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# YAFF is yet another force-field code.
+# Copyright (C) 2011 Toon Verstraelen <Toon.Verstraelen@UGent.be>,
+# Louis Vanduyfhuys <Louis.Vanduyfhuys@UGent.be>, Center for Molecular Modeling
+# (CMM), Ghent University, Ghent, Belgium; all rights reserved unless otherwise
+# stated.
+#
+# This file is part of YAFF.
+#
+# YAFF is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# YAFF is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+# --
+
+
+from __future__ import division
+
+import os
+
+import h5py as h5
+import numpy as np
+from nose.tools import assert_raises
+
+from molmod.test.common import tmpdir
+
+from yaff import *
+from yaff.test.common import get_system_water32
+from yaff.pes.test.common import write_parameters_water
+
+
+def write_structures(dn, nstruct):
+    np.random.seed(1)
+    fns = []
+    for i in range(nstruct):
+        system = get_system_water32()
+        system.pos += np.random.normal(0, 0.05*angstrom, system.pos.shape)
+        fns.append(os.path.join(dn, 'water32_%i.h5' % i))
+        system.to_file(fns[-1])
+    return fns
+
+
+def check_batch(fns, fn_pars, fn_h5, nproc):
+    energies, converged = batch_optimize(fns, fn_pars, fn_h5, nproc=nproc, dof_kwargs={'gpos_rms': 1e-6})
+    assert converged[:-1].all()
+    assert np.isnan(energies[-1])
+    with h5.File(fn_h5, 'r') as f:
+        grp = f['batch']
+        assert grp['done'][:].all()
+        assert (grp['energy'][:] == energies)[:-1].all()
+        assert 'IOError' in str(grp['error'][-1]) or 'FileNotFoundError' in str(grp['error'][-1])
+        assert (grp['niter'][:-1] > 0).all()
+        # Compare with a regular optimization of the first structure.
+        system = System.from_file(fns[0])
+        ff = ForceField.generate(system, fn_pars)
+        dof = CartesianDOF(ff, gpos_rms=1e-6)
+        QNOptimizer(dof).run(1000)
+        assert abs(ff.compute() - energies[0]) < 1e-8
+        assert abs(grp['pos/0'][:] - ff.system.pos).max() < 1e-8
+        assert abs(grp['rvecs'][0] - system.cell.rvecs).max() < 1e-10
+    return energies
+
+
+def test_batch_optimize():
+    with tmpdir(__name__, 'test_batch_optimize') as dn:
+        fn_pars = os.path.join(dn, 'parameters.txt')
+        write_parameters_water(fn_pars, ('bondharm', 'bendaharm'))
+        fns = write_structures(dn, 3) + [os.path.join(dn, 'missing.h5')]
+        energies1 = check_batch(fns, fn_pars, os.path.join(dn, 'serial.h5'), None)
+        fn_h5 = os.path.join(dn, 'parallel.h5')
+        energies2 = check_batch(fns, fn_pars, fn_h5, 2)
+        np.testing.assert_equal(energies1, energies2)
+        # Resume after forgetting the result of one structure.
+        with h5.File(fn_h5, 'a') as f:
+            f['batch/done'][1] = False
+            f['batch/energy'][:3] = 0.0
+        energies3, converged = batch_optimize(fns, fn_pars, fn_h5, nproc=2, dof_kwargs={'gpos_rms': 1e-6})
+        assert energies3[0] == 0.0
+        assert energies3[1] == energies1[1]
+        assert energies3[2] == 0.0
+        # The file can not be reused for other structures.
+        with assert_raises(ValueError):
+            batch_optimize(fns[:2], fn_pars, fn_h5)
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# YAFF is yet another force-field code.
+# Copyright (C) 2011 Toon Verstraelen <Toon.Verstraelen@UGent.be>,
+# Louis Vanduyfhuys <Louis.Vanduyfhuys@UGent.be>, Center for Molecular Modeling
+# (CMM), Ghent University, Ghent, Belgium; all rights reserved unless otherwise
+# stated.
+#
+# This file is part of YAFF.
+#
+# YAFF is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# YAFF is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+# --
+
+
+from __future__ import division
+
+import numpy as np
+
+from yaff import *
+from yaff.sampling.test.common import get_ff_polyethylene_lj
+
+
+def get_vel0(ff, temp=300):
+    ff.system.set_standard_masses()
+    np.random.seed(2)
+    return get_random_vel(temp, True, ff.system.masses)
+
+
+def check_constraints(constraints, pos, vel, threshold=1e-8):
+    deltas = constraints._get_deltas(pos)
+    lengths = np.linalg.norm(deltas, axis=1)
+    assert abs(lengths - constraints.lengths).max() < threshold*constraints.lengths.max()
+    i0, i1 = constraints.pairs.T
+    proj = (deltas*(vel[i0] - vel[i1])).sum(axis=1)
+    assert abs(proj).max() < threshold*abs(vel).max()*constraints.lengths.max()
+
+
+def test_constraints_groups():
+    ff = get_ff_polyethylene_lj()
+    constraints = BondConstraints(ff.system)
+    # All C-H bonds are constrained by default.
+    assert len(constraints) == (ff.system.numbers == 1).sum()
+    assert (ff.system.numbers[constraints.pairs] == 1).any(axis=1).all()
+    assert sum(len(group) for group in constraints.groups) == len(constraints)
+    for group in constraints.groups:
+        atoms = constraints.pairs[group].ravel()
+        assert len(set(atoms)) == len(atoms)
+
+
+def test_constraints_nve():
+    ff = get_ff_polyethylene_lj()
+    constraints = BondConstraints(ff.system, tol=1e-12)
+    verlet = VerletIntegrator(ff, 2.0*femtosecond, vel0=get_vel0(ff), constraints=constraints)
+    assert verlet.ndof == ff.system.pos.size - len(constraints)
+    verlet.run(20)
+    check_constraints(constraints, verlet.pos, verlet.vel)
+    assert verlet.cons_err < 0.1
+
+
+def test_constraints_nhc():
+    ff = get_ff_polyethylene_lj()
+    constraints = BondConstraints(ff.system, tol=1e-12)
+    thermo = NHCThermostat(temp=300, timecon=100*femtosecond)
+    verlet = VerletIntegrator(ff, 2.0*femtosecond, hooks=thermo, vel0=get_vel0(ff), constraints=constraints)
+    assert verlet.ndof == get_ndof_internal_md(ff.system.natom, 3) - len(constraints)
+    assert thermo.chain.ndof == verlet.ndof
+    verlet.run(20)
+    check_constraints(constraints, verlet.pos, verlet.vel, 1e-6)
+
+
+def test_constraints_mtk():
+    ff = get_ff_polyethylene_lj()
+    constraints = BondConstraints(ff.system, tol=1e-12)
+    thermo = NHCThermostat(temp=300, timecon=100*femtosecond)
+    baro = MTKBarostat(ff, temp=300, press=1*bar, timecon=500*femtosecond)
+    verlet = VerletIntegrator(ff, 2.0*femtosecond, hooks=[thermo, baro], vel0=get_vel0(ff), constraints=constraints)
+    verlet.run(5)
+    # The barostat rescales the bonds after each SHAKE step. These deviations
+    # do not accumulate because SHAKE restores the lengths in the next step.
+    check_constraints(constraints, verlet.pos, verlet.vel, 1e-2)
+    # The virial includes the contribution of the constraint forces.
+    vtens = np.zeros((3, 3))
+    ff.compute(None, vtens)
+    assert abs(verlet.vtens - vtens - constraints.vtens).max() < 1e-10
+    assert abs(constraints.vtens).max() > 0
+
+
+def test_constraints_respa():
+    ff = get_ff_polyethylene_lj()
+    constraints = BondConstraints(ff.system, tol=1e-12)
+    respa = RESPAIntegrator(ff, 4.0*femtosecond, nsub=2, vel0=get_vel0(ff), constraints=constraints)
+    respa.run(10)
+    check_constraints(constraints, respa.pos, respa.vel)
+
+
+def test_constraints_rotor_virial():
+    # A freely rotating rigid diatomic molecule has no internal pressure: the
+    # constraint virial cancels the kinetic contribution.
+    system = System(
+        np.array([8, 8]), np.array([[0.0, 0.0, 0.0], [1.2*angstrom, 0.0, 0.0]]),
+        rvecs=np.identity(3)*20*angstrom
+    )
+    system.set_standard_masses()
+    ff = ForceField(system, [])
+    constraints = BondConstraints(system, pairs=[[0, 1]], tol=1e-12)
+    vel0 = np.array([[0.0, 1.0, 0.0], [0.0, -1.0, 0.0]])*1e-3
+    with np.errstate(invalid='ignore'):
+        # The kinetic energy is constant, so the conserved quantity error is
+        # not defined.
+        verlet = VerletIntegrator(ff, 0.5*femtosecond, vel0=vel0, constraints=constraints)
+        verlet.run(10)
+    check_constraints(constraints, verlet.pos, verlet.vel)
+    kin = np.trace(np.dot(verlet.vel.T*verlet.masses, verlet.vel))
+    assert abs(np.trace(verlet.vtens) - kin) < 1e-3*kin
+    assert abs(np.trace(verlet.ptens))*system.cell.volume < 1e-3*kin
@@ -28,7 +28,11 @@ from __future__ import print_function
 
 import numpy as np
 
+import pkg_resources
+
+import yaff
 from yaff import *
+from yaff.test.common import get_system_polyethylene4
 from yaff.sampling.test.common import get_ff_water32, get_ff_water, get_ff_bks
 
 
@@ -136,3 +140,98 @@ def test_bulk_elastic_bks():
     e2 = ff.compute()
     C = (e1 + e2 - 2*e0)/(eps**2)/vol0
     assert abs(C - elastic[0,0]) < C*0.02
+
+
+def test_sparse_hessian_polyethylene():
+    system = get_system_polyethylene4().supercell(8)
+    fn_pars = pkg_resources.resource_filename(yaff.__name__, 'data/test/parameters_alkane.txt')
+    ff = ForceField.generate(system, fn_pars)
+    pos0 = ff.system.pos.copy()
+    hessian = estimate_cart_hessian(ff)
+    sparse = estimate_sparse_cart_hessian(ff)
+    assert abs(ff.system.pos - pos0).max() == 0.0
+    assert sparse.shape == hessian.shape
+    assert abs(sparse.toarray() - hessian).max() < 1e-6*abs(hessian).max()
+    # the number of colors must be much lower than the number of atoms
+    graph = yaff.sampling.harmonic._get_interaction_graph(ff)
+    colors = get_hessian_coloring(graph)
+    assert colors.max() + 1 < ff.system.natom
+    conflicts = (graph.astype(int)*graph.astype(int)).tocoo()
+    for i, j in zip(conflicts.row, conflicts.col):
+        assert i == j or colors[i] != colors[j]
+
+
+def test_sparse_hessian_x2():
+    K, d = np.random.uniform(1.0, 2.0, 2)
+    system = System(
+        numbers=np.array([1, 1, 1, 1]),
+        pos=np.array([[0.0, 0.0, 0.0], [0.0, 0.0, d], [9.0, 0.0, 0.0], [9.0, 0.0, d]]),
+        ffatypes=['H', 'H', 'H', 'H'],
+        bonds=np.array([[0, 1], [2, 3]]),
+    )
+    part = ForcePartValence(system)
+    part.add_term(Harmonic(K, d, Bond(0, 1)))
+    part.add_term(Harmonic(K, d, Bond(2, 3)))
+    ff = ForceField(system, [part])
+    hessian = estimate_sparse_cart_hessian(ff)
+    assert abs(hessian[:6, 6:]).max() == 0.0
+    assert abs(hessian.toarray() - estimate_cart_hessian(ff)).max() < 1e-6
+    evals = np.linalg.eigvalsh(hessian.toarray())
+    assert abs(evals[:-2]).max() < 1e-5
+    assert abs(evals[-2:] - 2*K).max() < 1e-5
+
+
+def get_ff_polyethylene8():
+    system = get_system_polyethylene4().supercell(8)
+    system.set_standard_masses()
+    # Break the symmetry to avoid (nearly) degenerate eigenvalues.
+    system.pos += np.random.RandomState(1).normal(0, 0.1, system.pos.shape)
+    fn_pars = pkg_resources.resource_filename(yaff.__name__, 'data/test/parameters_alkane.txt')
+    return ForceField.generate(system, fn_pars)
+
+
+def get_mass_weighted_evals(ff):
+    hessian = ff.part_valence.compute_hessian().toarray()
+    scale = 1.0/np.sqrt(np.repeat(ff.system.masses, 3))
+    return np.linalg.eigvalsh(hessian*scale*scale[:,None])
+
+
+def test_hessian_operator_polyethylene():
+    ff = get_ff_polyethylene8()
+    pos0 = ff.system.pos.copy()
+    op = get_hessian_operator(ff)
+    hessian = ff.part_valence.compute_hessian()
+    x = np.random.normal(0, 1, op.shape[0])
+    assert abs(op.matvec(x) - hessian.dot(x)).max() < 1e-6*abs(hessian.dot(x)).max()
+    assert (ff.system.pos == pos0).all()
+    # Products are computed at the current positions.
+    ff.update_pos(pos0 + np.random.normal(0, 0.01, pos0.shape))
+    hessian = ff.part_valence.compute_hessian()
+    assert abs(op.matvec(x) - hessian.dot(x)).max() < 1e-6*abs(hessian.dot(x)).max()
+    # The mass-weighted operator does not assign masses to the system.
+    ff.system.masses = None
+    op = get_hessian_operator(ff, mass_weighted=True)
+    assert op.matvec(x).shape == x.shape
+    assert ff.system.masses is None
+
+
+def test_normal_modes_lowest_polyethylene():
+    ff = get_ff_polyethylene8()
+    evals_ref = get_mass_weighted_evals(ff)
+    evals, evecs = estimate_normal_modes(ff, nmode=8)
+    assert evecs.shape == (3*ff.system.natom, 8)
+    assert abs(evals - evals_ref[:8]).max() < 1e-6*evals_ref[-1]
+
+
+def test_normal_modes_target_polyethylene():
+    ff = get_ff_polyethylene8()
+    evals_ref = get_mass_weighted_evals(ff)
+    target = evals_ref[200] + 1e-3*(evals_ref[201] - evals_ref[200])
+    evals, evecs = estimate_normal_modes(ff, nmode=4, target=target)
+    expected = np.sort(evals_ref[abs(evals_ref - target).argsort()[:4]])
+    assert abs(evals - expected).max() < 1e-6*evals_ref[-1]
+    # check the eigenvectors
+    hessian = ff.part_valence.compute_hessian().toarray()
+    scale = 1.0/np.sqrt(np.repeat(ff.system.masses, 3))
+    hessian = hessian*scale*scale[:,None]
+    assert abs(np.dot(hessian, evecs) - evecs*evals).max() < 1e-5*evals_ref[-1]
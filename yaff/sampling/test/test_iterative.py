@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# YAFF is yet another force-field code.
+# Copyright (C) 2011 Toon Verstraelen <Toon.Verstraelen@UGent.be>,
+# Louis Vanduyfhuys <Louis.Vanduyfhuys@UGent.be>, Center for Molecular Modeling
+# (CMM), Ghent University, Ghent, Belgium; all rights reserved unless otherwise
+# stated.
+#
+# This file is part of YAFF.
+#
+# YAFF is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# YAFF is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+# --
+
+
+from __future__ import division
+
+import numpy as np
+
+from yaff import *
+from yaff.sampling.test.common import get_ff_polyethylene_lj
+
+
+def get_epot_valence_ref(ff, ic_kinds, nvec):
+    # Straightforward loop over all valence terms
+    val = 0.0
+    ei = 0.0
+    charges = ff.system.charges
+    vtab = ff.part_valence.vlist.vtab[:ff.part_valence.vlist.nv]
+    ictab = ff.part_valence.vlist.iclist.ictab
+    dtab = ff.part_valence.vlist.iclist.dlist.deltas
+    for term in vtab:
+        if term['kind'] == 3 or ictab[term['ic0']]['kind'] not in ic_kinds:
+            continue
+        val += term['energy']
+        ic = ictab[term['ic0']]
+        ds = [dtab[ic['i%i' % ivec]] for ivec in range(nvec)]
+        vecs = [np.array([d['dx'], d['dy'], d['dz']])*ic['sign%i' % ivec] for ivec, d in enumerate(ds)]
+        if nvec == 1:
+            q0, q1 = charges[ds[0]['i']], charges[ds[0]['j']]
+        else:
+            q0 = charges[np.array([ds[0]['i'], ds[0]['j']])[::ic['sign0']][1]]
+            q1 = charges[np.array([ds[-1]['i'], ds[-1]['j']])[::ic['sign%i' % (nvec-1)]][1]]
+        ei += q0*q1/np.linalg.norm(vecs[0] - sum(vecs[1:]))
+    return np.array([val, val+ei])
+
+
+def test_epot_valence_state_items():
+    ff = get_ff_polyethylene_lj()
+    np.random.seed(1)
+    ff.system.charges = np.random.uniform(-1, 1, ff.system.natom)
+    ff.compute()
+    opt = CGOptimizer(CartesianDOF(ff))
+    for cls, ic_kinds, nvec in [(EpotBondsStateItem, [0], 1),
+                                (EpotBendsStateItem, [1, 2], 2),
+                                (EpotDihedsStateItem, [3, 4], 3)]:
+        expected = get_epot_valence_ref(ff, ic_kinds, nvec)
+        assert expected[0] != 0.0
+        item = cls()
+        assert abs(item.get_value(opt) - expected[0]) < 1e-10
+        item = cls(do_ei=True).copy()
+        assert abs(item.get_value(opt) - expected).max() < 1e-10
+        # The electrostatic contributions follow the geometry.
+        ff.update_pos(ff.system.pos + np.random.normal(0, 0.01, ff.system.pos.shape))
+        ff.compute()
+        expected = get_epot_valence_ref(ff, ic_kinds, nvec)
+        assert abs(item.get_value(opt) - expected).max() < 1e-10
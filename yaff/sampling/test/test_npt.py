@@ -25,10 +25,143 @@
 
 from __future__ import division
 
+import numpy as np
+
 from yaff import *
-from yaff.sampling.test.common import get_ff_water32
+from yaff.sampling.test.common import get_ff_water32, get_ff_polyethylene_lj
 
 def test_amb():
     nve = VerletIntegrator(get_ff_water32(), 1.0*femtosecond, hooks=TBCombination(McDonaldBarostat(300, 1*bar), AndersenThermostat(300)))
     nve.run(5)
     assert nve.counter == 5
+
+
+def test_mtk_nlist_skin():
+    # The neighbor list with skin is not rebuilt after every barostat step
+    # and gives the same trajectory as a list without skin.
+    results = []
+    for skin in 0.0, 2.0*angstrom:
+        ff = get_ff_polyethylene_lj(skin)
+        ff.system.set_standard_masses()
+        np.random.seed(3)
+        vel0 = get_random_vel(300, True, ff.system.masses)
+        nrebuild = [0]
+        checkpoint = ff.nlist._checkpoint
+        def counting_checkpoint():
+            nrebuild[0] += 1
+            checkpoint()
+        ff.nlist._checkpoint = counting_checkpoint
+        thermo = NHCThermostat(temp=300, timecon=100*femtosecond)
+        baro = MTKBarostat(ff, temp=300, press=1*bar, timecon=500*femtosecond)
+        np.random.seed(4)
+        verlet = VerletIntegrator(ff, 1.0*femtosecond, hooks=[thermo, baro], vel0=vel0)
+        verlet.run(10)
+        results.append((verlet.pos.copy(), verlet.rvecs.copy(), nrebuild[0]))
+    assert abs(results[0][0] - results[1][0]).max() < 1e-8
+    assert abs(results[0][1] - results[1][1]).max() < 1e-8
+    assert results[1][2] < 0.2*results[0][2]
+
+
+def count_computes(ff):
+    counter = [0]
+    compute = ff.compute
+    def counting_compute(gpos=None, vtens=None):
+        counter[0] += 1
+        return compute(gpos, vtens)
+    ff.compute = counting_compute
+    return counter
+
+
+def test_berendsen_single_compute():
+    ff = get_ff_polyethylene_lj(2.0*angstrom)
+    baro = BerendsenBarostat(ff, 300, 1*bar)
+    verlet = VerletIntegrator(ff, 1.0*femtosecond, hooks=baro)
+    counter = count_computes(ff)
+    for i in range(5):
+        verlet.propagate()
+    assert counter[0] == 5
+    # The scaling of the last step is only applied in the next step.
+    assert len(verlet.deformations) == 1
+    assert abs(verlet.epot - ff.compute()) < 1e-10
+    # The first-order estimate of the energy change due to the scaling.
+    vtens = np.zeros((3, 3))
+    epot0 = ff.compute(None, vtens)
+    deformation, hook = verlet.deformations[0]
+    assert hook is baro
+    ff.update_rvecs(np.dot(ff.system.cell.rvecs, deformation))
+    ff.update_pos(np.dot(ff.system.pos, deformation))
+    epot1 = ff.compute()
+    estimate = (vtens*(deformation - np.identity(3))).sum()
+    assert abs(epot1 - epot0 - estimate) < 1e-3*abs(estimate)
+    ff.update_rvecs(verlet.rvecs)
+    ff.update_pos(verlet.pos)
+    # A pending scaling is applied when the run ends.
+    verlet.run(2)
+    assert len(verlet.deformations) == 0
+    assert abs(ff.system.cell.rvecs - verlet.rvecs).max() < 1e-10
+    assert abs(ff.system.pos - verlet.pos).max() < 1e-10
+    assert abs(verlet.epot - ff.compute()) < 1e-10
+
+
+class ImmediateBerendsenBarostat(BerendsenBarostat):
+    '''Reference implementation that scales and recomputes the forces at once'''
+    def post(self, iterative, chainvel0=None):
+        epot0 = iterative.epot
+        ptens = (np.dot(iterative.vel.T*iterative.masses, iterative.vel) - iterative.vtens)/iterative.ff.system.cell.volume
+        dmu = self.timestep_press/self.mass_press*(self.press*np.eye(3)-ptens)
+        mu = np.eye(3) - dmu
+        mu = 0.5*(mu+mu.T)
+        if not self.anisotropic:
+            mu = ((np.trace(mu)/3.0)**(1.0/3.0))*np.eye(3)
+        iterative.pos[:] = np.dot(iterative.pos, mu)
+        iterative.rvecs[:] = np.dot(iterative.rvecs, mu)
+        iterative.ff.update_rvecs(iterative.rvecs)
+        iterative.ff.update_pos(iterative.pos)
+        iterative.gpos[:] = 0.0
+        iterative.vtens[:] = 0.0
+        iterative.epot = iterative.ff.compute(iterative.gpos, iterative.vtens)
+        self.econs_correction += epot0 - iterative.epot
+
+
+def test_berendsen_deferred_reference():
+    results = []
+    for BaroClass in ImmediateBerendsenBarostat, BerendsenBarostat:
+        ff = get_ff_water32()
+        vol0 = ff.system.cell.volume
+        np.random.seed(3)
+        baro = BaroClass(ff, 300, 1*bar, timecon=100*femtosecond)
+        verlet = VerletIntegrator(ff, 0.5*femtosecond, hooks=baro, temp0=300)
+        econs = []
+        for i in range(100):
+            verlet.propagate()
+            econs.append(verlet.econs)
+        verlet.finalize()
+        results.append((ff.system.cell.volume - vol0, np.ptp(econs)))
+    (dvol_ref, drift_ref), (dvol, drift) = results
+    assert abs(dvol - dvol_ref) < 0.02*abs(dvol_ref)
+    assert abs(drift - drift_ref) < 0.02*drift_ref
+
+
+def test_mcdonald_restore():
+    ff = get_ff_polyethylene_lj(2.0*angstrom)
+    verlet = VerletIntegrator(ff, 1.0*femtosecond)
+    baro = McDonaldBarostat(300, 1e4*bar, amp=1e-2)
+    counter = count_computes(ff)
+    np.random.seed(5)
+    naccept = 0
+    for i in range(10):
+        vol0 = ff.system.cell.volume
+        baro.post(verlet)
+        naccept += ff.system.cell.volume != vol0
+        # The cached results of the parts are restored after a rejection.
+        assert abs(sum(part.energy for part in ff.parts) - verlet.epot) < 1e-10
+        assert abs(sum(part.gpos for part in ff.parts) - verlet.gpos).max() < 1e-10
+        # The energy and forces must correspond to the current state.
+        gpos = np.zeros(ff.system.pos.shape)
+        epot = ff.compute(gpos)
+        assert abs(verlet.epot - epot) < 1e-10
+        assert abs(verlet.gpos - gpos).max() < 1e-10
+        assert abs(verlet.rvecs - ff.system.cell.rvecs).max() < 1e-10
+    assert 0 < naccept < 10
+    # One compute for each trial and one for each check.
+    assert counter[0] == 20
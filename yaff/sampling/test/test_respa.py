@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# YAFF is yet another force-field code.
+# Copyright (C) 2011 Toon Verstraelen <Toon.Verstraelen@UGent.be>,
+# Louis Vanduyfhuys <Louis.Vanduyfhuys@UGent.be>, Center for Molecular Modeling
+# (CMM), Ghent University, Ghent, Belgium; all rights reserved unless otherwise
+# stated.
+#
+# This file is part of YAFF.
+#
+# YAFF is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# YAFF is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+# --
+
+
+from __future__ import division
+
+import numpy as np
+from nose.tools import assert_raises
+
+from yaff import *
+from yaff.sampling.test.common import get_ff_polyethylene_lj
+
+
+def get_vel0(ff, temp=300):
+    ff.system.set_standard_masses()
+    np.random.seed(1)
+    return get_random_vel(temp, True, ff.system.masses)
+
+
+def test_respa_nsub1_verlet():
+    ff = get_ff_polyethylene_lj()
+    vel0 = get_vel0(ff)
+    pos0 = ff.system.pos.copy()
+    verlet = VerletIntegrator(ff, 1.0*femtosecond, vel0=vel0)
+    verlet.run(10)
+    ff.update_pos(pos0)
+    respa = RESPAIntegrator(ff, 1.0*femtosecond, fast=['valence'], nsub=1, vel0=vel0)
+    respa.run(10)
+    assert abs(verlet.pos - respa.pos).max() < 1e-10
+    assert abs(verlet.vel - respa.vel).max() < 1e-10
+    assert abs(verlet.econs - respa.econs) < 1e-10
+
+
+def test_respa_conservation():
+    cons_errs = []
+    for nsub in 1, 4:
+        ff = get_ff_polyethylene_lj()
+        respa = RESPAIntegrator(ff, 2.0*femtosecond, fast=['valence'], nsub=nsub, vel0=get_vel0(ff))
+        respa.run(50)
+        assert respa.counter == 50
+        cons_errs.append(respa.cons_err)
+    # The inner loop resolves the stiff bond vibrations.
+    assert cons_errs[1] < 0.2*cons_errs[0]
+
+
+def test_respa_parts():
+    ff = get_ff_polyethylene_lj()
+    respa = RESPAIntegrator(ff, 2.0*femtosecond, fast=[ff.part_pair_lj], nsub=2)
+    assert respa.fast_parts == [ff.part_pair_lj]
+    assert respa.slow_parts == [ff.part_valence]
+    with assert_raises(ValueError):
+        RESPAIntegrator(ff, 2.0*femtosecond, fast=['ewald_reci'], nsub=2)
+    with assert_raises(ValueError):
+        RESPAIntegrator(ff, 2.0*femtosecond, nsub=0)
+
+
+def test_respa_split_gpos():
+    ff = get_ff_polyethylene_lj()
+    respa = RESPAIntegrator(ff, 2.0*femtosecond, nsub=3)
+    respa.run(3)
+    gpos_fast = np.zeros(ff.system.pos.shape)
+    gpos_slow = np.zeros(ff.system.pos.shape)
+    ff.part_valence.compute(gpos_fast)
+    ff.part_pair_lj.compute(gpos_slow)
+    assert abs(respa.gpos_fast - gpos_fast).max() < 1e-10
+    assert abs(respa.gpos_slow - gpos_slow).max() < 1e-10
+    assert abs(respa.epot - ff.compute()) < 1e-10
+
+
+def test_respa_nhc():
+    ff = get_ff_polyethylene_lj()
+    thermo = NHCThermostat(temp=300, timecon=100*femtosecond)
+    respa = RESPAIntegrator(ff, 2.0*femtosecond, nsub=4, hooks=thermo, vel0=get_vel0(ff))
+    respa.run(50)
+    assert respa.counter == 50
+    # The NHC conserved quantity is tracked through the econs_correction.
+    assert respa.cons_err < 0.1
+
+
+def test_respa_langevin():
+    ff = get_ff_polyethylene_lj()
+    thermo = LangevinThermostat(temp=300, timecon=20*femtosecond)
+    respa = RESPAIntegrator(ff, 2.0*femtosecond, nsub=4, hooks=thermo)
+    respa.run(5)
+    assert respa.counter == 5
+
+
+def test_respa_mtk():
+    ff = get_ff_polyethylene_lj()
+    thermo = NHCThermostat(temp=300, timecon=100*femtosecond)
+    baro = MTKBarostat(ff, temp=300, press=1*bar, timecon=500*femtosecond)
+    respa = RESPAIntegrator(ff, 2.0*femtosecond, nsub=4, hooks=[thermo, baro], vel0=get_vel0(ff))
+    respa.run(5)
+    assert respa.counter == 5
+    # The split must be consistent with the forces after the barostat update.
+    gpos = np.zeros(ff.system.pos.shape)
+    epot = ff.compute(gpos)
+    assert abs(respa.epot - epot) < 1e-10
+    assert abs(respa.gpos - gpos).max() < 1e-10
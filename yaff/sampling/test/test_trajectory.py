@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# YAFF is yet another force-field code.
+# Copyright (C) 2011 Toon Verstraelen <Toon.Verstraelen@UGent.be>,
+# Louis Vanduyfhuys <Louis.Vanduyfhuys@UGent.be>, Center for Molecular Modeling
+# (CMM), Ghent University, Ghent, Belgium; all rights reserved unless otherwise
+# stated.
+#
+# This file is part of YAFF.
+#
+# YAFF is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# YAFF is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+# --
+
+
+from __future__ import division
+
+import h5py as h5
+import numpy as np
+
+from molmod.test.common import tmpdir
+
+from yaff import *
+from yaff.sampling.test.common import get_ff_polyethylene_lj
+
+
+def write_trajectory(fn_h5, nstep=20, **kwargs):
+    ff = get_ff_polyethylene_lj()
+    with h5.File(fn_h5, 'w') as f:
+        hdf5 = HDF5Writer(f, **kwargs)
+        nve = VerletIntegrator(ff, 1.0*femtosecond, hooks=hdf5)
+        nve.run(nstep)
+    return ff
+
+
+def test_trajectory_reader():
+    with tmpdir(__name__, 'test_trajectory_reader') as dn:
+        fn_h5 = '%s/traj.h5' % dn
+        write_trajectory(fn_h5, policies={'pos': StoragePolicy(chunk_rows=2)})
+        with h5.File(fn_h5, 'r') as f:
+            pos = f['trajectory/pos'][:]
+            cell = f['trajectory/cell'][:]
+            for prefetch in False, True:
+                reader = TrajectoryReader(f, ['pos', 'cell'], block_size=3, prefetch=prefetch)
+                assert len(reader) == 21
+                assert reader.block_size == 4
+                for i in range(21):
+                    frame = reader[i]
+                    assert (frame[0] == pos[i]).all()
+                    assert (frame[1] == cell[i]).all()
+                # Random access
+                assert (reader[2][0] == pos[2]).all()
+                assert (reader[-1][0] == pos[-1]).all()
+                try:
+                    reader[21]
+                    assert False
+                except IndexError:
+                    pass
+                reader.close()
+
+
+def test_ref_trajectory():
+    with tmpdir(__name__, 'test_ref_trajectory') as dn:
+        fn_h5 = '%s/traj.h5' % dn
+        ff = write_trajectory(fn_h5, policies={'pos': StoragePolicy(np.float32)})
+        with h5.File(fn_h5, 'r') as f:
+            pos = f['trajectory/pos'][:]
+            epot = f['trajectory/epot'][:]
+        with h5.File('%s/ref.h5' % dn, 'w') as fout:
+            ref = RefTrajectory(ff, fn_h5, hooks=HDF5Writer(fout), block_size=4)
+            assert ref.nframes == 21
+            ref.run()
+            assert ref.counter == 21
+            assert (fout['trajectory/pos'][:] == pos).all()
+            # The positions are stored in single precision.
+            assert abs(fout['trajectory/epot'][:] - epot).max() < 1e-5*abs(epot).max()
@@ -33,8 +33,10 @@ import numpy as np
 
 from yaff import *
 from yaff.test.common import get_system_water
-from yaff.sampling.test.common import get_ff_water32, get_ff_water
+from yaff.sampling.test.common import get_ff_water32, get_ff_water, \
+    get_ff_polyethylene_lj
 from molmod.test.common import tmpdir
+from yaff.sampling.iterative import Iterative, StateItem
 
 
 def test_basic_water32():
@@ -157,3 +159,293 @@ def test_kinetic_annealing():
     nve = VerletIntegrator(get_ff_water32(), 1.0*femtosecond, hooks=KineticAnnealing())
     nve.run(5)
     assert nve.counter == 5
+
+
+def check_fast_run(thermo_cls, nstep=20):
+    results = []
+    for fast in False, True:
+        ff = get_ff_polyethylene_lj(2.0*angstrom)
+        np.random.seed(6)
+        hooks = [] if thermo_cls is None else [thermo_cls(300)]
+        with h5.File('yaff.sampling.test.test_verlet.check_fast_run_%s.h5' % fast, driver='core', backing_store=False) as f:
+            hooks.append(HDF5Writer(f, step=3))
+            verlet = VerletIntegrator(ff, 1.0*femtosecond, hooks=hooks)
+            assert verlet._supports_fast_run()
+            if fast:
+                verlet.run(nstep)
+            else:
+                Iterative.run(verlet, nstep)
+            traj = dict((key, f['trajectory/%s' % key][:]) for key in ['counter', 'pos', 'vel', 'econs', 'cons_err', 'rmsd_delta', 'ptens'])
+        results.append((verlet, traj))
+    (verlet0, traj0), (verlet1, traj1) = results
+    # The results must be identical, not just close.
+    for key in 'pos', 'vel', 'gpos', 'delta', 'ptens':
+        assert (getattr(verlet0, key) == getattr(verlet1, key)).all()
+    for key in 'counter', 'time', 'epot', 'ekin', 'econs', 'cons_err', 'rmsd_gpos', 'rmsd_delta':
+        assert getattr(verlet0, key) == getattr(verlet1, key)
+    for key in traj0:
+        assert (traj0[key] == traj1[key]).all()
+    assert len(traj1['counter']) == nstep//3 + 1
+
+
+def test_fast_run_nve():
+    check_fast_run(None)
+
+
+def test_fast_run_langevin():
+    check_fast_run(LangevinThermostat)
+
+
+def test_fast_run_csvr():
+    check_fast_run(CSVRThermostat)
+
+
+def test_fast_run_nhc():
+    check_fast_run(NHCThermostat)
+
+
+def test_fast_run_unsupported():
+    ff = get_ff_polyethylene_lj()
+    verlet = VerletIntegrator(ff, 1.0*femtosecond, hooks=BerendsenThermostat(300))
+    assert not verlet._supports_fast_run()
+    verlet.run(2)
+    assert verlet.counter == 2
+
+
+class CountingStateItem(StateItem):
+    '''Keeps track of the number of evaluations of the state item'''
+    def __init__(self, key='counting', initial=0):
+        StateItem.__init__(self, key)
+        self.initial = initial
+        self.ncall = 0
+
+    def get_value(self, iterative):
+        self.ncall += 1
+        if iterative.counter >= self.initial:
+            return iterative.counter
+
+    def copy(self):
+        return self.__class__(self.key, self.initial)
+
+
+def test_lazy_state_items():
+    ff = get_ff_polyethylene_lj()
+    item = CountingStateItem()
+    hooks = [VerletScreenLog(step=1), LangevinThermostat(300)]
+    verlet = VerletIntegrator(ff, 1.0*femtosecond, state=[item], hooks=hooks)
+    Iterative.run(verlet, 5)
+    assert item.ncall == 0
+
+
+def test_lazy_state_items_hdf5():
+    ff = get_ff_polyethylene_lj()
+    item = CountingStateItem()
+    # Not available at the first call, so no dataset is created.
+    late = CountingStateItem('late', 1)
+    with h5.File('yaff.sampling.test.test_verlet.test_lazy_state_items_hdf5.h5', driver='core', backing_store=False) as f:
+        hooks = [VerletScreenLog(step=1), HDF5Writer(f, step=4)]
+        verlet = VerletIntegrator(ff, 1.0*femtosecond, state=[item, late], hooks=hooks)
+        Iterative.run(verlet, 10)
+        assert item.ncall == 3
+        assert late.ncall == 1
+        assert 'late' not in f['trajectory']
+        assert (f['trajectory/counting'][:] == [0, 4, 8]).all()
+        assert (f['trajectory/counter'][:] == [0, 4, 8]).all()
+
+
+def test_hdf5_buffer():
+    trajs = []
+    for kwargs in {'buffer_size': 1}, {'buffer_size': 4, 'compression': 'gzip'}:
+        ff = get_ff_polyethylene_lj()
+        np.random.seed(3)
+        with h5.File('yaff.sampling.test.test_verlet.test_hdf5_buffer.h5', driver='core', backing_store=False) as f:
+            hdf5 = HDF5Writer(f, **kwargs)
+            nve = VerletIntegrator(ff, 1.0*femtosecond, hooks=hdf5)
+            for i in range(5):
+                nve.propagate()
+            # Only complete blocks are written during the run.
+            nrow = 6 if kwargs['buffer_size'] == 1 else 4
+            assert get_last_trajectory_row(f['trajectory']) == nrow
+            assert f['trajectory/pos'].shape[0] == nrow
+            nve.run(5)
+            assert get_last_trajectory_row(f['trajectory']) == 11
+            assert f['trajectory/pos'].compression == kwargs.get('compression')
+            trajs.append(dict((key, ds[:]) for key, ds in f['trajectory'].items()))
+    assert sorted(trajs[0]) == sorted(trajs[1])
+    for key in trajs[0]:
+        assert (trajs[0][key] == trajs[1][key]).all()
+
+
+class EvenStateItem(StateItem):
+    '''Only has a value at even iterations'''
+    def __init__(self, key='even'):
+        StateItem.__init__(self, key)
+
+    def get_value(self, iterative):
+        if iterative.counter % 2 == 0:
+            return iterative.counter
+
+    def copy(self):
+        return self.__class__(self.key)
+
+
+def test_hdf5_missing_items():
+    for buffer_size in 1, 4:
+        ff = get_ff_polyethylene_lj()
+        with h5.File('yaff.sampling.test.test_verlet.test_hdf5_missing_items.h5', driver='core', backing_store=False) as f:
+            hdf5 = HDF5Writer(f, buffer_size=buffer_size)
+            nve = VerletIntegrator(ff, 1.0*femtosecond, state=[EvenStateItem()], hooks=hdf5)
+            for i in range(3):
+                nve.propagate()
+            if buffer_size == 1:
+                # Each frame is written immediately, also when one of the
+                # items is missing.
+                assert (f['trajectory/counter'][:] == [0, 2, 3]).all()
+                assert (f['trajectory/even'][:] == [0, 2]).all()
+            nve.run(2)
+            # Only the missing item is skipped. An incomplete frame is
+            # replaced by the next one.
+            assert (f['trajectory/counter'][:] == [0, 2, 4, 5]).all()
+            assert (f['trajectory/even'][:] == [0, 2, 4]).all()
+            assert get_last_trajectory_row(f['trajectory']) == 3
+
+
+def test_hdf5_buffer_flush_interval():
+    ff = get_ff_polyethylene_lj()
+    with h5.File('yaff.sampling.test.test_verlet.test_hdf5_buffer_flush_interval.h5', driver='core', backing_store=False) as f:
+        hdf5 = HDF5Writer(f, buffer_size=100, flush_interval=0.0)
+        nve = VerletIntegrator(ff, 1.0*femtosecond, hooks=hdf5)
+        nve.propagate()
+        assert get_last_trajectory_row(f['trajectory']) == 2
+
+
+def test_hdf5_buffer_exception():
+    ff = get_ff_polyethylene_lj()
+    class Failure(Hook):
+        def __call__(self, iterative):
+            if iterative.counter == 3:
+                raise RuntimeError
+    with h5.File('yaff.sampling.test.test_verlet.test_hdf5_buffer_exception.h5', driver='core', backing_store=False) as f:
+        hdf5 = HDF5Writer(f, buffer_size=100)
+        nve = VerletIntegrator(ff, 1.0*femtosecond, hooks=[hdf5, Failure()])
+        try:
+            nve.run(5)
+            assert False
+        except RuntimeError:
+            pass
+        # The frames before the exception are written.
+        assert (f['trajectory/counter'][:] == [0, 1, 2, 3]).all()
+
+
+def test_hdf5_async():
+    trajs = []
+    for asynchronous in False, True:
+        ff = get_ff_polyethylene_lj()
+        np.random.seed(3)
+        with h5.File('yaff.sampling.test.test_verlet.test_hdf5_async.h5', driver='core', backing_store=False) as f:
+            hdf5 = HDF5Writer(f, buffer_size=2, asynchronous=asynchronous)
+            nve = VerletIntegrator(ff, 1.0*femtosecond, hooks=hdf5)
+            nve.run(10)
+            assert hdf5._thread is None
+            assert get_last_trajectory_row(f['trajectory']) == 11
+            trajs.append(dict((key, ds[:]) for key, ds in f['trajectory'].items()))
+            # The writer can be used again in a second run.
+            nve.run(2)
+            assert get_last_trajectory_row(f['trajectory']) == 13
+    for key in trajs[0]:
+        assert (trajs[0][key] == trajs[1][key]).all()
+
+
+def test_hdf5_async_error():
+    ff = get_ff_polyethylene_lj()
+    with h5.File('yaff.sampling.test.test_verlet.test_hdf5_async_error.h5', driver='core', backing_store=False) as f:
+        hdf5 = HDF5Writer(f, buffer_size=1, asynchronous=True)
+        nve = VerletIntegrator(ff, 1.0*femtosecond, hooks=hdf5)
+        def write_block(buffers, nrow, row, partial):
+            raise IOError('Disk full')
+        hdf5._write_block = write_block
+        try:
+            nve.run(5)
+            assert False
+        except IOError:
+            pass
+        assert hdf5._thread is None
+
+
+def test_restart_async():
+    ff = get_ff_polyethylene_lj()
+    with h5.File('yaff.sampling.test.test_verlet.test_restart_async.h5', driver='core', backing_store=False) as f:
+        restart = RestartWriter(f, step=5, asynchronous=True)
+        nve = VerletIntegrator(ff, 1.0*femtosecond, hooks=[restart, NHCThermostat(300)])
+        nve.run(10)
+        assert (f['trajectory/counter'][:] == [5, 10]).all()
+        nve_restart = VerletIntegrator(get_ff_polyethylene_lj(), hooks=[], restart_h5=f)
+        assert nve_restart.counter == 10
+        assert (nve_restart.pos == nve.pos).all()
+        assert (nve_restart.vel == nve.vel).all()
+
+
+def test_restart_missing_items():
+    ff = get_ff_polyethylene_lj()
+    with h5.File('yaff.sampling.test.test_verlet.test_restart_missing_items.h5', driver='core', backing_store=False) as f:
+        restart = RestartWriter(f, step=5)
+        nve = VerletIntegrator(ff, 1.0*femtosecond, hooks=[restart, NHCThermostat(300)])
+        # A state item without a value in the last frame.
+        item = CountingStateItem('late', 5)
+        item.get_value = lambda iterative: 1.0 if iterative.counter < 10 else None
+        restart.state_list.append(item)
+        restart.state[item.key] = item
+        nve.run(10)
+        # The other items of the restart frame are still written.
+        assert (f['trajectory/counter'][:] == [5, 10]).all()
+        assert (f['trajectory/late'][:] == [1.0]).all()
+        nve_restart = VerletIntegrator(get_ff_polyethylene_lj(), hooks=[], restart_h5=f)
+        assert nve_restart.counter == 10
+        assert (nve_restart.pos == nve.pos).all()
+        assert (nve_restart.vel == nve.vel).all()
+
+
+def test_hdf5_policies():
+    trajs = []
+    policies = {
+        'pos': StoragePolicy(np.float32, shuffle=True, compression='gzip', chunk_rows=4),
+        'vel': StoragePolicy(np.int16, scale=1e-7, compression='lzf'),
+    }
+    for kwargs in {}, {'policies': policies}:
+        ff = get_ff_polyethylene_lj()
+        np.random.seed(3)
+        with h5.File('yaff.sampling.test.test_verlet.test_hdf5_policies.h5', driver='core', backing_store=False) as f:
+            hdf5 = HDF5Writer(f, buffer_size=4, **kwargs)
+            nve = VerletIntegrator(ff, 1.0*femtosecond, hooks=hdf5)
+            nve.run(10)
+            trajs.append(dict((key, get_dataset(f, 'trajectory/%s' % key)[:]) for key in f['trajectory']))
+            if 'policies' in kwargs:
+                ds_pos = f['trajectory/pos']
+                ds_vel = f['trajectory/vel']
+                assert ds_pos.dtype == np.float32
+                assert ds_pos.shuffle
+                assert ds_pos.compression == 'gzip'
+                assert ds_pos.chunks[0] == 4
+                assert ds_vel.dtype == np.int16
+                assert ds_vel.attrs['scale'] == 1e-7
+                assert ds_vel.compression == 'lzf'
+                assert f['trajectory/cell'].dtype == np.float64
+                assert f['trajectory/cell'].compression is None
+    # Only the stored values are affected, not the simulation.
+    assert (trajs[0]['epot'] == trajs[1]['epot']).all()
+    assert abs(trajs[0]['pos'] - trajs[1]['pos']).max() < 1e-5*abs(trajs[0]['pos']).max()
+    assert abs(trajs[0]['vel'] - trajs[1]['vel']).max() <= 0.5e-7
+
+
+def test_hdf5_policies_overflow():
+    ff = get_ff_polyethylene_lj()
+    with h5.File('yaff.sampling.test.test_verlet.test_hdf5_policies_overflow.h5', driver='core', backing_store=False) as f:
+        hdf5 = HDF5Writer(f, policies={'pos': StoragePolicy(np.int8, scale=1e-3)})
+        try:
+            VerletIntegrator(ff, 1.0*femtosecond, hooks=hdf5)
+            assert False
+        except ValueError:
+            pass
+        # Nothing is written when one of the datasets overflows.
+        for ds in f['trajectory'].values():
+            assert ds.shape[0] == 0
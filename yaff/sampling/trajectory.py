@@ -27,16 +27,17 @@
 from __future__ import division
 
 import numpy as np
+import threading
 import time
-import h5py as h5
 
-from yaff.log import log
+from yaff.log import log, timer
+from yaff.analysis.utils import get_dataset
 from yaff.sampling.iterative import Iterative, AttributeStateItem, \
     PosStateItem, DipoleStateItem, VolumeStateItem, CellStateItem, \
     EPotContribStateItem, Hook
 
 __all__ = [
-    'TrajScreenLog', 'RefTrajectory',
+    'TrajScreenLog', 'TrajectoryReader', 'RefTrajectory',
 ]
 
 class TrajScreenLog(Hook):
@@ -44,6 +45,9 @@ class TrajScreenLog(Hook):
         Hook.__init__(self, start, step)
         self.time0 = None
 
+    def get_state_keys(self, iterative):
+        return []
+
     def __call__(self, iterative):
         if log.do_medium:
             if self.time0 is None:
@@ -57,6 +61,105 @@ class TrajScreenLog(Hook):
                 time.time() - self.time0,
             ))
 
+class TrajectoryReader(object):
+    '''Sequential reader for frames in the trajectory group of an HDF5 file
+
+       Frames are read in blocks that are aligned with the chunks of the
+       datasets. While the frames of one block are being processed, the next
+       block is read by a background thread.
+    '''
+    def __init__(self, f, keys, block_size=None, prefetch=True):
+        '''
+           **Arguments:**
+
+           f
+                An h5py.File instance with a trajectory group.
+
+           keys
+                A list of names of datasets in the trajectory group.
+
+           **Optional arguments:**
+
+           block_size
+                The number of frames in one block. When not given, blocks of
+                about 1 MiB are used. The block size is rounded up to a
+                multiple of the number of frames in one chunk of the largest
+                dataset.
+
+           prefetch
+                When True, the next block is read in a background thread.
+        '''
+        self.f = f
+        self.keys = keys
+        self.dss = [get_dataset(f, 'trajectory/%s' % key) for key in keys]
+        # The number of frames is derived from the shapes only.
+        self.nframe = min(ds.shape[0] for ds in self.dss)
+        # The blocks are aligned with the chunks of the largest dataset.
+        frame_sizes = [int(np.prod(ds.shape[1:])) for ds in self.dss]
+        largest = self.dss[np.argmax(frame_sizes)]
+        chunk_rows = 1 if largest.chunks is None else largest.chunks[0]
+        if block_size is None:
+            block_size = max(1, (1 << 20)//(8*max(sum(frame_sizes), 1)))
+        self.block_size = chunk_rows*((block_size - 1)//chunk_rows + 1)
+        self.prefetch = prefetch
+        self._iblock = None
+        self._block = None
+        self._next = None
+
+    def __len__(self):
+        return self.nframe
+
+    def __getitem__(self, index):
+        '''Return a list with the arrays of all keys for one frame'''
+        if index < 0:
+            index += self.nframe
+        if index < 0 or index >= self.nframe:
+            raise IndexError('Frame %i is not present in the trajectory.' % index)
+        iblock = index//self.block_size
+        if iblock != self._iblock:
+            self._block = self._get_block(iblock)
+            self._iblock = iblock
+            if self.prefetch and (iblock + 1)*self.block_size < self.nframe:
+                self._start_prefetch(iblock + 1)
+        irow = index - iblock*self.block_size
+        return [block[irow] for block in self._block]
+
+    def _read_block(self, iblock):
+        begin = iblock*self.block_size
+        end = min(begin + self.block_size, self.nframe)
+        return [ds[begin:end] for ds in self.dss]
+
+    def _start_prefetch(self, iblock):
+        result = {}
+        def target():
+            try:
+                result['block'] = self._read_block(iblock)
+            except Exception as e:
+                result['error'] = e
+        thread = threading.Thread(target=target)
+        thread.daemon = True
+        thread.start()
+        self._next = (iblock, thread, result)
+
+    def _get_block(self, iblock):
+        if self._next is not None:
+            next_iblock, thread, result = self._next
+            self._next = None
+            thread.join()
+            if next_iblock == iblock:
+                if 'error' in result:
+                    raise result['error']
+                return result['block']
+        with timer.section('Trajectory read'):
+            return self._read_block(iblock)
+
+    def close(self):
+        '''Wait for a pending background read'''
+        if self._next is not None:
+            self._next[1].join()
+            self._next = None
+
+
 class RefTrajectory(Iterative):
     default_state = [
         AttributeStateItem('counter'),
@@ -70,7 +173,8 @@ class RefTrajectory(Iterative):
 
     log_name = 'TRAJEC'
 
-    def __init__(self, ff, fn_traj, state=None, hooks=None, counter0=0):
+    def __init__(self, ff, fn_traj, state=None, hooks=None, counter0=0,
+                 block_size=None, prefetch=True):
         """
            **Arguments:**
 
@@ -95,9 +199,17 @@ class RefTrajectory(Iterative):
 
            counter0
                 The counter value associated with the initial state.
+
+           block_size, prefetch
+                Options for the :class:`TrajectoryReader`.
         """
+        import h5py as h5
         self.traj = h5.File(fn_traj, 'r')
-        self.nframes = len(self.traj['trajectory/pos'][:])
+        keys = ['pos']
+        if 'cell' in self.traj['trajectory']:
+            keys.append('cell')
+        self.reader = TrajectoryReader(self.traj, keys, block_size, prefetch)
+        self.nframes = self.reader.nframe
         Iterative.__init__(self, ff, state, hooks, counter0)
 
     def _add_default_hooks(self):
@@ -108,14 +220,17 @@ class RefTrajectory(Iterative):
         return
 
     def propagate(self):
-        self.ff.update_pos(self.traj['trajectory/pos'][self.counter])
-        self.ff.update_rvecs(self.traj['trajectory/cell'][self.counter])
+        frame = self.reader[self.counter]
+        self.ff.update_pos(frame[0])
+        if len(frame) > 1:
+            self.ff.update_rvecs(frame[1])
         self.epot = self.ff.compute(None, None)
         self.call_hooks()
         self.counter += 1
         return self.counter==self.nframes
 
     def finalize(self):
+        self.reader.close()
         self.traj.close()
         if log.do_medium:
             log.hline()
@@ -83,7 +83,8 @@ class VerletIntegrator(Iterative):
     log_name = 'VERLET'
 
     def __init__(self, ff, timestep=None, state=None, hooks=None, vel0=None,
-                 temp0=300, scalevel0=True, time0=None, ndof=None, counter0=None, restart_h5=None):
+                 temp0=300, scalevel0=True, time0=None, ndof=None, counter0=None, restart_h5=None,
+                 constraints=None):
         """
             **Arguments:**
 
@@ -133,6 +134,11 @@ class VerletIntegrator(Iterative):
 
             restart_h5
                 HDF5 object containing the restart information
+
+            constraints
+                A BondConstraints instance. When given, the constrained bond
+                lengths are imposed with the SHAKE/RATTLE algorithm and the
+                number of degrees of freedom is reduced accordingly.
         """
         # Assign init arguments
         if timestep is None and restart_h5 is None:
@@ -140,6 +146,11 @@ class VerletIntegrator(Iterative):
         self.ndof = ndof
         self.hooks = hooks
         self.restart_h5 = restart_h5
+        self.constraints = constraints
+        if constraints is None:
+            self.nconstraint = 0
+        else:
+            self.nconstraint = len(constraints)
 
         # Retrieve the necessary properties if restarting. Restart objects
         # are overwritten by optional arguments in VerletIntegrator
@@ -194,6 +205,10 @@ class VerletIntegrator(Iterative):
         self.delta = np.zeros(self.pos.shape, float)
         self.vtens = np.zeros((3, 3), float)
 
+        # Uniform deformations of the cell and the positions, scheduled by
+        # barostats for the next step.
+        self.deformations = []
+
         # Tracks quality of the conserved quantity
         self._cons_err_tracker = ConsErrTracker(restart_h5)
         Iterative.__init__(self, ff, state, self.hooks, counter0)
@@ -330,7 +345,12 @@ class VerletIntegrator(Iterative):
 
         # Configure the number of degrees of freedom if needed
         if self.ndof is None:
-            self.ndof = self.pos.size
+            self.ndof = self.pos.size - self.nconstraint
+
+        # Remove velocity components along the constrained bonds.
+        if self.constraints is not None:
+            self.constraints.rattle(self.pos, self.vel, self.masses, self.timestep)
+            self.constraints.vtens[:] = 0.0
 
         # Common post-processing of the initialization
         self.compute_properties(self.restart_h5)
@@ -340,17 +360,25 @@ class VerletIntegrator(Iterative):
         # Allow specialized hooks to modify the state before the regular verlet
         # step.
         self.call_verlet_hooks('pre')
+        self._apply_deformation()
 
         # Regular verlet step
         self.acc = -self.gpos/self.masses.reshape(-1,1)
         self.vel += 0.5*self.acc*self.timestep
+        if self.constraints is not None:
+            pos_old = self.pos.copy()
         self.pos += self.timestep*self.vel
+        if self.constraints is not None:
+            self.constraints.shake(self.pos, pos_old, self.vel, self.masses, self.timestep)
         self.ff.update_pos(self.pos)
         self.gpos[:] = 0.0
         self.vtens[:] = 0.0
         self.epot = self.ff.compute(self.gpos, self.vtens)
         self.acc = -self.gpos/self.masses.reshape(-1,1)
         self.vel += 0.5*self.acc*self.timestep
+        if self.constraints is not None:
+            self.constraints.rattle(self.pos, self.vel, self.masses, self.timestep)
+            self.vtens += self.constraints.vtens
         self.ekin = self._compute_ekin()
 
         # Allow specialized verlet hooks to modify the state after the step
@@ -366,6 +394,53 @@ class VerletIntegrator(Iterative):
         self.compute_properties()
         Iterative.propagate(self) # Includes call to conventional hooks
 
+    def defer_deformation(self, deformation, hook):
+        '''Schedule a uniform deformation of the cell and the positions
+
+           **Arguments:**
+
+           deformation
+                A 3x3 matrix that transforms row vectors of the current
+                configuration into the deformed configuration.
+
+           hook
+                The VerletHook that requests the deformation. The change in
+                potential energy is added to its econs_correction when the
+                deformation is applied.
+
+           The deformation is only applied at the beginning of the next step,
+           such that the energy and forces are computed once, together with
+           the regular force evaluation of that step. A deformation that is
+           still pending at the end of ``run`` is applied in ``finalize``.
+        '''
+        self.deformations.append((deformation.copy(), hook))
+
+    def _get_gradients(self):
+        '''Return the gradient arrays that are used in the next half kick'''
+        return [self.gpos]
+
+    def _apply_deformation(self):
+        '''Apply the deformations scheduled with ``defer_deformation``
+
+           The change in potential energy is estimated to first order with
+           the virial tensor. The gradient is transformed with the inverse
+           transpose of the deformation, which is consistent with the affine
+           map of the positions, such that the first half kick of the step
+           does not use the forces of the undeformed geometry. The energy and
+           forces are recomputed in the remainder of the step.
+        '''
+        for deformation, hook in self.deformations:
+            hook.econs_correction -= (self.vtens*(deformation - np.identity(3))).sum()
+            self.pos[:] = np.dot(self.pos, deformation)
+            self.rvecs[:] = np.dot(self.rvecs, deformation)
+            transform = np.linalg.inv(deformation).T
+            for gpos in self._get_gradients():
+                gpos[:] = np.dot(gpos, transform)
+        if len(self.deformations) > 0:
+            self.ff.update_rvecs(self.rvecs)
+            self.ff.update_pos(self.pos)
+            self.deformations = []
+
     def _compute_ekin(self):
         '''Auxiliary routine to compute the kinetic energy
 
@@ -374,8 +449,14 @@ class VerletIntegrator(Iterative):
         return 0.5*(self.vel**2*self.masses.reshape(-1,1)).sum()
 
     def compute_properties(self, restart_h5=None):
-        self.rmsd_gpos = np.sqrt((self.gpos**2).mean())
-        self.rmsd_delta = np.sqrt((self.delta**2).mean())
+        self._compute_econs(restart_h5)
+        self._compute_derived_properties()
+
+    def _compute_econs(self, restart_h5=None):
+        '''Compute the energies and track the conserved quantity
+
+           This must be called exactly once per step.
+        '''
         self.ekin = self._compute_ekin()
         self.temp = self.ekin/self.ndof*2.0/boltzmann
         self.etot = self.ekin + self.epot
@@ -388,11 +469,97 @@ class VerletIntegrator(Iterative):
         else:
             self._cons_err_tracker.update(self.ekin, self.econs)
         self.cons_err = self._cons_err_tracker.get()
+
+    def _compute_derived_properties(self):
+        '''Compute properties that are only needed for output'''
+        self.rmsd_gpos = np.sqrt((self.gpos**2).mean())
+        self.rmsd_delta = np.sqrt((self.delta**2).mean())
         if self.ff.system.cell.nvec > 0:
             self.ptens = (np.dot(self.vel.T*self.masses, self.vel) - self.vtens)/self.ff.system.cell.volume
             self.press = np.trace(self.ptens)/3
 
+    def run(self, nstep=None):
+        if nstep is None or not self._supports_fast_run():
+            Iterative.run(self, nstep)
+        else:
+            with log.section(self.log_name), timer.section(self.log_name):
+                try:
+                    self._fast_run(nstep)
+                    self.finalize()
+                finally:
+                    self.finalize_hooks()
+
+    def _supports_fast_run(self):
+        '''Check whether the hooks and options are supported by ``_fast_run``'''
+        from yaff.sampling.nvt import LangevinThermostat, CSVRThermostat, NHCThermostat
+        if type(self) is not VerletIntegrator or self.constraints is not None:
+            return False
+        for hook in self.hooks:
+            if isinstance(hook, VerletHook) and not isinstance(hook, (LangevinThermostat, CSVRThermostat, NHCThermostat)):
+                return False
+        return True
+
+    def _fast_run(self, nstep):
+        '''Perform nstep velocity Verlet steps with a minimal overhead
+
+           This gives exactly the same results as the regular ``propagate``
+           method, but the generic hook dispatching, the computation of
+           properties that are only needed for output and the allocation of
+           temporary arrays are avoided on steps where no regular hook is
+           called. Only thermostats are supported as Verlet hooks.
+        '''
+        verlet_hooks = [hook for hook in self.hooks if isinstance(hook, VerletHook)]
+        # The screen logger has no effect when the log is not verbose enough.
+        other_hooks = [
+            hook for hook in self.hooks if not (isinstance(hook, VerletHook) or
+            (isinstance(hook, VerletScreenLog) and not log.do_medium))
+        ]
+        neg_masses = -self.masses.reshape(-1,1)
+        work = np.zeros(self.pos.shape, float)
+        self.acc = np.zeros(self.pos.shape, float)
+        for istep in range(nstep):
+            for hook in verlet_hooks:
+                if hook.expects_call(self.counter):
+                    hook.pre(self)
+            # Regular verlet step, see propagate
+            np.divide(self.gpos, neg_masses, out=self.acc)
+            np.multiply(self.acc, 0.5, out=work)
+            work *= self.timestep
+            self.vel += work
+            np.multiply(self.vel, self.timestep, out=work)
+            self.pos += work
+            self.ff.update_pos(self.pos)
+            self.gpos[:] = 0.0
+            self.vtens[:] = 0.0
+            self.epot = self.ff.compute(self.gpos, self.vtens)
+            np.divide(self.gpos, neg_masses, out=self.acc)
+            np.multiply(self.acc, 0.5, out=work)
+            work *= self.timestep
+            self.vel += work
+            self.ekin = self._compute_ekin()
+            for hook in verlet_hooks:
+                if hook.expects_call(self.counter):
+                    hook.post(self)
+            # Calculate the total position change
+            np.subtract(self.pos, self.posoud, out=self.delta)
+            self.posoud[:] = self.pos
+            self.time += self.timestep
+            self._compute_econs()
+            self.counter += 1
+            if istep == nstep - 1 or any(hook.expects_call(self.counter) for hook in other_hooks):
+                self._compute_derived_properties()
+                self.call_hooks()
+
     def finalize(self):
+        # Do not lose a deformation that was scheduled in the last step.
+        if len(self.deformations) > 0:
+            self._apply_deformation()
+            self.gpos[:] = 0.0
+            self.vtens[:] = 0.0
+            self.epot = self.ff.compute(self.gpos, self.vtens)
+            if self.constraints is not None:
+                self.vtens += self.constraints.vtens
+            self.acc = -self.gpos/self.masses.reshape(-1,1)
         if log.do_medium:
             log.hline()
 
@@ -436,6 +603,9 @@ class VerletHook(Hook):
     def __call__(self, iterative):
         pass
 
+    def get_state_keys(self, iterative):
+        return []
+
     def init(self, iterative):
         raise NotImplementedError
 
@@ -452,6 +622,9 @@ class VerletScreenLog(Hook):
         Hook.__init__(self, start, step)
         self.time0 = None
 
+    def get_state_keys(self, iterative):
+        return []
+
     def __call__(self, iterative):
         if log.do_medium:
             if self.time0 is None:
@@ -26,7 +26,7 @@
 
 from __future__ import division
 
-import numpy as np, h5py as h5
+import numpy as np
 
 from yaff.log import log
 from yaff.atselect import check_name, atsel_compile, iter_matches
@@ -548,6 +548,7 @@ class System(AbstractSystem):
                         if key in allowed_keys:
                             kwargs.update({key: value})
                 elif fn.endswith('.h5'):
+                    import h5py as h5
                     with h5.File(fn, 'r') as f:
                         return cls.from_hdf5(f)
                 else:
@@ -626,6 +627,7 @@ class System(AbstractSystem):
                 'masses': self.masses,
             })
         elif fn.endswith('.h5'):
+            import h5py as h5
             with h5.File(fn, 'w') as f:
                 self.to_hdf5(f)
         elif fn.endswith('.xyz'):
@@ -908,43 +910,23 @@ class System(AbstractSystem):
 
         if self.bonds is not None:
             # E) Bonds
-            # E.1) A function that translates a set of image indexes and an old atom
-            # index into a new atom index
-            offsets = {}
-            start = 0
-            for iimage in np.ndindex(reps):
-                offsets[iimage] = start
-                start += self.natom
-            def to_new_atom_index(iimage, i):
-                return offsets[iimage] + i
-
-            # E.2) Construct extended bond information: for each bond, also keep
+            # E.1) Construct extended bond information: for each bond, also keep
             # track of periodic image it connects to. Note that this information
             # is implicit in yaff, and derived using the minimum image convention.
-            rel_iimage = {}
-            for ibond in range(len(self.bonds)):
-                i0, i1 = self.bonds[ibond]
-                delta = self.pos[i0] - self.pos[i1]
-                frac = np.dot(self.cell.gvecs, delta)
-                rel_iimage[ibond] = np.ceil(frac-0.5)
-
-            # E.3) Create the new bonds
+            deltas = self.pos[self.bonds[:,0]] - self.pos[self.bonds[:,1]]
+            rel_iimage = np.ceil(np.dot(deltas, self.cell.gvecs.T)-0.5).astype(int)
+
+            # E.2) Create the new bonds. The new index of i0 follows directly
+            # from the periodic image. For i1, the change in periodic image
+            # must be taken into account when the bond connects different
+            # periodic images.
+            iimages0 = np.array(list(np.ndindex(reps)))
+            iimages1 = (iimages0[:,None,:] + rel_iimage) % reps
+            offsets0 = np.arange(rep_all)*self.natom
+            offsets1 = np.ravel_multi_index(tuple(np.rollaxis(iimages1, 2)), reps)*self.natom
             new_bonds = np.zeros((len(self.bonds)*rep_all,2), int)
-            counter = 0
-            for iimage0 in np.ndindex(reps):
-                for ibond in range(len(self.bonds)):
-                    i0, i1 = self.bonds[ibond]
-                    # Translate i0 to the new index.
-                    j0 = to_new_atom_index(iimage0, i0)
-                    # Also translate i1 to the new index. This is a bit more tricky.
-                    # The difficult case occurs when the bond between i0 and i1
-                    # connects different periodic images. In that case, the change
-                    # in periodic image must be taken into account.
-                    iimage1 = tuple((iimage0[c] + rel_iimage[ibond][c]) % reps[c] for c in range(len(reps)))
-                    j1 = to_new_atom_index(iimage1, i1)
-                    new_bonds[counter,0] = j0
-                    new_bonds[counter,1] = j1
-                    counter += 1
+            new_bonds[:,0] = (offsets0[:,None] + self.bonds[:,0]).ravel()
+            new_bonds[:,1] = (offsets1 + self.bonds[:,1]).ravel()
             new_args['bonds'] = new_bonds
 
         # Done
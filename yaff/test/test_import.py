@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# YAFF is yet another force-field code.
+# Copyright (C) 2011 Toon Verstraelen <Toon.Verstraelen@UGent.be>,
+# Louis Vanduyfhuys <Louis.Vanduyfhuys@UGent.be>, Center for Molecular Modeling
+# (CMM), Ghent University, Ghent, Belgium; all rights reserved unless otherwise
+# stated.
+#
+# This file is part of YAFF.
+#
+# YAFF is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# YAFF is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+# --
+
+
+from __future__ import division
+
+import os
+import sys
+import subprocess
+
+import yaff
+
+
+# Packages that should only be loaded when they are actually used.
+lazy_packages = ['matplotlib', 'h5py', 'scipy', 'yaml']
+
+# Upper limit for the wall time of an import, in seconds. The import itself
+# takes a few tenths of a second. The ceiling is an order of magnitude higher
+# and only the fastest of a few runs is compared with it, such that a slow or
+# busy machine does not cause spurious failures, while a large regression in
+# the import time still gets caught.
+import_budget = 5.0
+
+
+def run_import(statement):
+    # Import in a fresh interpreter and report the wall time and the names of
+    # all new modules.
+    script = '''
+import sys, time
+before = set(sys.modules)
+start = time.time()
+%s
+print(time.time() - start)
+print(' '.join(sorted(set(sys.modules) - before)))
+''' % statement
+    env = dict(os.environ)
+    dn_root = os.path.dirname(os.path.dirname(os.path.abspath(yaff.__file__)))
+    paths = [dn_root]
+    if 'PYTHONPATH' in env:
+        paths.append(env['PYTHONPATH'])
+    env['PYTHONPATH'] = os.pathsep.join(paths)
+    output = subprocess.check_output([sys.executable, '-c', script], env=env).decode('utf-8')
+    lines = output.strip().split('\n')
+    return float(lines[-2]), set(lines[-1].split())
+
+
+def check_import(statement, expected):
+    elapsed, modules = run_import(statement)
+    for module in expected:
+        assert module in modules, (statement, module)
+    packages = set(module.split('.')[0] for module in modules)
+    for package in lazy_packages:
+        assert package not in packages, (statement, package)
+
+
+def check_budget(statement):
+    elapsed = min(run_import(statement)[0] for irep in range(3))
+    assert elapsed < import_budget, (statement, elapsed)
+
+
+# Note that ``yaff.pes`` and ``yaff.system`` do not load on their own yet:
+# importing either of them first runs ``yaff/__init__.py``, whose star imports
+# also load ``yaff.analysis``, ``yaff.sampling``, ``yaff.conversion`` and
+# ``yaff.tune`` together with a few dozen molmod modules. Dropping these star
+# imports would break the ``from yaff import *`` idiom used by all scripts and
+# examples. The tests below therefore only guarantee that the heavy third-party
+# packages are loaded lazily and that the import stays within the budget.
+
+
+def test_import_pes():
+    check_import('import yaff.pes', ['yaff.pes', 'yaff.pes.ff', 'yaff.pes.generator'])
+
+
+def test_import_system():
+    check_import('import yaff.system', ['yaff.system', 'yaff.log'])
+
+
+def test_import_yaff():
+    check_import('import yaff', [
+        'yaff', 'yaff.pes', 'yaff.sampling', 'yaff.analysis', 'yaff.conversion',
+        'yaff.analysis.basic', 'yaff.sampling.opt',
+    ])
+
+
+def test_import_budget_pes():
+    check_budget('import yaff.pes')
+
+
+def test_import_budget_system():
+    check_budget('import yaff.system')
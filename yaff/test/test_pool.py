@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# YAFF is yet another force-field code.
+# Copyright (C) 2011 Toon Verstraelen <Toon.Verstraelen@UGent.be>,
+# Louis Vanduyfhuys <Louis.Vanduyfhuys@UGent.be>, Center for Molecular Modeling
+# (CMM), Ghent University, Ghent, Belgium; all rights reserved unless otherwise
+# stated.
+#
+# This file is part of YAFF.
+#
+# YAFF is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# YAFF is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+# --
+
+
+from __future__ import division
+
+from yaff.log import log
+from yaff.pool import get_fork_pool, get_worker_args
+
+
+def _get_worker_state(i):
+    return i, get_worker_args(), log.do_warning
+
+
+def test_fork_pool():
+    args = {'foo': [1, 2]}
+    pool = get_fork_pool(2, args)
+    try:
+        results = pool.map(_get_worker_state, range(4))
+    finally:
+        pool.close()
+        pool.join()
+    for i, (j, worker_args, do_warning) in enumerate(results):
+        assert i == j
+        assert worker_args == args
+        assert not do_warning
+    # The parent process is not affected.
+    assert get_worker_args() is None
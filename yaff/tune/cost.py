@@ -31,6 +31,7 @@ from yaff import atsel_compile, log, System
 from yaff.pes.dlist import DeltaList
 from yaff.pes.iclist import InternalCoordinateList, Bond, BendAngle
 from yaff.pes.ff import ForceField
+from yaff.pool import get_fork_pool, get_worker_args
 from yaff.sampling.harmonic import estimate_cart_hessian
 
 
@@ -43,9 +44,31 @@ __all__ = [
 
 
 class CostFunction(object):
-    def __init__(self, parameter_transform, test_groups):
+    def __init__(self, parameter_transform, test_groups, nproc=None):
+        '''
+           **Arguments:**
+
+           parameter_transform
+                A ParameterTransform instance that turns a vector x into
+                parameters.
+
+           test_groups
+                A dictionary with lists of tests as values.
+
+           **Optional arguments:**
+
+           nproc
+                The number of worker processes. By default, all simulations
+                are carried out in the current process. Otherwise, a pool of
+                forked workers is started at the first call and kept until
+                ``close`` is called. Each worker keeps its own copy of the
+                systems and force fields of all simulations, such that later
+                calls only update the parameters.
+        '''
         self.parameter_transform = parameter_transform
         self.test_groups = test_groups
+        self.nproc = nproc
+        self._pool = None
 
         # Collect all simulations
         self.simulations = []
@@ -62,30 +85,100 @@ class CostFunction(object):
                 self.tests.append((name, test))
 
     def __call__(self, x):
+        return self.compute_many([x])[0]
+
+    def compute_many(self, xs):
+        '''Compute the cost function for several parameter vectors
+
+           **Arguments:**
+
+           xs
+                A list of parameter vectors, e.g. a population of candidates.
+
+           **Returns:** an array with the cost of each vector.
+
+           With worker processes, the simulations of all vectors are carried
+           out concurrently.
+        '''
+        if self.nproc is None or self.nproc <= 1:
+            all_results = [self.run_simulations(x) for x in xs]
+        else:
+            all_results = self._run_simulations_parallel(xs)
+        return np.array([self.compute_cost(results) for results in all_results])
+
+    def run_simulations(self, x):
+        '''Run all simulations in the current process
+
+           **Returns:** a dictionary with the result of each simulation.
+        '''
         # Modify the parameters
         parameters = self.parameter_transform(x)
         # Run simulations with the new parameters
         results = {}
         for simulation in self.simulations:
             results[simulation.name] = simulation(parameters)
+        return results
+
+    def compute_cost(self, results):
+        '''Compute the cost from the results of all simulations'''
         # compute all the tests in each test group
         costs = {}
         for name, test in self.tests:
             costs[name] = 0.5*test(results)**2 + costs.get(name, 0.0)
         return sum(np.log(cost) for cost in costs.values())
 
+    def _get_pool(self):
+        '''Return the pool of worker processes, started at the first call'''
+        if self._pool is None:
+            self._pool = get_fork_pool(self.nproc, self)
+            if log.do_medium:
+                with log.section('COST'):
+                    log('Started %i worker processes.' % self.nproc)
+        return self._pool
+
+    def _run_simulations_parallel(self, xs):
+        '''Distribute all simulations for all vectors over the workers'''
+        tasks = [(ix, isim, np.asarray(x)) for ix, x in enumerate(xs) for isim in range(len(self.simulations))]
+        all_results = [{} for x in xs]
+        for ix, isim, result in self._get_pool().map(_run_simulation, tasks, chunksize=1):
+            all_results[ix][self.simulations[isim].name] = result
+        return all_results
+
+    def close(self):
+        '''Stop the worker processes'''
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+def _run_simulation(task):
+    '''Run one simulation for one parameter vector in a worker process'''
+    ix, isim, x = task
+    cost = get_worker_args()
+    parameters = cost.parameter_transform(x)
+    return ix, isim, cost.simulations[isim](parameters)
+
 
 class Simulation(object):
     def __init__(self, name, system, **kwargs):
         self.name = name
         self.system = system
         self.kwargs = kwargs
+        self.ff = None
 
     def __call__(self, parameters):
-        # prepare force field
-        ff = ForceField.generate(self.system, parameters, **self.kwargs)
+        # prepare force field, the generators only run again when the
+        # parameters can not be updated in-place
+        if self.ff is not None:
+            try:
+                self.ff.update_parameters(parameters)
+            except (NotImplementedError, ValueError):
+                self.ff = None
+        if self.ff is None:
+            self.ff = ForceField.generate(self.system, parameters, **self.kwargs)
         # run actual simulation
-        return self.run(ff)
+        return self.run(self.ff)
 
     def run(self, ff):
         raise NotImplementedError
@@ -104,7 +197,7 @@ class GeoOptSimulation(Simulation):
         #ff.system.pos[:] = self.refpos
         #energy1 = ff.compute()
         #if energy1 > energy0:
-        ff.system.pos[:] = self.refpos#*np.random.uniform(0.99, 1.01, ff.system.pos.shape)
+        ff.update_pos(self.refpos)#*np.random.uniform(0.99, 1.01, ff.system.pos.shape)
         dof = CartesianDOF(ff, gpos_rms=1e-8)
         sl = OptScreenLog(step=20)
         self.opt = QNOptimizer(dof, hooks=[sl], hessian0=self.hessian0)
@@ -83,6 +83,31 @@ def test_water_cost_dist_ic():
     assert results == my_results
 
 
+def test_water_cost_dist_ic_nonbonded():
+    fn_xyz = pkg_resources.resource_filename(__name__, '../../data/test/water_trajectory.xyz')
+    fn_pars = pkg_resources.resource_filename(__name__, '../../data/test/parameters_water.txt')
+    parameters = Parameters.from_file(fn_pars)
+    rules = [ScaleRule('BONDFUES', 'PARS', 'O\s*H', 3)]
+    pt = ParameterTransform(parameters, [ParameterModifier(rules)])
+
+    def get_simulation():
+        system = System.from_file(fn_xyz, ffatypes=['O', 'H', 'H'])
+        system.detect_bonds()
+        return GeoOptSimulation('only', system)
+
+    # The DAMPDISP and EXPREP terms can not be updated in-place, so the
+    # second evaluation must generate a new force field.
+    simulation = get_simulation()
+    energies = []
+    for x in np.array([1.0]), np.array([1.1]):
+        result = simulation(pt(x))
+        ref_result = get_simulation()(pt(x))
+        assert abs(result['energy'] - ref_result['energy']) < 1e-10
+        assert abs(result['pos'] - ref_result['pos']).max() < 1e-5*angstrom
+        energies.append(result['energy'])
+    assert energies[0] != energies[1]
+
+
 def test_water_cost_dist_fc():
     fn_chk = pkg_resources.resource_filename(__name__, '../../data/test/water_hessian.chk')
     sample = load_chk(fn_chk)
@@ -176,3 +201,46 @@ def test_water_cost_angle_fc():
 
     x = np.array([0.8])
     assert abs(cost(x) - np.log(0.5*(394.59354836 - 0.8*302.068346061)**2)) < 1
+
+
+def test_water_cost_parallel():
+    fn_chk = pkg_resources.resource_filename(__name__, '../../data/test/water_hessian.chk')
+    sample = load_chk(fn_chk)
+    fn_pars = pkg_resources.resource_filename(__name__, '../../data/test/parameters_water.txt')
+    parameters = Parameters.from_file(fn_pars)
+    del parameters.sections['FIXQ']
+    del parameters.sections['DAMPDISP']
+    del parameters.sections['EXPREP']
+
+    def get_system():
+        system = System(pos=sample['pos'].copy(), numbers=sample['numbers'], ffatypes=['O', 'H', 'H'])
+        system.detect_bonds()
+        return system
+
+    mods = [
+        ParameterModifier([ScaleRule('BONDFUES', 'PARS', 'O\s*H', 2)]),
+        ParameterModifier([ScaleRule('BENDCHARM', 'PARS', 'O\s*H', 3)]),
+    ]
+    pt = ParameterTransform(parameters, mods)
+
+    def get_cost(nproc):
+        system = get_system()
+        simulations = [GeoOptHessianSimulation('hessian', system), GeoOptSimulation('opt', get_system())]
+        tests = {
+            'fc': [FCTest(kjmol/angstrom**2, sample['pos'], sample['hessian'].reshape(9, 9), simulations[0], BondGroup(system))],
+            'ic': [ICTest(5*deg, sample['pos'], simulations[1], BendGroup(system))],
+        }
+        return CostFunction(pt, tests, nproc=nproc)
+
+    xs = [np.array([1.0, 1.0]), np.array([1.1, 0.9]), np.array([0.8, 1.2])]
+    expected = np.array([get_cost(None)(x) for x in xs])
+    cost = get_cost(2)
+    try:
+        np.testing.assert_allclose(cost.compute_many(xs), expected, rtol=1e-8)
+        # The workers are reused for the next calls.
+        pool = cost._pool
+        assert abs(cost(xs[1]) - expected[1]) < 1e-8*abs(expected[1])
+        assert cost._pool is pool
+    finally:
+        cost.close()
+    assert cost._pool is None